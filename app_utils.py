@@ -1,36 +1,776 @@
+import json
+import logging
 import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import streamlit as st
-import googlemaps
+
+import metrics
+from cache import CACHES, AutocompleteCache, normalize_query
+from gazetteer import GazetteerIndex
+from place_store import PlaceStore
+from route_compare import RouteComparator, avoid_param, preference_id
+from route_history import RouteHistory, RouteRecord
+
+# Los módulos con numpy, requests, qrcode o pydeck (optimizador, flota, mapa,
+# QR, proveedores...) y los objetos compartidos se cargan la primera vez que
+# se usan: importar app_utils (cada rerun, cada proceso de batch_routes) no los paga.
+
+log = logging.getLogger(__name__)
+
+# Creación de los objetos compartidos del proceso (una sola vez, aunque los pidan varios hilos).
+_lock = threading.RLock()
+
+
+def _report_error(where, e):
+    """Registra un error (log + contador `errors.<where>` en las métricas)."""
+    metrics.incr(f"errors.{where}")
+    log.warning("[%s] Error: %s", where, e)
+
+
+def _get_setting(name, default=None):
+    """Lee un ajuste de st.secrets o, si no existe, de las variables de entorno."""
+    try:
+        value = st.secrets.get(name)
+    except Exception:
+        # Sin secrets.toml (ejecución local, CLI): solo entorno.
+        value = None
+    return value or os.environ.get(name) or default
+
 
 # Leer la clave API (segura desde secrets o variable de entorno)
-API_KEY = (
-    st.secrets.get("GOOGLE_PLACES_API_KEY")
-    or os.environ.get("GOOGLE_PLACES_API_KEY")
-)
+API_KEY = _get_setting("GOOGLE_PLACES_API_KEY")
+# Clave de Maps JavaScript (restringida por referer) para el autocompletado en el
+# navegador; si está definida, las cajas de búsqueda usan el componente cliente.
+BROWSER_MAPS_KEY = _get_setting("GOOGLE_MAPS_JS_KEY")
+
+
+def _load_budgets():
+    """Presupuestos por endpoint de `GOOGLE_BUDGETS` (tabla TOML en secrets o JSON en el entorno)."""
+    raw = _get_setting("GOOGLE_BUDGETS")
+    if not raw:
+        return {}
+    try:
+        return json.loads(raw) if isinstance(raw, str) else {k: dict(v) for k, v in raw.items()}
+    except Exception as e:
+        _report_error("_load_budgets", e)
+        return {}
+
+
+_quota = None
+
+
+def get_quota():
+    """Cuota compartida por todas las sesiones; todas las llamadas a Google pasan por aquí."""
+    global _quota
+    with _lock:
+        if _quota is None:
+            from rate_limit import QuotaAccountant
+
+            _quota = QuotaAccountant(_load_budgets())
+    return _quota
+
+
+_http = None
+
+
+def get_http():
+    """Transporte HTTP saliente compartido por todos los clientes (pool keep-alive por host).
+
+    Plazos: conexión y lectura por intento, y total por llamada (reintentos incluidos).
+    """
+    global _http
+    with _lock:
+        if _http is None:
+            from transport import Transport, build_session
+
+            _http = Transport(
+                build_session(pool_maxsize=int(_get_setting("HTTP_POOL_SIZE", 32))),
+                retries=int(_get_setting("HTTP_RETRIES", 2)),
+                default_timeout=float(_get_setting("HTTP_TIMEOUT_S", 10.0)),
+                connect_timeout=float(_get_setting("HTTP_CONNECT_TIMEOUT_S", 3.05)),
+                read_timeout=float(_get_setting("HTTP_READ_TIMEOUT_S", 5.0)),
+            )
+    return _http
+
+
+def _build_gmaps(read_timeout=None, total_s=None):
+    """Cliente de Google (googlemaps solo se importa si hay clave), con los plazos de `get_http()`."""
+    if not API_KEY:
+        return None
+    import googlemaps
+
+    from rate_limit import RateLimitedClient
+
+    http = get_http()
+    read_timeout = read_timeout or http.read_timeout
+    total_s = total_s or http.default_timeout
+    # Sin reintentos internos por OVER_QUERY_LIMIT: el limitador decide antes de llamar.
+    # googlemaps no empieza un reintento por 5xx si después no cabe una lectura
+    # completa dentro de `total_s`.
+    # GOOGLE_MAPS_BASE_URL permite apuntar a un backend falso (pruebas de carga).
+    client = googlemaps.Client(
+        key=API_KEY, retry_over_query_limit=False, requests_session=http.session,
+        connect_timeout=min(http.connect_timeout, read_timeout), read_timeout=read_timeout,
+        retry_timeout=max(total_s - read_timeout, 0.1),
+        base_url=_get_setting("GOOGLE_MAPS_BASE_URL", "https://maps.googleapis.com"),
+    )
+    return RateLimitedClient(client, get_quota())
+
+
+_gmaps = None
+
+
+def get_gmaps():
+    """Cliente de Google compartido (limitado por la cuota) o None sin clave."""
+    global _gmaps
+    with _lock:
+        if _gmaps is None:
+            _gmaps = _build_gmaps()
+    return _gmaps
+
+
+# Presupuesto de Google Places Autocomplete por tecla: su cliente corta la
+# lectura en ese plazo para que un backend colgado no acumule hilos.
+GOOGLE_SUGGEST_BUDGET_S = float(_get_setting("GOOGLE_SUGGEST_BUDGET_S", 1.5))
+_gmaps_typeahead = None
+
+
+def _get_gmaps_typeahead():
+    global _gmaps_typeahead
+    with _lock:
+        if _gmaps_typeahead is None:
+            _gmaps_typeahead = _build_gmaps(read_timeout=GOOGLE_SUGGEST_BUDGET_S,
+                                            total_s=GOOGLE_SUGGEST_BUDGET_S)
+    return _gmaps_typeahead
+
+
+SERPAPI_KEY = _get_setting("SERPAPI_API_KEY")
+# Nominatim solo si hay una instancia propia: la pública prohíbe el autocompletado.
+NOMINATIM_URL = _get_setting("NOMINATIM_URL")
+
+
+def _build_suggester():
+    """Proveedores de autocompletado disponibles según las claves configuradas."""
+    from providers import GoogleProvider, MultiProviderSuggester, NominatimProvider, SerpApiProvider
+
+    providers = []
+    if _get_gmaps_typeahead():
+        providers.append(GoogleProvider(_get_gmaps_typeahead(), budget_s=GOOGLE_SUGGEST_BUDGET_S))
+    if SERPAPI_KEY:
+        providers.append(SerpApiProvider(
+            SERPAPI_KEY, base_url=_get_setting("SERPAPI_URL", "https://serpapi.com"),
+            budget_s=2.0, hedge_after_s=0.25 if providers else 0.0, session=get_http(),
+        ))
+    if NOMINATIM_URL:
+        providers.append(NominatimProvider(
+            NOMINATIM_URL, budget_s=1.5, hedge_after_s=0.25 if providers else 0.0, session=get_http(),
+        ))
+    return MultiProviderSuggester(providers) if providers else None
+
+
+_suggester = None
+_suggester_ready = False
+
+
+def get_suggester():
+    """Proveedores de autocompletado en paralelo (uno por proceso) o None si no hay ninguno."""
+    global _suggester, _suggester_ready
+    with _lock:
+        if not _suggester_ready:
+            _suggester = _build_suggester()
+            _suggester_ready = True
+    return _suggester
+
+
+_place_store = None
+
+
+def get_place_store():
+    """Lugares ya resueltos (persistente, compartido por todas las sesiones)."""
+    global _place_store
+    with _lock:
+        if _place_store is None:
+            _place_store = PlaceStore(db_path=_get_setting("PLACES_DB", "places.sqlite3"))
+            snapshots = get_snapshots()
+            if snapshots is not None:
+                snapshots.add("places", _place_store)
+    return _place_store
+
+
+# Geocodificaciones simultáneas como máximo (en todo el proceso).
+RESOLVE_CONCURRENCY = int(_get_setting("RESOLVE_CONCURRENCY", 8))
+_RESOLVE_POOL = ThreadPoolExecutor(max_workers=RESOLVE_CONCURRENCY, thread_name_prefix="resolve")
+
+# Coste para ordenar paradas: "haversine" (local, gratis) o "google" (Distance Matrix).
+ROUTE_MATRIX = (_get_setting("ROUTE_MATRIX", "haversine") or "haversine").lower()
+OFFLINE_GRAPH = _get_setting("OFFLINE_GRAPH")
+_matrix_service = None
 
-gmaps = googlemaps.Client(key=API_KEY) if API_KEY else None
 
+def get_matrix_service():
+    """Servicio de matrices (uno por proceso) o None para usar la distancia en línea recta.
 
-def suggest_addresses(query: str, key_bucket="default", min_len: int = 3):
-    """Sugerencias de direcciones usando Google Places."""
-    if not API_KEY or not gmaps:
+    `ROUTE_MATRIX=google`: Distance Matrix con caché SQLite.
+    `ROUTE_MATRIX=offline`: grafo local de `OFFLINE_GRAPH` (ver offline_routing.py).
+    """
+    global _matrix_service
+    with _lock:
+        if _matrix_service is None and ROUTE_MATRIX == "google" and get_gmaps():
+            from distance_matrix import DistanceMatrixService
+
+            _matrix_service = DistanceMatrixService(
+                get_gmaps(), db_path=_get_setting("DISTANCE_CACHE_DB", "distance_cache.sqlite3")
+            )
+            snapshots = get_snapshots()
+            if snapshots is not None:
+                snapshots.add("distance_pairs", _matrix_service)
+        elif _matrix_service is None and ROUTE_MATRIX == "offline" and OFFLINE_GRAPH:
+            try:
+                from offline_routing import OfflineMatrixService
+
+                _matrix_service = OfflineMatrixService(OFFLINE_GRAPH)
+            except Exception as e:
+                _report_error("offline_graph", e)
+    return _matrix_service
+
+
+_route_comparator = None
+
+
+def get_route_comparator():
+    """Comparador de preferencias de ruta (uno por proceso) o None sin Google."""
+    global _route_comparator
+    with _lock:
+        if _route_comparator is None and get_gmaps():
+            _route_comparator = RouteComparator(get_gmaps())
+    return _route_comparator
+
+
+def compare_preferences(origin, destination, waypoints=None, mode="driving", preferences=None):
+    """Duración y distancia de la ruta con cada preferencia (lista vacía sin Google ni grafo local)."""
+    service = get_route_comparator()
+    if service is None and ROUTE_MATRIX == "offline":
+        service = get_matrix_service()
+    if service is None:
+        return []
+    try:
+        return service.compare(origin, destination, waypoints, mode=mode, preferences=preferences)
+    except Exception as e:
+        _report_error("compare_preferences", e)
         return []
 
+
+_opening_hours = None
+
+
+def get_opening_hours():
+    """Servicio de horarios de apertura con caché (uno por proceso) o None sin Google."""
+    global _opening_hours
+    with _lock:
+        if _opening_hours is None and get_gmaps():
+            from opening_hours import OpeningHoursService
+
+            _opening_hours = OpeningHoursService(get_gmaps())
+    return _opening_hours
+
+
+def open_status_for(points, mode="driving", start_ts=None, dwell_s=0.0):
+    """Estado de apertura de cada punto resuelto a su hora estimada de llegada.
+
+    Devuelve (estados, llegadas, offsets): OPEN/CLOSED/NO_DATA, timestamps y el
+    utc_offset en minutos de cada lugar (None si no se conoce), en el orden de
+    `points` (el primero es el punto de salida, en `start_ts` o ahora).
+    """
+    from opening_hours import NO_DATA, estimate_arrivals
+
+    start_ts = time.time() if start_ts is None else start_ts
+    arrivals = estimate_arrivals([_coords(p) for p in points], start_ts, mode=mode, dwell_s=dwell_s)
+    unknown = [NO_DATA] * len(points), list(arrivals), [None] * len(points)
+    service = get_opening_hours()
+    if service is None:
+        return unknown
+    try:
+        status, offsets = service.status(
+            [p.get("place_id") if isinstance(p, dict) else None for p in points], arrivals
+        )
+    except Exception as e:
+        _report_error("opening_hours", e)
+        return unknown
+    return [int(x) for x in status], list(arrivals), offsets
+
+# Caché de autocompletado compartida por todas las sesiones del proceso.
+AUTOCOMPLETE_CACHE = AutocompleteCache()
+
+# Instantáneas de las cachés en `SNAPSHOT_DIR` (ver snapshot.py): se abre la
+# última con mmap al primer uso y se guardan cada `SNAPSHOT_INTERVAL_S` y al salir.
+SNAPSHOT_DIR = _get_setting("SNAPSHOT_DIR")
+SNAPSHOT_INTERVAL_S = float(_get_setting("SNAPSHOT_INTERVAL_S", 600))
+_snapshots = None
+_snapshots_ready = False
+
+
+def _build_snapshots():
+    if not SNAPSHOT_DIR:
+        return None
+    try:
+        from snapshot import Snapshotter
+
+        snapshots = Snapshotter(SNAPSHOT_DIR)
+        snapshots.add("autocomplete", CACHES["autocomplete"])
+        snapshots.start(SNAPSHOT_INTERVAL_S)
+        return snapshots
+    except Exception as e:
+        _report_error("snapshots", e)
+        return None
+
+
+def get_snapshots():
+    """Instantáneas de las cachés (una vez por proceso) o None sin `SNAPSHOT_DIR`.
+
+    El resto de cachés (lugares, QR, matrices) se añaden al crearse.
+    """
+    global _snapshots, _snapshots_ready
+    with _lock:
+        if not _snapshots_ready:
+            _snapshots_ready = True
+            _snapshots = _build_snapshots()
+    return _snapshots
+
+
+# Nomenclátor local opcional (índice generado con `python gazetteer.py build`).
+GAZETTEER_PATH = _get_setting("GAZETTEER_INDEX")
+_gazetteer = None
+
+# Máximo de sugerencias que se muestran por caja.
+MAX_SUGGESTIONS = 5
+
+
+def get_gazetteer():
+    """Índice local de direcciones (se abre una vez por proceso) o None."""
+    global _gazetteer
+    with _lock:
+        if _gazetteer is None and GAZETTEER_PATH:
+            try:
+                _gazetteer = GazetteerIndex(GAZETTEER_PATH)
+            except Exception as e:
+                _report_error("get_gazetteer", e)
+                return None
+    return _gazetteer
+
+
+def _local_suggestions(query, limit=MAX_SUGGESTIONS):
+    index = get_gazetteer()
+    return index.search(query, limit=limit) if index else []
+
+
+def set_location_bias(lat: float, lng: float, radius_m: int = 50000):
+    """Fija el sesgo de ubicación de la sesión para el autocompletado."""
+    st.session_state["_location_bias"] = {
+        "lat": float(lat), "lng": float(lng), "radius_m": int(radius_m)
+    }
+
+
+_ip_bias = None
+
+
+def get_ip_bias():
+    """Ubicación por IP: tabla local opcional (`python ip_bias.py build`) o ipapi en segundo plano."""
+    global _ip_bias
+    with _lock:
+        if _ip_bias is None:
+            from ip_bias import IpBiasResolver
+
+            _ip_bias = IpBiasResolver(
+                table_path=_get_setting("IP_RANGES_INDEX"),
+                base_url=_get_setting("IPAPI_URL", "https://ipapi.co"),
+                session=get_http(),
+            )
+    return _ip_bias
+
+
+def _client_ip():
+    """IP del navegador de la sesión (None si Streamlit no la conoce)."""
+    try:
+        return st.context.ip_address
+    except Exception:
+        return None
+
+
+def _use_ip_bias(radius_m: int = 50000, request: bool = True):
+    """Fija el sesgo por IP si ya se conoce; si no, lo pide sin bloquear.
+
+    Devuelve "ready", "pending" o "failed".
+    """
+    ip = _client_ip()
+    resolver = get_ip_bias()
+    bias = resolver.lookup(ip, start=request)
+    if bias:
+        set_location_bias(bias["lat"], bias["lng"], radius_m=radius_m)
+        return "ready"
+    if resolver.is_pending(ip):
+        return "pending"
+    return "failed" if resolver.has_failed(ip) else "pending"
+
+
+def get_location_bias():
+    """Sesgo de ubicación activo en la sesión (o None)."""
+    try:
+        return st.session_state.get("_location_bias")
+    except Exception:
+        # Fuera de una sesión de Streamlit (scripts, CLI) no hay sesgo.
+        return None
+
+
+def suggest_addresses(query: str, key_bucket="default", min_len: int = 3,
+                      session_token=None):
+    """Sugerencias de direcciones (Google Places / SerpAPI / Nominatim, con caché compartida).
+
+    Los proveedores se consultan en paralelo (ver `providers.py`). Si no hay
+    ninguno configurado, o ninguno responde, contesta el nomenclátor local
+    (`GAZETTEER_INDEX`); si responden, la lista se completa con resultados locales.
+    """
+    if not query or len(query) < min_len:
+        return []
+
+    suggester = get_suggester()
+    if suggester is None:
+        return _local_suggestions(query)
+
+    from providers import merge_results
+
+    get_snapshots()
+    bias = get_location_bias()
+    cached = AUTOCOMPLETE_CACHE.get(query, key_bucket, bias)
+    if cached is not None:
+        return cached or _local_suggestions(query)
+
+    suggestions, complete = suggester.suggest_with_status(
+        query, bias=bias, session_token=session_token, limit=MAX_SUGGESTIONS
+    )
+    if not suggestions:
+        if complete:
+            # Los proveedores respondieron que no hay nada: tampoco lo habrá al seguir escribiendo.
+            AUTOCOMPLETE_CACHE.set(query, [], key_bucket, bias, complete=True)
+        return _local_suggestions(query)
+    merged = merge_results([suggestions, _local_suggestions(query)], limit=MAX_SUGGESTIONS)
+    # Completa según lo que devolvieron los proveedores, no contando los resultados locales.
+    AUTOCOMPLETE_CACHE.set(query, merged, key_bucket, bias, complete=complete)
+    return merged
+
+
+# Cajas de búsqueda con autocompletado (su `key_bucket`), para precalentar la caché.
+SUGGEST_BUCKETS = ("trav_from", "trav_to", "trav_mid", "tour_from", "tour_to")
+
+
+def prewarm_caches(addresses, max_prefix=12, matrix=False):
+    """Llena las cachés con direcciones populares (ver `python snapshot.py build`).
+
+    Pide las sugerencias de cada prefijo una sola vez (sin sesgo de ubicación)
+    y las copia a todas las cajas; después resuelve las direcciones y, con
+    `matrix`, pide la matriz de tiempos entre todas ellas.
+    """
+    from distance_matrix import DistanceMatrixService
+    from providers import merge_results
+    from rate_limit import ROUTE, lane
+
+    get_snapshots()
+    prefixes = {}
+    for address in addresses:
+        for n in [*range(2, min(len(address), max_prefix) + 1), len(address)]:
+            prefixes.setdefault(normalize_query(address[:n]), address[:n])
+    suggested = 0
+    suggester = get_suggester()
+    if suggester is not None:
+        with lane(ROUTE):
+            for query in prefixes.values():
+                results, complete = suggester.suggest_with_status(query, limit=MAX_SUGGESTIONS)
+                if not results:
+                    continue
+                results = merge_results([results, _local_suggestions(query)], limit=MAX_SUGGESTIONS)
+                for bucket in SUGGEST_BUCKETS:
+                    AUTOCOMPLETE_CACHE.set(query, results, bucket, complete=complete)
+                suggested += 1
+
+    with lane(ROUTE):
+        places = resolve_many(addresses, key_bucket="prewarm")
+    located = [p for p in places if p.get("lat") is not None]
+    pairs = 0
+    service = get_matrix_service() if matrix else None
+    if isinstance(service, DistanceMatrixService) and len(located) > 1:
+        service.matrices(located)
+        pairs = len(located) * (len(located) - 1)
+    return {"addresses": len(addresses), "prefixes": len(prefixes), "suggested": suggested,
+            "resolved": len(located), "matrix_pairs": pairs}
+
+
+def _get_key(key_bucket, name):
+    """Clave de session_state para una caja de búsqueda ('trav_from', 'q' -> 'trav_from_q')."""
+    return f"{key_bucket}_{name}"
+
+
+def _suggest_state():
+    return st.session_state.setdefault("_suggest_boxes", {})
+
+
+def suggest_for_box(query: str, key_bucket: str, min_len: int = 2):
+    """Sugerencias (etiquetas) para una caja concreta, consciente de los reruns.
+
+    Recuerda la última consulta y resultados de cada caja en la sesión: si el
+    texto no ha cambiado desde el rerun anterior no se hace ninguna petición
+    (salvo que la anterior fallara o no trajera nada: entonces se reintenta).
+    Las pulsaciones de una misma caja comparten un session token de Places
+    hasta que se resuelve la selección (ver `end_suggest_session`).
+    """
+    query = (query or "").strip()
+    boxes = _suggest_state()
+    box = boxes.get(key_bucket)
+    if box is not None and box["q"] == query and box["labels"]:
+        return box["labels"]
+
     if not query or len(query) < min_len:
+        boxes[key_bucket] = {"q": query, "labels": [], "results": [], "token": None}
         return []
 
+    token = (box or {}).get("token") or uuid.uuid4().hex
     try:
-        results = gmaps.places_autocomplete(input_text=query)
-        return [{"description": r["description"]} for r in results]
+        results = suggest_addresses(query, key_bucket, min_len=min_len, session_token=token)
     except Exception as e:
-        print(f"[suggest_addresses] Error: {e}")
-        return []
+        _report_error("suggest_for_box", e)
+        results = []
+    labels = [r["description"] for r in results]
+    boxes[key_bucket] = {"q": query, "labels": labels, "results": results, "token": token}
+    return labels
+
+
+def box_suggestion(key_bucket: str, label: str):
+    """Sugerencia completa (con place_id) que la caja ofreció para `label`, si existe."""
+    box = _suggest_state().get(key_bucket) or {}
+    for r in box.get("results", []):
+        if r["description"] == label:
+            return r
+    return None
+
+
+def end_suggest_session(key_bucket: str):
+    """Cierra la sesión de autocompletado de la caja (la próxima tecla abre otra)."""
+    box = _suggest_state().get(key_bucket)
+    if box is not None:
+        token, box["token"] = box.get("token"), None
+        return token
+    return None
+
+
+def _place_from_result(label, r):
+    loc = r["geometry"]["location"]
+    return {
+        "label": label,
+        "address": r.get("formatted_address") or label,
+        "place_id": r.get("place_id"),
+        "lat": loc["lat"],
+        "lng": loc["lng"],
+    }
+
+
+def _pending_suggestion(label, key_bucket):
+    """Sugerencia de la caja para `label` y su session token (solo en el hilo del script)."""
+    try:
+        suggestion = box_suggestion(key_bucket, label)
+    except Exception:
+        # Fuera de una sesión de Streamlit no hay estado de cajas.
+        return None, None
+    token = None
+    if suggestion and suggestion.get("place_id") and not suggestion.get("location"):
+        token = end_suggest_session(key_bucket)
+    return suggestion, token
+
+
+def _geocode(label, suggestion=None, session_token=None):
+    """Resuelve una etiqueta por red (o localmente si la sugerencia ya traía coordenadas)."""
+    if suggestion and suggestion.get("location"):
+        loc = suggestion["location"]
+        return {"label": label, "address": label, "place_id": suggestion.get("place_id"),
+                "lat": loc["lat"], "lng": loc["lng"]}
+
+    gmaps = get_gmaps()
+    if gmaps:
+        if suggestion and suggestion.get("place_id"):
+            # Place Details con el token de la sesión de autocompletado: cierra la sesión.
+            r = gmaps.place(
+                suggestion["place_id"], session_token=session_token,
+                fields=["place_id", "formatted_address", "geometry/location"],
+            )["result"]
+            return _place_from_result(label, r)
+        results = gmaps.geocode(label)
+        if results:
+            return _place_from_result(label, results[0])
+        return None
+
+    local = _local_suggestions(label, limit=1)
+    if local:
+        loc = local[0]["location"]
+        return {"label": label, "address": local[0]["description"], "place_id": None,
+                "lat": loc["lat"], "lng": loc["lng"]}
+    return None
+
+
+def resolve_many(labels, key_bucket="default", progress=None):
+    """Resuelve varias direcciones de una vez (lista de dicts en el mismo orden).
+
+    Primero se consulta el almacén persistente; lo que falta o ha caducado se
+    geocodifica en paralelo (como mucho `RESOLVE_CONCURRENCY` peticiones a la
+    vez en todo el proceso). Una dirección que falla no rompe la ruta: se
+    devuelve tal cual (`{"address": etiqueta, "error": ...}`).
+    `progress(hechas, total)` se llama en el hilo de quien invoca.
+    """
+    labels = list(labels)
+    store = get_place_store()
+    known = store.get_many([l for l in labels if l])
+    resolved, errors = {}, {}
+    to_fetch = []
+    for label in dict.fromkeys(l for l in labels if l):
+        place = known.get(label)
+        if place is not None and not place.get("stale"):
+            resolved[label] = place
+        else:
+            to_fetch.append(label)
+
+    total = len(to_fetch)
+    if progress:
+        progress(0, total)
+    futures = {}
+    for label in to_fetch:
+        suggestion, token = _pending_suggestion(label, key_bucket)
+        futures[_RESOLVE_POOL.submit(_geocode, label, suggestion, token)] = label
+
+    fresh = {}
+    for done, fut in enumerate(as_completed(futures), 1):
+        label = futures[fut]
+        try:
+            new = fut.result()
+        except Exception as e:
+            _report_error("resolve_many", f"'{label}': {e}")
+            errors[label] = str(e)
+            new = None
+        if new is not None:
+            fresh[label] = new
+            resolved[label] = new
+        elif known.get(label) is not None:
+            resolved[label] = known[label]  # caducado, pero mejor que nada
+        else:
+            errors.setdefault(label, "Sin resultados")
+        if progress:
+            progress(done, total)
+
+    store.put_many(fresh)
+    out = []
+    for label in labels:
+        place = resolved.get(label)
+        if place is None:
+            place = {"label": label, "address": label}
+            if label in errors:
+                place["error"] = errors[label]
+        out.append(place)
+    return out
+
+
+def resolve_selection(label, key_bucket="default"):
+    """Resuelve la etiqueta elegida en una caja a {label, address, place_id, lat, lng}."""
+    return resolve_many([label], key_bucket)[0]
+
+
+def remember_place(label, place):
+    """Guarda un lugar ya resuelto en el cliente para que `resolve_selection` no vaya a la red."""
+    loc = place.get("location") or {}
+    if loc.get("lat") is None or loc.get("lng") is None:
+        return
+    get_place_store().put(label, {
+        "address": place.get("formatted_address") or place.get("address") or label,
+        "place_id": place.get("place_id"),
+        "lat": loc["lat"],
+        "lng": loc["lng"],
+    })
+
+
+def quota_usage():
+    """Uso de cuota de Google de hoy por endpoint (llamadas, rechazos, fichas)."""
+    return get_quota().usage()
+
+
+metrics.register_gauges("quota", "endpoint", quota_usage)
+
+
+def provider_stats():
+    """Llamadas, errores y cortacircuitos de cada proveedor de autocompletado.
+
+    Los contadores de la caché están en `CACHES["autocomplete"]` (ver metrics.snapshot).
+    """
+    # No se construye el suggester solo para leer sus métricas.
+    suggester = _suggester if _suggester_ready else None
+    if suggester is None:
+        return {}
+    return {
+        name: {**s, "breaker_open": int(s["breaker"] == "open")}
+        for name, s in suggester.stats().items()
+    }
+
+
+metrics.register_gauges("provider", "provider", provider_stats)
+
+
+def _coords(x):
+    """(lat, lng) de un punto resuelto (dict con lat/lng o location), o None."""
+    if not isinstance(x, dict):
+        return None
+    loc = x.get("location") or x
+    lat, lng = loc.get("lat"), loc.get("lng")
+    if lat is None or lng is None:
+        return None
+    return float(lat), float(lng)
+
+
+def optimize_waypoints(origin, destination, waypoints, mode="driving"):
+    """Reordena las paradas localmente si todas tienen coordenadas; si no, las deja igual.
+
+    Con `ROUTE_MATRIX=google` usa duraciones reales (Distance Matrix con caché);
+    si esa petición falla, vuelve a la distancia en línea recta.
+    """
+    if not waypoints or len(waypoints) < 2:
+        return waypoints
+    points = [_coords(origin), _coords(destination)] + [_coords(w) for w in waypoints]
+    if any(p is None for p in points):
+        return waypoints
+    from route_optimizer import optimize_stops
+
+    try:
+        matrix = None
+        service = get_matrix_service()
+        if service is not None:
+            try:
+                matrix = service.duration_matrix([origin, *waypoints, destination], mode=mode)
+            except Exception as e:
+                _report_error("distance_matrix", e)
+        order = optimize_stops(points[0], points[1], points[2:], matrix=matrix)
+        return [waypoints[k] for k in order]
+    except Exception as e:
+        _report_error("optimize_waypoints", e)
+        return waypoints
 
 
 def build_gmaps_url(origin=None, destination=None, waypoints=None,
                     mode="driving", avoid=None, optimize=True):
-    """Construye una URL de Google Maps con múltiples paradas."""
+    """Construye una URL de Google Maps con múltiples paradas.
+
+    Las URL de Google Maps ignoran `optimizeWaypoints`, así que con `optimize=True`
+    el orden se calcula aquí (ver `optimize_waypoints`) cuando hay coordenadas.
+    """
     try:
+        if optimize:
+            waypoints = optimize_waypoints(origin, destination, waypoints, mode=mode or "driving")
+
         def addr(x):
             if not x:
                 return ""
@@ -53,15 +793,46 @@ def build_gmaps_url(origin=None, destination=None, waypoints=None,
             url += f"&travelmode={mode}"
         if avoid:
             url += f"&avoid={avoid}"
-        if optimize:
-            url += "&optimizeWaypoints=true"
 
         return url
     except Exception as e:
-        print(f"[build_gmaps_url] Error: {e}")
+        _report_error("build_gmaps_url", e)
         return None
 
 
+def plan_vehicle_routes(origin, destination, waypoints, vehicles, mode="driving", capacity=None,
+                        avoid=None):
+    """Reparte las paradas resueltas entre `vehicles` rutas y genera enlaces y QR de cada una.
+
+    Las paradas sin coordenadas no se pueden agrupar: van al vehículo con menos paradas.
+    Devuelve una lista de dicts {stops, gmaps_url, waze_url, apple_url, qr}.
+    """
+    from fleet_planner import plan_fleet
+
+    located = [i for i, w in enumerate(waypoints) if _coords(w) is not None]
+    routes = plan_fleet(
+        _coords(origin), _coords(destination), [_coords(waypoints[i]) for i in located],
+        vehicles, capacity=capacity,
+    ) if _coords(origin) and _coords(destination) else []
+    routes = [[located[k] for k in r] for r in routes] or [[]]
+    for i, w in enumerate(waypoints):
+        if _coords(w) is None:
+            min(routes, key=len).append(i)
+
+    out = []
+    for r in routes:
+        stops = [waypoints[i] for i in r]
+        url = build_gmaps_url(origin, destination, stops, mode=mode, avoid=avoid, optimize=False)
+        out.append({
+            "stops": stops,
+            "gmaps_url": url,
+            "waze_url": build_waze_url(origin, destination),
+            "apple_url": build_apple_maps_url(origin, destination),
+            "qr": make_qr(url) if url else None,
+        })
+    return out
+
+
 def build_waze_url(origin=None, destination=None):
     """Construye una URL para Waze con origen y destino."""
     try:
@@ -83,7 +854,7 @@ def build_waze_url(origin=None, destination=None):
         else:
             return f"https://waze.com/ul?to={d}&navigate=yes"
     except Exception as e:
-        print(f"[build_waze_url] Error: {e}")
+        _report_error("build_waze_url", e)
         return None
 
 
@@ -107,5 +878,67 @@ def build_apple_maps_url(origin=None, destination=None):
             base += f"daddr={d}&"
         return base + "dirflg=d"
     except Exception as e:
-        print(f"[build_apple_maps_url] Error: {e}")
+        _report_error("build_apple_maps_url", e)
+        return None
+
+
+_render_qr = None
+
+
+def _get_render_qr():
+    """`qr_engine.render_qr` (qrcode se importa al primer QR; su caché entra en las instantáneas)."""
+    global _render_qr
+    with _lock:
+        if _render_qr is None:
+            from qr_engine import render_qr
+
+            snapshots = get_snapshots()
+            if snapshots is not None:
+                snapshots.add("qr", CACHES["qr"])
+            _render_qr = render_qr
+    return _render_qr
+
+
+def make_qr(url: str, box_size: int = 8, border: int = 2, fmt: str = "png", error: str = "auto"):
+    """Genera el QR (PNG o SVG en bytes) de una URL, con caché compartida (ver qr_engine)."""
+    try:
+        return _get_render_qr()(url, fmt=fmt, error=error, box_size=box_size, border=border)
+    except Exception as e:
+        _report_error("make_qr", e)
+        return None
+
+
+# Historial de rutas por sesión: tope de rutas y de bytes (QR incluidos) por sesión.
+HISTORY_MAX_ROUTES = int(_get_setting("HISTORY_MAX_ROUTES", 20))
+HISTORY_MAX_BYTES = int(_get_setting("HISTORY_MAX_BYTES", 256 * 1024))
+
+
+def session_history():
+    """Historial de rutas de la sesión actual."""
+    return st.session_state.setdefault(
+        "_route_history", RouteHistory(HISTORY_MAX_ROUTES, HISTORY_MAX_BYTES)
+    )
+
+
+# Puntos como máximo en la geometría que se envía al mapa (por todas las rutas).
+MAP_PREVIEW_MAX_POINTS = int(_get_setting("MAP_PREVIEW_MAX_POINTS", 1500))
+
+
+def show_route_map(routes, height=420):
+    """Mapa con una o varias rutas ({stops, polyline?}); sin polilínea se unen las paradas."""
+    try:
+        from route_preview import render_preview
+
+        return render_preview(routes, height=height, max_points=MAP_PREVIEW_MAX_POINTS)
+    except Exception as e:
+        _report_error("show_route_map", e)
+        return None
+
+
+def record_route(tab, stops, gmaps_url, waze_url=None, apple_url=None, mode="driving"):
+    """Guarda una ruta recién generada (con su QR) para poder repetirla sin red."""
+    if not gmaps_url:
         return None
+    record = RouteRecord(tab, stops, gmaps_url, waze_url=waze_url, apple_url=apple_url,
+                         mode=mode, qr=make_qr(gmaps_url))
+    return session_history().add(record)
@@ -0,0 +1,65 @@
+# autocomplete_component.py
+"""Caja de direcciones como componente de Streamlit, con el autocompletado en el navegador.
+
+El frontend (`components/autocomplete/index.html`) pide las sugerencias a
+Places desde el navegador con retardo, las cachea por prefijo y se navega con
+el teclado sin hablar con el servidor. A Python solo llega el lugar elegido
+({address, place_id, location}), así que cada dirección cuesta un único rerun
+y ninguna llamada a Places desde el servidor.
+"""
+import os
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+from app_utils import BROWSER_MAPS_KEY, get_location_bias, remember_place
+
+_FRONTEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "autocomplete")
+_component = components.declare_component("place_autocomplete", path=_FRONTEND)
+
+
+def enabled():
+    """True si hay clave de Maps JavaScript y se puede usar el componente."""
+    return bool(BROWSER_MAPS_KEY)
+
+
+def place_autocomplete(key, placeholder="", value="", bias=None, language="es", country=None,
+                       min_len=3, debounce_ms=250, reset=0):
+    """Renderiza la caja y devuelve el último lugar elegido (dict) o None.
+
+    Cambiar `reset` vacía el texto de la caja en el navegador.
+    """
+    return _component(
+        key=key, api_key=BROWSER_MAPS_KEY, placeholder=placeholder, value=value, bias=bias,
+        language=language, country=country, min_len=min_len, debounce_ms=debounce_ms,
+        reset=reset, default=None,
+    )
+
+
+def clear(key_q):
+    """Vacía la caja de `key_q` también en el navegador (para el botón "Limpiar")."""
+    st.session_state[f"{key_q}__reset"] = st.session_state.get(f"{key_q}__reset", 0) + 1
+
+
+def address_box(label, key_q, key_sel, placeholder=""):
+    """Sustituto de la caja texto + sugerencias de las pestañas.
+
+    Deja la dirección elegida en `st.session_state[key_q]` (y la selección en
+    `key_sel`) igual que la caja clásica, y guarda sus coordenadas en el
+    almacén de lugares. Devuelve la lista de etiquetas ([dirección] o []).
+    """
+    st.caption(label)
+    picked = place_autocomplete(
+        key=f"{key_q}__client", placeholder=placeholder,
+        value=st.session_state.get(key_q, ""), bias=get_location_bias(),
+        reset=st.session_state.get(f"{key_q}__reset", 0),
+    )
+    # El valor del componente persiste entre reruns: solo se aplica cada elección una vez
+    # (así "Limpiar" no vuelve a traer la dirección anterior).
+    if picked and picked.get("address") and st.session_state.get(f"{key_q}__ts") != picked.get("ts"):
+        st.session_state[f"{key_q}__ts"] = picked.get("ts")
+        remember_place(picked["address"], picked)
+        st.session_state[key_q] = picked["address"]
+        st.session_state[key_sel] = 0
+    address = st.session_state.get(key_q) or ""
+    return [address] if address else []
@@ -0,0 +1,209 @@
+# batch_routes.py
+"""Generación de rutas por lotes, sin interfaz (enlaces + QR para muchos conductores).
+
+Lee trabajos de un CSV (columnas id, origin, destination, stops con paradas
+separadas por "|") o de un JSONL ({"id", "origin", "destination", "stops": [...]},
+donde stops también puede ser un texto "A|B"), los procesa en paralelo con un
+pool de procesos y va escribiendo `<salida>/results.jsonl` y
+`<salida>/qr/<id>-<hash>.png`.
+
+La lectura y la escritura van en streaming con un número acotado de trabajos
+en vuelo, así que la memoria no crece con el tamaño del fichero. Si se
+interrumpe, al relanzar se saltan los trabajos que ya están en results.jsonl.
+
+    python batch_routes.py trabajos.csv --out salida --workers 8
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+
+def read_jobs(path):
+    """Itera los trabajos del fichero (CSV o JSONL) sin cargarlo entero."""
+    if path.endswith((".jsonl", ".ndjson")):
+        with open(path, encoding="utf-8") as fh:
+            for n, line in enumerate(fh, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                job = json.loads(line)
+                job.setdefault("id", str(n))
+                yield job
+        return
+
+    with open(path, newline="", encoding="utf-8") as fh:
+        for n, row in enumerate(csv.DictReader(fh), 1):
+            stops = row.get("stops") or ""
+            yield {
+                "id": row.get("id") or str(n),
+                "origin": row.get("origin", ""),
+                "destination": row.get("destination", ""),
+                "stops": [s.strip() for s in stops.split("|") if s.strip()],
+            }
+
+
+def load_done_ids(results_path):
+    """Ids ya procesados en una ejecución anterior (ignora una última línea a medias)."""
+    done = set()
+    if not os.path.exists(results_path):
+        return done
+    with open(results_path, encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                done.add(str(json.loads(line)["id"]))
+            except (ValueError, KeyError):
+                continue
+    return done
+
+
+def trim_partial_line(results_path):
+    """Corta una última línea a medias (ejecución anterior interrumpida) para poder seguir añadiendo."""
+    if not os.path.exists(results_path):
+        return
+    with open(results_path, "rb+") as fh:
+        end = fh.seek(0, os.SEEK_END)
+        pos = end
+        while pos > 0:
+            step = min(4096, pos)
+            fh.seek(pos - step)
+            chunk = fh.read(step)
+            nl = chunk.rfind(b"\n")
+            if nl != -1:
+                pos = pos - step + nl + 1
+                break
+            pos -= step
+        if pos != end:
+            fh.truncate(pos)
+
+
+def _safe_name(job_id):
+    """Nombre de fichero para un id; el hash evita choques ('a/b' y 'a_b', ids largos)."""
+    raw = str(job_id)
+    digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:10]
+    return f"{re.sub(r'[^A-Za-z0-9._-]+', '_', raw)[:120] or 'job'}-{digest}"
+
+
+def _stops(value):
+    """Paradas de un trabajo: lista, o texto con "|" como en el CSV. None si no es válido."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [s.strip() for s in value.split("|") if s.strip()]
+    if isinstance(value, list):
+        return value
+    return None
+
+
+def process_job(job, qr_dir=None, mode="driving"):
+    """Construye los enlaces (y el QR) de un trabajo. Se ejecuta en los procesos del pool."""
+    from app_utils import build_apple_maps_url, build_gmaps_url, build_waze_url, make_qr
+
+    origin, destination = job.get("origin"), job.get("destination")
+    stops = _stops(job.get("stops"))
+    result = {"id": str(job["id"])}
+    if not origin or not destination:
+        result["error"] = "Falta origen o destino"
+        return result
+    if stops is None:
+        result["error"] = 'stops debe ser una lista o un texto con paradas separadas por "|"'
+        return result
+
+    gmaps_url = build_gmaps_url(origin, destination, stops or None, mode=mode)
+    result.update({
+        "gmaps_url": gmaps_url,
+        "waze_url": build_waze_url(origin, destination),
+        "apple_url": build_apple_maps_url(origin, destination),
+    })
+    if qr_dir and gmaps_url:
+        png = make_qr(gmaps_url)
+        if png:
+            qr_path = os.path.join(qr_dir, f"{_safe_name(job['id'])}.png")
+            with open(qr_path, "wb") as fh:
+                fh.write(png)
+            result["qr_path"] = qr_path
+    return result
+
+
+def run(input_path, out_dir, workers=None, qr=True, mode="driving", max_in_flight=None,
+        report_every_s=5.0):
+    """Procesa todos los trabajos pendientes y devuelve un resumen con el rendimiento."""
+    os.makedirs(out_dir, exist_ok=True)
+    qr_dir = os.path.join(out_dir, "qr") if qr else None
+    if qr_dir:
+        os.makedirs(qr_dir, exist_ok=True)
+    results_path = os.path.join(out_dir, "results.jsonl")
+    trim_partial_line(results_path)
+    done_ids = load_done_ids(results_path)
+
+    workers = workers or os.cpu_count() or 2
+    max_in_flight = max_in_flight or workers * 4
+    processed = skipped = errors = 0
+    start = last_report = time.monotonic()
+
+    with open(results_path, "a", encoding="utf-8") as out, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = {}  # futuro -> id del trabajo
+
+        def drain(return_when):
+            nonlocal processed, errors
+            done, _ = wait(in_flight, return_when=return_when)
+            for fut in done:
+                job_id = in_flight.pop(fut)
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    # Un trabajo que falla (o un proceso caído) no tira el lote entero.
+                    res = {"id": job_id, "error": f"{type(e).__name__}: {e}"}
+                if "error" in res:
+                    errors += 1
+                out.write(json.dumps(res, ensure_ascii=False) + "\n")
+                processed += 1
+            out.flush()
+
+        for job in read_jobs(input_path):
+            if str(job.get("id")) in done_ids:
+                skipped += 1
+                continue
+            in_flight[pool.submit(process_job, job, qr_dir, mode)] = str(job.get("id"))
+            if len(in_flight) >= max_in_flight:
+                drain(FIRST_COMPLETED)
+            now = time.monotonic()
+            if now - last_report >= report_every_s:
+                last_report = now
+                rate = processed / (now - start)
+                print(f"[batch] {processed} rutas, {rate:.1f} rutas/s", file=sys.stderr)
+        if in_flight:
+            drain(ALL_COMPLETED)
+
+    elapsed = time.monotonic() - start
+    return {
+        "processed": processed,
+        "skipped": skipped,
+        "errors": errors,
+        "seconds": round(elapsed, 2),
+        "jobs_per_s": round(processed / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Genera enlaces y QR de rutas por lotes.")
+    ap.add_argument("input", help="Fichero CSV o JSONL de trabajos")
+    ap.add_argument("--out", default="batch_output", help="Carpeta de salida")
+    ap.add_argument("--workers", type=int, default=None, help="Procesos (por defecto, nº de CPUs)")
+    ap.add_argument("--mode", default="driving", help="travelmode de Google Maps")
+    ap.add_argument("--no-qr", action="store_true", help="No generar imágenes QR")
+    args = ap.parse_args(argv)
+
+    summary = run(args.input, args.out, workers=args.workers, qr=not args.no_qr, mode=args.mode)
+    print(json.dumps(summary, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
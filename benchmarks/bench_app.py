@@ -0,0 +1,258 @@
+# benchmarks/bench_app.py
+"""Suite de rendimiento de las pestañas con AppTest y un backend de Maps falso (sin red).
+
+Mide:
+  - rerun por pulsación en las cajas de Viajero y Turístico (caché fría y caliente),
+  - "Generar ruta" en Profesional con 1..500 paradas,
+  - rendimiento de los constructores de URL,
+  - renderizado de QR.
+
+Escribe un JSON con los resultados. Con `--baseline` los compara con esa
+referencia y sale con código 1 si alguna métrica empeora más de `--tolerance`;
+si la referencia no existe se crea con esta ejecución y `--update-baseline` la
+reescribe tras un cambio de rendimiento aceptado. Los tiempos son absolutos, así
+que la referencia solo sirve en la máquina donde se midió:
+`benchmarks/baseline.json` (versionada) es la del contenedor de desarrollo y
+no se compara por defecto.
+
+    python benchmarks/bench_app.py --out benchmarks/results/actual.json
+    python benchmarks/bench_app.py --baseline mi_maquina.json --tolerance 0.5
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(__file__))
+
+# Almacenes persistentes en un directorio temporal: cada ejecución empieza en frío.
+_TMP = tempfile.mkdtemp(prefix="bench_app_")
+os.environ.setdefault("PLACES_DB", os.path.join(_TMP, "places.sqlite3"))
+os.environ.setdefault("DISTANCE_CACHE_DB", os.path.join(_TMP, "distance.sqlite3"))
+os.environ["GOOGLE_PLACES_API_KEY"] = ""
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from fakes import install_fake_backend  # noqa: E402
+
+KEYSTROKES = ["Calle Mayor 10, Madrid", "Sagrada Familia, Barcelona", "Plaza del Pilar, Zaragoza"]
+
+
+def _pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def _summary(values):
+    return {
+        "n": len(values),
+        "p50_ms": round(_pct(values, 0.5) * 1000, 2),
+        "p95_ms": round(_pct(values, 0.95) * 1000, 2),
+        "max_ms": round(max(values) * 1000, 2) if values else 0.0,
+    }
+
+
+def _app():
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+    at.run()
+    return at
+
+
+def bench_keystrokes(view, box_key, latency_s):
+    """Escribe varias direcciones letra a letra; la segunda pasada ya encuentra la caché caliente."""
+    install_fake_backend(latency_s=latency_s)
+    out = {}
+    for pasada in ("cold", "warm"):
+        at = _app()
+        at.radio[0].set_value(view).run()
+        times = []
+        for texto in KEYSTROKES:
+            for i in range(1, len(texto) + 1):
+                t0 = time.perf_counter()
+                at.text_input(box_key).input(texto[:i]).run()
+                times.append(time.perf_counter() - t0)
+        out[pasada] = _summary(times)
+    return out
+
+
+def bench_profesional(stop_counts, latency_s):
+    """Pulsa "Generar ruta" con N paradas (resolución + optimización + URL)."""
+    rows = []
+    for n in stop_counts:
+        install_fake_backend(latency_s=latency_s)
+        at = _app()
+        at.text_input("prof_origen").input("Puerta del Sol, Madrid")
+        at.text_input("prof_destino").input("Plaza Mayor, Salamanca")
+        at.text_area("prof_paradas").input("\n".join(f"Parada {k}, Madrid" for k in range(n)))
+        at.run()
+        runs = []
+        for _ in range(2):  # 1ª: resolviendo por red; 2ª: todo desde el almacén
+            t0 = time.perf_counter()
+            at.button("prof_btn_generar").click().run()
+            runs.append(time.perf_counter() - t0)
+        rows.append({"stops": n, "first_ms": round(runs[0] * 1000, 1),
+                     "repeat_ms": round(runs[1] * 1000, 1)})
+    return rows
+
+
+def bench_url_builders(stop_counts, repeat=200):
+    from app_utils import build_apple_maps_url, build_gmaps_url, build_waze_url
+
+    rows = []
+    for n in stop_counts:
+        stops = [{"address": f"Parada {k}", "lat": 40 + k * 1e-3, "lng": -3 - (k % 7) * 1e-3}
+                 for k in range(n)]
+        o = {"address": "Origen", "lat": 40.0, "lng": -3.0}
+        d = {"address": "Destino", "lat": 40.5, "lng": -3.5}
+        reps = max(1, repeat // max(1, n // 10))
+        t0 = time.perf_counter()
+        for _ in range(reps):
+            build_gmaps_url(o, d, stops)
+            build_waze_url(o, d)
+            build_apple_maps_url(o, d)
+        per = (time.perf_counter() - t0) / reps
+        rows.append({"stops": n, "per_call_ms": round(per * 1000, 3), "calls_per_s": round(1 / per, 1)})
+    return rows
+
+
+def bench_qr(lengths=(100, 500, 1500)):
+    from qr_engine import QR_CACHE, render_qr
+
+    rows = []
+    for n in lengths:
+        url = ("https://www.google.com/maps/dir/?api=1&waypoints=" + "Calle Mayor 1, Madrid|" * n)[:n]
+        QR_CACHE.clear()
+        t0 = time.perf_counter()
+        render_qr(url)
+        cold = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        render_qr(url)
+        warm = time.perf_counter() - t0
+        rows.append({"url_len": n, "cold_ms": round(cold * 1000, 2), "cached_us": round(warm * 1e6, 2)})
+    return rows
+
+
+def _flatten(data, prefix=""):
+    """Métricas numéricas de tiempo como {ruta: valor} para comparar con la referencia."""
+    flat = {}
+    if isinstance(data, dict):
+        for k, v in data.items():
+            flat.update(_flatten(v, f"{prefix}{k}."))
+    elif isinstance(data, list):
+        for row in data:
+            key = next((f"{k}={row[k]}" for k in ("stops", "url_len") if k in row), None)
+            flat.update(_flatten({kk: vv for kk, vv in row.items() if kk not in ("stops", "url_len")},
+                                 f"{prefix}{key}."))
+    elif isinstance(data, (int, float)) and prefix.rstrip(".").endswith(("_ms", "_us")):
+        flat[prefix.rstrip(".")] = data
+    return flat
+
+
+def _median(runs):
+    """Combina varias ejecuciones (misma estructura) quedándose con la mediana de cada número."""
+    first = runs[0]
+    if isinstance(first, dict):
+        return {k: _median([r[k] for r in runs]) for k in first}
+    if isinstance(first, list):
+        return [_median(list(rows)) for rows in zip(*runs)]
+    if isinstance(first, (int, float)) and not isinstance(first, bool):
+        values = sorted(runs)
+        return values[len(values) // 2]
+    return first
+
+
+def compare(current, baseline, tolerance, min_delta_ms=10.0):
+    """Lista de regresiones (métricas de tiempo que empeoran más de `tolerance`).
+
+    Los máximos (una sola muestra) no se comparan, y una diferencia de menos
+    de `min_delta_ms` se considera ruido aunque supere la tolerancia.
+    """
+    cur, base = _flatten(current["results"]), _flatten(baseline["results"])
+    regressions = []
+    for key, old in base.items():
+        new = cur.get(key)
+        if new is None or old <= 0 or key.endswith("max_ms"):
+            continue
+        delta_ms = (new - old) / 1000 if key.endswith("_us") else new - old
+        if new > old * (1 + tolerance) and delta_ms > min_delta_ms:
+            regressions.append({"metric": key, "baseline": old, "current": new,
+                                "ratio": round(new / old, 2)})
+    return regressions
+
+
+# Referencia versionada (contenedor de desarrollo); solo se usa si se pide.
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", default=os.path.join(ROOT, "benchmarks", "results", "latest.json"))
+    ap.add_argument("--baseline", default=None,
+                    help="JSON de referencia medido en esta misma máquina para detectar regresiones")
+    ap.add_argument("--update-baseline", action="store_true",
+                    help="Guardar esta ejecución como referencia (por defecto, benchmarks/baseline.json)")
+    ap.add_argument("--tolerance", type=float, default=0.5)
+    ap.add_argument("--min-delta-ms", type=float, default=10.0,
+                    help="Diferencia mínima para contar como regresión (ruido de medida)")
+    ap.add_argument("--latency-ms", type=float, default=20.0, help="Latencia del Maps falso")
+    ap.add_argument("--stops", type=int, nargs="+", default=[1, 10, 50, 100, 250, 500])
+    ap.add_argument("--quick", action="store_true", help="Menos paradas (para CI)")
+    ap.add_argument("--repeat", type=int, default=3,
+                    help="Ejecuciones de la suite; se informa la mediana de cada métrica")
+    args = ap.parse_args()
+
+    latency = args.latency_ms / 1000
+    stops = [1, 10, 50] if args.quick else args.stops
+    runs = []
+    for _ in range(max(1, args.repeat)):
+        runs.append({
+            "keystrokes_viajero": bench_keystrokes("Viajero", "trav_q_from", latency),
+            "keystrokes_turistico": bench_keystrokes("Turístico", "tour_q_from", latency),
+            "profesional_generate": bench_profesional(stops, latency),
+            "url_builders": bench_url_builders(stops),
+            "qr": bench_qr(),
+        })
+    results = _median(runs)
+    report = {
+        "meta": {"python": platform.python_version(), "machine": platform.machine(),
+                 "fake_latency_ms": args.latency_ms, "repeat": len(runs), "ts": time.time()},
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2, ensure_ascii=False)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if args.baseline is None:
+        if not args.update_baseline:
+            print("[bench] Sin comparación: usa --baseline <json de esta máquina> para "
+                  "detectar regresiones", file=sys.stderr)
+            return 0
+        args.baseline = DEFAULT_BASELINE
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2, ensure_ascii=False)
+        print(f"[bench] Referencia guardada en {args.baseline}", file=sys.stderr)
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as fh:
+        baseline = json.load(fh)
+    meta = baseline.get("meta", {})
+    if (meta.get("machine"), meta.get("fake_latency_ms")) != (report["meta"]["machine"], args.latency_ms):
+        print("[bench] Aviso: la referencia es de otra máquina o latencia; "
+              "la comparación es orientativa", file=sys.stderr)
+    regressions = compare(report, baseline, args.tolerance, args.min_delta_ms)
+    if regressions:
+        print(json.dumps({"regressions": regressions}, indent=2), file=sys.stderr)
+        return 1
+    print(f"[bench] Sin regresiones frente a {args.baseline}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
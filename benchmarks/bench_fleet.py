@@ -0,0 +1,65 @@
+# benchmarks/bench_fleet.py
+"""Escalado del reparto multi-vehículo: k-means equilibrado + ordenación de cada ruta.
+
+    python benchmarks/bench_fleet.py --stops 100 300 1000 2000 --vehicles 3 5 10
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fleet_planner import partition, plan_fleet  # noqa: E402
+from route_optimizer import haversine_matrix, path_cost  # noqa: E402
+
+
+def _points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    # Unas cuantas zonas densas (barrios) sobre una zona amplia, como una ciudad real.
+    centres = rng.uniform((40.30, -3.85), (40.55, -3.55), size=(8, 2))
+    pts = centres[rng.integers(len(centres), size=n)] + rng.normal(0, 0.015, size=(n, 2))
+    return [tuple(p) for p in pts]
+
+
+def run(n, k, budget):
+    origin, destination = (40.4168, -3.7038), (40.4530, -3.6883)
+    stops = _points(n)
+    t0 = time.perf_counter()
+    labels = partition(stops, k)
+    t_part = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    routes = plan_fleet(origin, destination, stops, k, time_budget_s=budget)
+    t_total = time.perf_counter() - t0
+    lengths = []
+    for r in routes:
+        pts = [origin, *(stops[i] for i in r), destination]
+        lengths.append(path_cost(haversine_matrix(pts), range(len(pts))))
+    sizes = np.bincount(labels, minlength=k)
+    return {
+        "stops": n,
+        "vehicles": k,
+        "partition_ms": round(t_part * 1000, 1),
+        "total_ms": round(t_total * 1000, 1),
+        "min_size": int(sizes.min()),
+        "max_size": int(sizes.max()),
+        "total_km": round(sum(lengths) / 1000, 1),
+        "longest_km": round(max(lengths) / 1000, 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--stops", type=int, nargs="+", default=[100, 300, 1000, 2000])
+    ap.add_argument("--vehicles", type=int, nargs="+", default=[3, 5, 10])
+    ap.add_argument("--budget", type=float, default=1.0, help="Segundos para ordenar todas las rutas")
+    args = ap.parse_args()
+    rows = [run(n, k, args.budget) for n in args.stops for k in args.vehicles]
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
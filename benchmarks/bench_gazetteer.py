@@ -0,0 +1,82 @@
+# benchmarks/bench_gazetteer.py
+"""Benchmark del nomenclátor local: construcción, carga (mmap) y consulta.
+
+Genera un CSV sintético del tamaño de un extracto de país y mide cada fase.
+
+    python benchmarks/bench_gazetteer.py --rows 1000000
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from gazetteer import GazetteerIndex, build_index  # noqa: E402
+
+_TIPOS = ["Calle", "Avenida", "Plaza", "Paseo", "Camino", "Carretera", "Ronda"]
+_NOMBRES = ["Mayor", "Real", "Sol", "Alcalá", "Gran Vía", "Constitución", "Castellana",
+            "Ángel", "Mártires", "Hernán Cortés", "Colón", "San Juan", "Santa María"]
+_CIUDADES = ["Madrid", "Barcelona", "Zaragoza", "Sevilla", "València", "Málaga",
+             "Bilbao", "Valladolid", "A Coruña", "Córdoba", "Cádiz", "León"]
+
+
+def _write_csv(path, rows, seed=1):
+    rnd = random.Random(seed)
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        w = csv.writer(fh)
+        w.writerow(["display_name", "lat", "lon", "importance"])
+        for i in range(rows):
+            name = f"{rnd.choice(_TIPOS)} {rnd.choice(_NOMBRES)} {i % 997}, {rnd.choice(_CIUDADES)}"
+            w.writerow([name, f"{rnd.uniform(36, 43.7):.6f}", f"{rnd.uniform(-9.3, 3.3):.6f}",
+                        f"{rnd.random():.4f}"])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--queries", type=int, default=2000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "extract.csv")
+        dst = os.path.join(tmp, "extract.gzi")
+        _write_csv(src, args.rows)
+
+        t0 = time.perf_counter()
+        info = build_index(src, dst)
+        build_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        index = GazetteerIndex(dst)
+        load_s = time.perf_counter() - t0
+
+        rnd = random.Random(2)
+        queries = [rnd.choice(_TIPOS + _NOMBRES + _CIUDADES)[: rnd.randint(3, 8)]
+                   for _ in range(args.queries)]
+        lat = []
+        for q in queries:
+            t0 = time.perf_counter()
+            index.search(q)
+            lat.append(time.perf_counter() - t0)
+        lat.sort()
+
+        result = {
+            "rows": args.rows,
+            "keys": info["keys"],
+            "index_mb": round(os.path.getsize(dst) / 1e6, 1),
+            "build_s": round(build_s, 2),
+            "load_ms": round(load_s * 1000, 3),
+            "query_p50_us": round(lat[len(lat) // 2] * 1e6, 1),
+            "query_p99_us": round(lat[int(len(lat) * 0.99)] * 1e6, 1),
+        }
+        index.close()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
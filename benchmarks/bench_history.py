@@ -0,0 +1,73 @@
+# benchmarks/bench_history.py
+"""Memoria del historial de rutas con miles de sesiones simultáneas (tracemalloc).
+
+Llena el historial de cada sesión con muchas más rutas de las que admite y
+comprueba que la memoria por sesión se estabiliza en el tope configurado.
+
+    python benchmarks/bench_history.py --sessions 5000 --routes 60
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from route_history import RouteHistory, RouteRecord  # noqa: E402
+
+
+def _route(rng, n_stops, qr_bytes):
+    stops = [{"address": f"Calle {rng.randint(1, 999)} {k}, Madrid",
+              "lat": 40 + rng.random(), "lng": -3 - rng.random()} for k in range(n_stops)]
+    url = "https://www.google.com/maps/dir/?api=1&" + "&".join(s["address"] for s in stops)
+    return RouteRecord("prof", stops, url, waze_url=url[:120], apple_url=url[:160],
+                       qr=rng.randbytes(qr_bytes))
+
+
+def measure(sessions, routes, max_items, max_bytes, n_stops, qr_bytes, seed=1):
+    rng = random.Random(seed)
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    histories = [RouteHistory(max_items, max_bytes) for _ in range(sessions)]
+    checkpoints = []
+    for r in range(1, routes + 1):
+        for h in histories:
+            h.add(_route(rng, n_stops, qr_bytes))
+        if r in (1, max_items, routes // 2, routes):
+            current = tracemalloc.get_traced_memory()[0] - base
+            checkpoints.append({
+                "routes_added": r,
+                "bytes_per_session": round(current / sessions),
+                "accounted_per_session": round(sum(h.nbytes for h in histories) / sessions),
+            })
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return {
+        "sessions": sessions,
+        "max_items": max_items,
+        "max_bytes": max_bytes,
+        "checkpoints": checkpoints,
+        "peak_mb": round(peak / 1e6, 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=5000)
+    ap.add_argument("--routes", type=int, default=60, help="Rutas generadas por sesión")
+    ap.add_argument("--max-items", type=int, default=20)
+    ap.add_argument("--max-bytes", type=int, default=64 * 1024)
+    ap.add_argument("--stops", type=int, default=8)
+    ap.add_argument("--qr-bytes", type=int, default=1500)
+    args = ap.parse_args()
+    res = measure(args.sessions, args.routes, args.max_items, args.max_bytes, args.stops, args.qr_bytes)
+    print(json.dumps(res, indent=2))
+    last = res["checkpoints"][-1]
+    # El tope contable debe acotar la memoria real (con holgura para objetos de Python).
+    return 0 if last["bytes_per_session"] <= 2 * args.max_bytes else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# benchmarks/bench_offline_routing.py
+"""Carga del grafo, encaje y consultas del motor de rutas sin red.
+
+Con `--graph` usa un grafo importado (p. ej. un extracto regional de OSM con
+`python offline_routing.py import-osm`); si no, genera una malla urbana
+sintética de `--size`² nodos (~100 m entre cruces, avenidas cada 10 calles).
+
+    python benchmarks/bench_offline_routing.py --graph grafo_madrid/
+    python benchmarks/bench_offline_routing.py --size 600
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from offline_routing import OfflineMatrixService, RoadGraph, build_graph  # noqa: E402
+
+
+def synthetic_grid(size, out_dir, seed=0):
+    """Malla size×size con calles a 30 km/h, avenidas a 50 y una autovía en la diagonal."""
+    rng = np.random.default_rng(seed)
+    step = 0.0009  # ~100 m
+    r, c = np.divmod(np.arange(size * size), size)
+    lat = 40.30 + r * step
+    lng = -3.90 + c * step * 1.3
+    idx = np.arange(size * size).reshape(size, size)
+    horiz = np.stack((idx[:, :-1].ravel(), idx[:, 1:].ravel()), axis=1)
+    vert = np.stack((idx[:-1, :].ravel(), idx[1:, :].ravel()), axis=1)
+    diag = np.stack((idx[np.arange(size - 1), np.arange(size - 1)], idx[np.arange(1, size), np.arange(1, size)]), axis=1)
+    pairs = np.concatenate((horiz, vert, diag))
+    keep = rng.random(len(pairs)) > 0.05  # algunas calles cortadas
+    keep[-len(diag):] = True
+    pairs = pairs[keep]
+    src = np.concatenate((pairs[:, 0], pairs[:, 1]))
+    dst = np.concatenate((pairs[:, 1], pairs[:, 0]))
+    d_lat = (lat[dst] - lat[src]) * 111_320
+    d_lng = (lng[dst] - lng[src]) * 111_320 * np.cos(np.radians(lat[src]))
+    length = np.hypot(d_lat, d_lng)
+    avenue = (r[src] % 10 == 0) & (r[dst] % 10 == 0) | (c[src] % 10 == 0) & (c[dst] % 10 == 0)
+    motorway = (r[dst] - r[src] != 0) & (c[dst] - c[src] != 0)
+    speed = np.where(motorway, 100, np.where(avenue, 50, 30))
+    return build_graph(lat, lng, src, dst, length, speed, motorway, out_dir)
+
+
+def _pct(values, q):
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 2)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--graph", help="Directorio de un grafo ya importado")
+    ap.add_argument("--size", type=int, default=500, help="Lado de la malla sintética")
+    ap.add_argument("--queries", type=int, default=50)
+    ap.add_argument("--matrix", type=int, default=25, help="Puntos de la matriz N×N")
+    args = ap.parse_args()
+
+    path = args.graph
+    build_s = None
+    if not path:
+        path = tempfile.mkdtemp(prefix="offline_graph_")
+        t0 = time.perf_counter()
+        synthetic_grid(args.size, path)
+        build_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    graph = RoadGraph(path)
+    load_ms = (time.perf_counter() - t0) * 1000
+    service = OfflineMatrixService(graph)
+
+    rng = np.random.default_rng(1)
+    lat0, lng0, lat1, lng1 = graph.meta["bbox"]
+    pts = np.column_stack((rng.uniform(lat0, lat1, 2 * args.queries + args.matrix),
+                           rng.uniform(lng0, lng1, 2 * args.queries + args.matrix)))
+
+    snaps = []
+    for p in pts:
+        t0 = time.perf_counter()
+        graph.snap(*p)
+        snaps.append(time.perf_counter() - t0)
+
+    routes = []
+    for i in range(args.queries):
+        a, b = graph.snap(*pts[2 * i]), graph.snap(*pts[2 * i + 1])
+        t0 = time.perf_counter()
+        graph.route(a, b)
+        routes.append(time.perf_counter() - t0)
+
+    matrix_pts = [tuple(p) for p in pts[-args.matrix:]]
+    t0 = time.perf_counter()
+    durations, _ = service.matrices(matrix_pts)
+    matrix_ms = (time.perf_counter() - t0) * 1000
+
+    print(json.dumps({
+        "graph": path,
+        "nodes": graph.n,
+        "edges": graph.meta["edges"],
+        "build_s": round(build_s, 2) if build_s is not None else None,
+        "load_ms": round(load_ms, 2),
+        "snap_p50_ms": _pct(snaps, 0.5),
+        "snap_p95_ms": _pct(snaps, 0.95),
+        "route_p50_ms": _pct(routes, 0.5),
+        "route_p95_ms": _pct(routes, 0.95),
+        f"matrix_{args.matrix}x{args.matrix}_ms": round(matrix_ms, 1),
+        "unreachable_pairs": int((durations >= 1e9).sum()),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
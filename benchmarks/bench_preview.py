@@ -0,0 +1,86 @@
+# benchmarks/bench_preview.py
+"""Vista previa del mapa: coste de decodificar/simplificar y bytes enviados según la longitud de la ruta.
+
+Genera polilíneas sintéticas (una ruta sinuosa con ruido de GPS), mide la
+primera construcción, la segunda (caché) y el tamaño del JSON que llega al
+navegador frente al de la geometría sin simplificar.
+
+    python benchmarks/bench_preview.py --points 1000 10000 50000 200000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from route_preview import PREVIEW_CACHE, build_preview, decode_polyline  # noqa: E402
+
+
+def encode_polyline(latlng):
+    """Codificación de Google (referencia, solo para generar datos de prueba)."""
+    values = np.diff(np.round(np.asarray(latlng) * 1e5).astype(np.int64), axis=0, prepend=0).ravel()
+    out = []
+    for v in values.tolist():
+        v = ~(v << 1) if v < 0 else v << 1
+        while v >= 0x20:
+            out.append(chr((0x20 | (v & 0x1F)) + 63))
+            v >>= 5
+        out.append(chr(v + 63))
+    return "".join(out)
+
+
+def _route(n, seed=0):
+    rng = np.random.default_rng(seed)
+    # ~1 punto cada 10-20 m por calles y carreteras con curvas.
+    heading = np.cumsum(rng.normal(0, 0.08, n))
+    step = rng.uniform(1e-4, 2e-4, n)
+    lat = 40.4168 + np.cumsum(step * np.cos(heading))
+    lng = -3.7038 + np.cumsum(step * np.sin(heading))
+    return np.column_stack((lat, lng))
+
+
+def run(n, max_points):
+    latlng = _route(n)
+    polyline = encode_polyline(latlng)
+    raw_bytes = len(json.dumps(np.round(latlng[:, ::-1], 5).tolist(), separators=(",", ":")))
+    routes = [{"polyline": polyline, "stops": [
+        {"address": "Origen", "lat": latlng[0, 0], "lng": latlng[0, 1]},
+        {"address": "Destino", "lat": latlng[-1, 0], "lng": latlng[-1, 1]},
+    ]}]
+    PREVIEW_CACHE.clear()
+    t0 = time.perf_counter()
+    decode_polyline(polyline)
+    t_decode = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    preview = build_preview(routes, max_points=max_points)
+    t_cold = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    build_preview(routes, max_points=max_points)
+    t_warm = time.perf_counter() - t0
+    return {
+        "points": n,
+        "polyline_bytes": len(polyline),
+        "raw_json_bytes": raw_bytes,
+        "payload_bytes": preview["bytes"],
+        "sent_points": preview["points"],
+        "zoom": preview["view"]["zoom"],
+        "decode_ms": round(t_decode * 1000, 2),
+        "build_ms": round(t_cold * 1000, 2),
+        "cached_ms": round(t_warm * 1000, 3),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--points", type=int, nargs="+", default=[1000, 10000, 50000, 200000])
+    ap.add_argument("--max-points", type=int, default=1500)
+    args = ap.parse_args()
+    print(json.dumps([run(n, args.max_points) for n in args.points], indent=2))
+
+
+if __name__ == "__main__":
+    main()
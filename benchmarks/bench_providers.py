@@ -0,0 +1,120 @@
+# benchmarks/bench_providers.py
+"""Escenarios del suggester multi-proveedor contra el backend falso por HTTP.
+
+Google va en proceso (`FakeMapsClient`); SerpAPI y Nominatim pasan por sus
+parsers HTTP reales contra `serve_fake_backend()`. Se mide y comprueba:
+
+- merge: los tres a la vez, resultados unidos sin duplicados;
+- hedge: Google lento, SerpAPI cubre y responde antes del presupuesto de Google;
+- breaker: SerpAPI devuelve 500, su cortacircuitos se abre y deja de llamarse.
+
+    python benchmarks/bench_providers.py
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fakes import FakeMapsClient, serve_fake_backend  # noqa: E402
+from providers import (  # noqa: E402
+    CircuitBreaker,
+    GoogleProvider,
+    MultiProviderSuggester,
+    NominatimProvider,
+    SerpApiProvider,
+)
+
+
+def _suggester(base_url, google_latency_s, hedge_after_s):
+    google = GoogleProvider(FakeMapsClient(latency_s=google_latency_s, jitter_s=0.0), budget_s=0.5)
+    serp = SerpApiProvider("fake", base_url=base_url, budget_s=1.0, hedge_after_s=hedge_after_s,
+                           breaker=CircuitBreaker(failure_threshold=3, reset_s=60.0))
+    nominatim = NominatimProvider(base_url, budget_s=1.0, hedge_after_s=hedge_after_s)
+    return MultiProviderSuggester([google, serp, nominatim], merge_window_s=0.2)
+
+
+def _timed_suggest(suggester, query, limit=8):
+    t0 = time.perf_counter()
+    results, complete = suggester.suggest_with_status(query, limit=limit)
+    return results, complete, round((time.perf_counter() - t0) * 1000, 1)
+
+
+def scenario_merge(base_url, server):
+    """Todos a la vez y rápidos: la respuesta une fuentes y no repite direcciones."""
+    s = _suggester(base_url, google_latency_s=0.02, hedge_after_s=0.0)
+    results, complete, ms = _timed_suggest(s, "calle mayor")
+    sources = sorted({r["source"] for r in results})
+    descriptions = [r["description"] for r in results]
+    # SerpAPI devuelve las mismas direcciones que Google: deben quedar fuera por duplicadas.
+    return {
+        "ms": ms, "results": len(results), "sources": sources, "complete": complete,
+        "ok": sources == ["google", "nominatim"] and len(descriptions) == len(set(descriptions)),
+    }
+
+
+def scenario_hedge(base_url, server):
+    """Google tarda más que su presupuesto: SerpAPI se lanza a los 0,1 s y gana."""
+    s = _suggester(base_url, google_latency_s=1.0, hedge_after_s=0.1)
+    results, complete, ms = _timed_suggest(s, "gran via")
+    sources = sorted({r["source"] for r in results})
+    google = s.providers[0]
+    # La llamada de Google sigue en su hilo; al terminar fuera de plazo cuenta como fallo.
+    time.sleep(1.0)
+    return {
+        "ms": ms, "results": len(results), "sources": sources, "complete": complete,
+        "google_breaker_failures": google.breaker.failures,
+        "ok": "google" not in sources and bool(results) and ms < 1000
+              and google.breaker.failures == 1,
+    }
+
+
+def scenario_breaker(base_url, server, rounds=5):
+    """SerpAPI responde 500: tras `failure_threshold` fallos no se le vuelve a llamar."""
+    server.faults["/search.json"] = {"status": 500}
+    try:
+        s = _suggester(base_url, google_latency_s=1.0, hedge_after_s=0.0)
+        serp = s.providers[1]
+        per_round = []
+        for n in range(rounds):
+            before = server.hits.get("/search.json", 0)
+            results, _, ms = _timed_suggest(s, f"plaza {n}")
+            per_round.append({"ms": ms, "sources": sorted({r["source"] for r in results}),
+                              "serpapi_http_calls": server.hits.get("/search.json", 0) - before,
+                              "serpapi": serp.breaker.state})
+    finally:
+        server.faults.pop("/search.json", None)
+    threshold = serp.breaker.failure_threshold
+    return {
+        "rounds": per_round, "serpapi_breaker": serp.breaker.state,
+        # Cada llamada fallida hace sus reintentos HTTP; con el circuito abierto, ninguna.
+        "ok": serp.breaker.state == "open"
+              and all(r["serpapi_http_calls"] > 0 for r in per_round[:threshold])
+              and all(r["serpapi_http_calls"] == 0 for r in per_round[threshold:])
+              and all(r["sources"] for r in per_round),
+    }
+
+
+SCENARIOS = {"merge": scenario_merge, "hedge": scenario_hedge, "breaker": scenario_breaker}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Hedging, unión y cortacircuitos de los proveedores.")
+    ap.add_argument("--only", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    args = ap.parse_args(argv)
+
+    server, base_url, _ = serve_fake_backend()
+    report = {}
+    try:
+        for name in args.only:
+            report[name] = SCENARIOS[name](base_url, server)
+    finally:
+        server.shutdown()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0 if all(r["ok"] for r in report.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
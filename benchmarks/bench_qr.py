@@ -0,0 +1,58 @@
+# benchmarks/bench_qr.py
+"""Micro-benchmark del motor de QR: codificar + rasterizar por longitud de URL.
+
+    python benchmarks/bench_qr.py --lengths 100 300 600 1200 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from qr_engine import QR_CACHE, _build, pick_error_level, render_qr  # noqa: E402
+
+
+def _url(length):
+    base = "https://www.google.com/maps/dir/?api=1&origin=Puerta del Sol, Madrid&waypoints="
+    stops = []
+    i = 0
+    while len(base) + len("|".join(stops)) < length:
+        stops.append(f"Calle Mayor {i}, Madrid")
+        i += 1
+    return (base + "|".join(stops))[:length]
+
+
+def _time(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lengths", type=int, nargs="+", default=[100, 300, 600, 1200, 2000])
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    rows = []
+    for n in args.lengths:
+        url = _url(n)
+        level = pick_error_level(url)
+        row = {"url_len": n, "auto_level": level, "version": _build(url, level, 1, 0).version}
+        for fmt in ("png", "svg"):
+            def cold():
+                QR_CACHE.clear()
+                render_qr(url, fmt=fmt)
+            row[f"{fmt}_cold_ms"] = round(_time(cold, args.repeat) * 1000, 2)
+            render_qr(url, fmt=fmt)
+            row[f"{fmt}_cached_us"] = round(_time(lambda: render_qr(url, fmt=fmt), args.repeat * 50) * 1e6, 2)
+            row[f"{fmt}_bytes"] = len(render_qr(url, fmt=fmt))
+        rows.append(row)
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
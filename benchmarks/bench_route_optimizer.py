@@ -0,0 +1,48 @@
+# benchmarks/bench_route_optimizer.py
+"""Benchmark del optimizador de paradas por número de paradas.
+
+    python benchmarks/bench_route_optimizer.py --stops 10 50 100 200 300 500
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from route_optimizer import haversine_matrix, nearest_neighbour, path_cost, solve  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--stops", type=int, nargs="+", default=[10, 50, 100, 200, 300, 500])
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    rows = []
+    for n in args.stops:
+        # Paradas repartidas por un área metropolitana (~40 km).
+        coords = np.column_stack((rng.uniform(40.2, 40.6, n + 2), rng.uniform(-3.9, -3.5, n + 2)))
+        t0 = time.perf_counter()
+        matrix = haversine_matrix(coords)
+        t_matrix = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        order = solve(matrix, start=0, end=n + 1)
+        t_solve = time.perf_counter() - t0
+        nn = path_cost(matrix, nearest_neighbour(matrix, 0, n + 1))
+        rows.append({
+            "stops": n,
+            "matrix_ms": round(t_matrix * 1000, 2),
+            "solve_ms": round(t_solve * 1000, 1),
+            "nn_km": round(nn / 1000, 1),
+            "optimized_km": round(path_cost(matrix, order) / 1000, 1),
+        })
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# benchmarks/bench_snapshot.py
+"""Instantáneas de caché: el arranque no debe depender del tamaño del fichero.
+
+Escribe instantáneas de N entradas de autocompletado (listas de sugerencias
+reales en forma) y mide el tiempo de escritura, el tamaño, lo que tarda en
+abrirse (lo que paga el arranque) y las búsquedas con y sin acierto.
+
+    python benchmarks/bench_snapshot.py --entries 1000 10000 100000 500000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from snapshot import SnapshotReader, _encode, key_hash, write_snapshot  # noqa: E402
+
+
+def _entries(n, seed=0):
+    rng = random.Random(seed)
+    cities = ["Madrid", "Barcelona", "Valencia", "Sevilla", "Bilbao", "Zaragoza", "Málaga"]
+    for i in range(n):
+        query = f"calle {i} {rng.choice(cities).lower()}"
+        value = [{"description": f"Calle {i} {k}, {c}, España", "place_id": f"pid{i}_{k}"}
+                 for k, c in enumerate(rng.sample(cities, 5))]
+        yield (query, rng.choice(["trav_from", "trav_to", "tour_from"]), None), value
+
+
+def run(n, lookups=2000):
+    out_dir = tempfile.mkdtemp(prefix="snapbench-")
+    path = os.path.join(out_dir, "cache-bench.snap")
+    keys = []
+    records = []
+    expires = time.time() + 3600
+    for key, value in _entries(n):
+        keys.append(key)
+        k = repr(key).encode("utf-8")
+        records.append((key_hash(key), expires, k, _encode(value)))
+    t0 = time.perf_counter()
+    write_snapshot(path, {"autocomplete": records})
+    t_write = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    reader = SnapshotReader(path)
+    section = reader.section("autocomplete")
+    t_open = time.perf_counter() - t0
+
+    rng = random.Random(1)
+    t0 = time.perf_counter()
+    section.get(keys[rng.randrange(n)])
+    t_first = time.perf_counter() - t0
+    sample = [keys[rng.randrange(n)] for _ in range(lookups)]
+    t0 = time.perf_counter()
+    for key in sample:
+        section.get(key)
+    t_hit = (time.perf_counter() - t0) / lookups
+    t0 = time.perf_counter()
+    for i in range(lookups):
+        section.get(("no existe", str(i), None))
+    t_miss = (time.perf_counter() - t0) / lookups
+    size = os.path.getsize(path)
+    os.remove(path)
+    return {
+        "entries": n,
+        "file_mb": round(size / 1e6, 2),
+        "write_ms": round(t_write * 1000, 1),
+        "open_ms": round(t_open * 1000, 3),
+        "first_lookup_ms": round(t_first * 1000, 3),
+        "hit_us": round(t_hit * 1e6, 1),
+        "miss_us": round(t_miss * 1e6, 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--entries", type=int, nargs="+", default=[1000, 10000, 100000, 500000])
+    args = ap.parse_args()
+    print(json.dumps([run(n) for n in args.entries], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# benchmarks/bench_views.py
+"""Arranque en frío y rerun por pulsación: modo "tabs" (todas las pestañas) frente a "lazy".
+
+Cada modo se mide en un proceso nuevo (para que el arranque sea realmente en frío)
+con el AppTest de Streamlit y sin claves de API (no hay red).
+
+    python benchmarks/bench_views.py
+"""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+_CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("app.py", default_timeout=60).run()
+cold = time.perf_counter() - t0
+heavy = [m for m in ("googlemaps", "requests", "tab_viajero", "tab_turistico") if m in sys.modules]
+if at.radio:
+    at.radio[0].set_value("Viajero").run()
+texto = "Calle Mayor 10, Madrid"
+tiempos = []
+for i in range(3, len(texto) + 1):
+    t = time.perf_counter()
+    at.text_input("trav_q_from").input(texto[:i]).run()
+    tiempos.append(time.perf_counter() - t)
+tiempos.sort()
+print(json.dumps({
+    "cold_start_ms": round(cold * 1000, 1),
+    "modules_after_first_run": heavy,
+    "keystroke_p50_ms": round(tiempos[len(tiempos) // 2] * 1000, 2),
+    "keystroke_max_ms": round(tiempos[-1] * 1000, 2),
+}))
+"""
+
+
+def main():
+    results = {}
+    for mode in ("tabs", "lazy"):
+        env = {**os.environ, "VIEW_MODE": mode, "GOOGLE_PLACES_API_KEY": ""}
+        out = subprocess.run([sys.executable, "-c", _CHILD], cwd=ROOT, env=env,
+                             capture_output=True, text=True, check=True)
+        results[mode] = json.loads(out.stdout.strip().splitlines()[-1])
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+# benchmarks/fakes.py
+"""Backends falsos y deterministas para medir la app sin red.
+
+`FakeMapsClient` imita los métodos de `googlemaps.Client` que usa la app
+(autocompletado, geocodificación, detalles, direcciones, matriz) con una
+latencia inyectada y resultados derivados de un hash del texto, así que dos
+ejecuciones dan exactamente lo mismo. `install_fake_backend()` lo engancha en
+`app_utils` (junto con un ipapi falso) antes de lanzar el AppTest.
+
+`serve_fake_backend()` expone lo mismo por HTTP (rutas de los web services de
+Maps y de ipapi, más `/search.json` de SerpAPI y `/search` de Nominatim) para
+probar un `streamlit run` de verdad con `GOOGLE_MAPS_BASE_URL`, `IPAPI_URL`,
+`SERPAPI_URL` y `NOMINATIM_URL` apuntando a él. `server.faults` permite añadir
+latencia o errores por ruta en caliente y `server.hits` cuenta las peticiones.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def _point(text):
+    """Coordenadas estables dentro de la península para un texto."""
+    h = hashlib.sha1(text.lower().encode("utf-8")).digest()
+    lat = 36.0 + int.from_bytes(h[:4], "big") / 2**32 * 7.5
+    lng = -9.0 + int.from_bytes(h[4:8], "big") / 2**32 * 12.0
+    return {"lat": round(lat, 6), "lng": round(lng, 6)}
+
+
+class FakeMapsClient:
+    """Sustituto de `googlemaps.Client` con latencia configurable (media + jitter con semilla)."""
+
+    def __init__(self, latency_s=0.02, jitter_s=0.005, seed=1):
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self._rnd = random.Random(seed)
+        self.calls = {}
+
+    def _sleep(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        delay = self.latency_s + self._rnd.uniform(-self.jitter_s, self.jitter_s)
+        if delay > 0:
+            time.sleep(delay)
+
+    def places_autocomplete(self, input_text, session_token=None, **kwargs):
+        self._sleep("places_autocomplete")
+        base = input_text.strip().title()
+        return [
+            {"description": f"{base} {i}, {city}, España", "place_id": f"fake:{base}:{i}:{city}"}
+            for i, city in enumerate(["Madrid", "Barcelona", "Valencia", "Sevilla", "Bilbao"])
+        ]
+
+    def geocode(self, address=None, place_id=None, **kwargs):
+        self._sleep("geocode")
+        text = address or place_id or ""
+        return [{
+            "formatted_address": f"{text} (geocodificado)",
+            "place_id": f"fake:{text}",
+            "geometry": {"location": _point(text)},
+        }]
+
+    def place(self, place_id, session_token=None, fields=None, **kwargs):
+        self._sleep("place")
+        return {"result": {
+            "formatted_address": place_id.split(":", 1)[-1],
+            "place_id": place_id,
+            "geometry": {"location": _point(place_id)},
+            "opening_hours": {"periods": [
+                {"open": {"day": d, "time": "0900"}, "close": {"day": d, "time": "2000"}}
+                for d in range(7)
+            ]},
+            "utc_offset": 120,
+        }}
+
+    def distance_matrix(self, origins, destinations, mode="driving", **kwargs):
+        self._sleep("distance_matrix")
+
+        def loc(x):
+            return {"lat": x[0], "lng": x[1]} if isinstance(x, tuple) else _point(str(x))
+
+        rows = []
+        for o in origins:
+            a = loc(o)
+            elements = []
+            for d in destinations:
+                b = loc(d)
+                meters = ((a["lat"] - b["lat"]) ** 2 + (a["lng"] - b["lng"]) ** 2) ** 0.5 * 111_000
+                elements.append({"status": "OK", "distance": {"value": int(meters)},
+                                 "duration": {"value": int(meters / 13.9)}})
+            rows.append({"elements": elements})
+        return {"rows": rows}
+
+    def directions(self, origin, destination, waypoints=None, mode="driving", avoid=None,
+                   alternatives=False, **kwargs):
+        self._sleep("directions")
+        factor = 1.0
+        for a in (avoid or "").split("|"):
+            factor *= {"highways": 1.25, "tolls": 1.1, "ferries": 1.05}.get(a, 1.0)
+        routes = []
+        for k in range(3 if alternatives else 1):
+            meters = 10_000 * (1 + len(waypoints or [])) * (1 + 0.07 * k)
+            routes.append({
+                "summary": f"ruta {k}",
+                "legs": [{"distance": {"value": int(meters)},
+                          "duration": {"value": int(meters / 13.9 * factor * (1 - 0.05 * k))}}],
+                "overview_polyline": {"points": "_p~iF~ps|U_ulLnnqC_mqNvxq`@"},
+            })
+        return routes
+
+
+class _FakeResponse:
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeIpApiSession:
+    """Sustituye a la sesión de `requests` de ip_bias: devuelve siempre Madrid."""
+
+    def __init__(self, latency_s=0.05):
+        self.latency_s = latency_s
+
+    def get(self, url, timeout=None, **kwargs):
+        time.sleep(self.latency_s)
+        return _FakeResponse({"latitude": 40.4168, "longitude": -3.7038})
+
+
+def install_fake_backend(latency_s=0.02, ip_latency_s=0.05):
+    """Engancha los backends falsos en `app_utils` y vacía las cachés (y el almacén de lugares)."""
+    import app_utils
+    from cache import CACHES
+    from place_store import PlaceStore
+    from rate_limit import QuotaAccountant, RateLimitedClient
+
+    fake = FakeMapsClient(latency_s=latency_s)
+    unlimited = {name: {"qps": 1e6, "burst": 1e6, "daily": 1e12}
+                 for name in ("autocomplete", "geocode", "place", "directions", "distance_matrix")}
+    app_utils.API_KEY = "fake"
+    app_utils._quota = QuotaAccountant(unlimited)
+    app_utils._gmaps = RateLimitedClient(fake, app_utils._quota)
+    app_utils._gmaps_typeahead = app_utils._gmaps
+    app_utils._suggester = app_utils._build_suggester()
+    app_utils._suggester_ready = True
+    app_utils._opening_hours = None
+    app_utils._route_comparator = None
+    app_utils._matrix_service = None
+    app_utils._place_store = PlaceStore(db_path=os.path.join(tempfile.mkdtemp(prefix="fake_places_"),
+                                                             "places.sqlite3"))
+    app_utils.get_ip_bias()._session = FakeIpApiSession(ip_latency_s)
+    for c in CACHES.values():
+        c.clear()
+    return fake
+
+
+_LATLNG = re.compile(r"^-?\d+(\.\d+)?,-?\d+(\.\d+)?$")
+
+
+def _location(value):
+    """Parámetro de ubicación de la API ("lat,lng", "place_id:..." o texto) al formato del fake."""
+    if _LATLNG.match(value):
+        lat, lng = value.split(",")
+        return float(lat), float(lng)
+    return value
+
+
+def _serpapi_suggestions(q):
+    """Respuesta de `engine=google_maps_autocomplete`: las mismas ciudades que el fake de Google."""
+    base = q.get("q", "").strip().title()
+    out = []
+    for i, city in enumerate(["Madrid", "Barcelona", "Valencia", "Sevilla", "Bilbao"]):
+        p = _point(f"{base} {i} {city}")
+        out.append({"value": f"{base} {i}, {city}, España", "latitude": p["lat"], "longitude": p["lng"]})
+    return {"suggestions": out}
+
+
+def _nominatim_search(q):
+    """Respuesta de /search?format=jsonv2: nombres al estilo OSM (distintos de los de Google)."""
+    base = q.get("q", "").strip().title()
+    out = []
+    for city in ["Zaragoza", "Málaga", "Murcia", "Palma", "Vigo"][:int(q.get("limit", 5))]:
+        p = _point(f"{base} {city}")
+        out.append({"display_name": f"{base}, {city}, España", "lat": str(p["lat"]), "lon": str(p["lng"])})
+    return out
+
+
+def _maps_handler(fake, ip_latency_s, faults=None, hits=None):
+    """Manejador HTTP: cada ruta de los web services de Maps llama al método del fake.
+
+    `faults` ({ruta: {"latency_s", "status"}}) y `hits` ({ruta: n}) se leen y
+    actualizan en cada petición, así que se pueden cambiar con el servidor en marcha.
+    """
+    faults = {} if faults is None else faults
+    hits = {} if hits is None else hits
+
+    def autocomplete(q):
+        return {"predictions": fake.places_autocomplete(q.get("input", ""))}
+
+    def geocode(q):
+        return {"results": fake.geocode(address=q.get("address"), place_id=q.get("place_id"))}
+
+    def details(q):
+        return fake.place(q.get("placeid") or q.get("place_id", ""))
+
+    def matrix(q):
+        return fake.distance_matrix([_location(v) for v in q.get("origins", "").split("|")],
+                                    [_location(v) for v in q.get("destinations", "").split("|")])
+
+    def directions(q):
+        wps = [w for w in q.get("waypoints", "").split("|") if w and w != "optimize:true"]
+        return {"routes": fake.directions(q.get("origin"), q.get("destination"), wps,
+                                          avoid=q.get("avoid"),
+                                          alternatives=q.get("alternatives") == "true")}
+
+    routes = {
+        "/maps/api/place/autocomplete/json": autocomplete,
+        "/maps/api/geocode/json": geocode,
+        "/maps/api/place/details/json": details,
+        "/maps/api/distancematrix/json": matrix,
+        "/maps/api/directions/json": directions,
+    }
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            hits[url.path] = hits.get(url.path, 0) + 1
+            fault = faults.get(url.path) or {}
+            if fault.get("latency_s"):
+                time.sleep(fault["latency_s"])
+            if fault.get("status"):
+                self.send_error(fault["status"])
+                return
+            if url.path in routes:
+                body = {"status": "OK", **routes[url.path](q)}
+            elif url.path == "/search.json":
+                body = _serpapi_suggestions(q)
+            elif url.path == "/search":
+                body = _nominatim_search(q)
+            elif url.path.endswith("/json/"):  # ipapi: /json/ o /<ip>/json/
+                time.sleep(ip_latency_s)
+                body = {"latitude": 40.4168, "longitude": -3.7038}
+            else:
+                self.send_error(404)
+                return
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve_fake_backend(host="127.0.0.1", port=0, latency_s=0.02, ip_latency_s=0.05):
+    """Arranca el backend falso por HTTP en un hilo. Devuelve (servidor, url_base, fake)."""
+    fake = FakeMapsClient(latency_s=latency_s)
+    faults, hits = {}, {}
+    server = ThreadingHTTPServer((host, port), _maps_handler(fake, ip_latency_s, faults, hits))
+    server.faults, server.hits = faults, hits
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-backend", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}", fake
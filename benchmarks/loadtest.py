@@ -0,0 +1,435 @@
+# benchmarks/loadtest.py
+"""Prueba de carga: muchas sesiones de navegador simuladas contra un `streamlit run app.py` real.
+
+Arranca el backend falso de Maps/ipapi por HTTP (benchmarks/fakes.py), lanza
+la app en un subproceso apuntando a él (`GOOGLE_MAPS_BASE_URL`, `IPAPI_URL`) y
+abre N conexiones al websocket de Streamlit (/_stcore/stream). Cada sesión
+habla el mismo protocolo que el navegador (BackMsg/ForwardMsg en protobuf):
+manda `rerun_script` con el estado de todos sus widgets y espera a
+`script_finished`.
+
+Las sesiones siguen guiones realistas: escribir letra a letra en las cajas de
+búsqueda (reruns de fragmento), elegir una sugerencia, generar la ruta y abrir
+una ruta del historial (enlaces + QR). Para cada nivel de concurrencia se
+informa de la latencia de rerun (p50/p95/p99), reruns por segundo y memoria
+RSS del servidor por sesión.
+
+    python benchmarks/loadtest.py --sessions 10 50 100 200 --duration 60
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tornado.websocket import websocket_connect  # noqa: E402
+
+from streamlit.proto.BackMsg_pb2 import BackMsg  # noqa: E402
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg  # noqa: E402
+
+from fakes import serve_fake_backend  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Tipos de elemento que son widgets y cómo se manda su valor en WidgetState.
+WIDGETS = {
+    "text_input": "string_value",
+    "text_area": "string_value",
+    "selectbox": "string_value",
+    "radio": "int_value",
+    "checkbox": "bool_value",
+    "number_input": "double_value",
+    "button": "trigger_value",
+}
+
+# Vistas del selector principal (índices de la radio "vista_activa").
+VIEW_INDEX = {"Profesional": 0, "Viajero": 1, "Turístico": 2}
+
+ADDRESSES = ["Gran Vía 28, Madrid", "Plaza Mayor, Salamanca", "Calle Larios 5, Málaga",
+             "Paseo de Gracia 43, Barcelona", "Calle Alcalá 100, Madrid", "Mercado Central, Valencia",
+             "Catedral de Sevilla", "Guggenheim, Bilbao", "Plaza del Pilar, Zaragoza"]
+
+
+class RerunFailed(Exception):
+    """El servidor cerró la conexión o el script terminó con error."""
+
+
+class Session:
+    """Una pestaña del navegador: estado de widgets propio y un rerun cada vez."""
+
+    def __init__(self, url, timeout_s=60.0):
+        self.url = url
+        self.timeout_s = timeout_s
+        self.conn = None
+        self.page_hash = ""
+        self.widgets = {}  # id -> {"kind", "label", "key", "fragment", "options"}
+        self.values = {}   # id -> (campo de WidgetState, valor)
+        self.errors = 0
+
+    async def connect(self):
+        self.conn = await websocket_connect(self.url, max_message_size=64 * 1024 * 1024)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _register(self, msg):
+        delta = msg.delta
+        if delta.WhichOneof("type") != "new_element":
+            return
+        element = delta.new_element
+        kind = element.WhichOneof("type")
+        if kind == "exception":
+            self.errors += 1
+        if kind not in WIDGETS:
+            return
+        proto = getattr(element, kind)
+        wid = proto.id
+        key = wid.rsplit("-", 1)[-1] if wid.startswith("$$ID") else None
+        self.widgets[wid] = {
+            "kind": kind,
+            "label": getattr(proto, "label", ""),
+            "key": None if key == "None" else key,
+            "fragment": delta.fragment_id,
+            "options": list(getattr(proto, "options", [])),
+            "primary": kind == "button" and proto.type == "primary",
+        }
+
+    def find(self, key=None, kind=None, primary=False):
+        """Id del widget con esa clave (o del último de ese tipo) visto hasta ahora."""
+        for wid, w in reversed(list(self.widgets.items())):
+            if key is not None and w["key"] == key:
+                return wid
+            if key is None and w["kind"] == kind and (not primary or w["primary"]):
+                return wid
+        return None
+
+    async def rerun(self, trigger=None, fragment=""):
+        """Manda el estado de los widgets (más un botón pulsado) y espera al final del script.
+
+        Devuelve (segundos, "full" | "fragment").
+        """
+        back = BackMsg()
+        state = back.rerun_script
+        state.query_string = ""
+        state.page_script_hash = self.page_hash
+        if fragment:
+            state.fragment_id = fragment
+        for wid, (field, value) in self.values.items():
+            ws = state.widget_states.widgets.add()
+            ws.id = wid
+            setattr(ws, field, value)
+        if trigger is not None:
+            ws = state.widget_states.widgets.add()
+            ws.id = trigger
+            ws.trigger_value = True
+
+        start = time.perf_counter()
+        await self.conn.write_message(back.SerializeToString(), binary=True)
+        while True:
+            raw = await asyncio.wait_for(self.conn.read_message(), self.timeout_s)
+            if raw is None:
+                raise RerunFailed("conexión cerrada")
+            msg = ForwardMsg()
+            msg.ParseFromString(raw)
+            kind = msg.WhichOneof("type")
+            if kind == "new_session":
+                self.page_hash = msg.new_session.page_script_hash or self.page_hash
+            elif kind == "delta":
+                self._register(msg)
+            elif kind == "script_finished":
+                status = msg.script_finished
+                if status == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    continue
+                if status == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise RerunFailed("error de compilación")
+                scope = "fragment" if status == ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY else "full"
+                return time.perf_counter() - start, scope
+
+    async def set(self, wid, value, trigger=False):
+        """Cambia un widget como lo haría el navegador (rerun de su fragmento si está en uno)."""
+        w = self.widgets[wid]
+        if trigger:
+            return await self.rerun(trigger=wid, fragment=w["fragment"])
+        self.values[wid] = (WIDGETS[w["kind"]], value)
+        return await self.rerun(fragment=w["fragment"])
+
+
+class Recorder:
+    """Latencias de todas las sesiones de un nivel."""
+
+    def __init__(self):
+        self.samples = {"full": [], "fragment": []}
+        self.failures = {}
+
+    def add(self, result):
+        seconds, scope = result
+        self.samples[scope].append(seconds)
+
+    def fail(self, reason, n=1):
+        self.failures[reason] = self.failures.get(reason, 0) + n
+
+
+async def _type(session, rec, key, text, keystroke_s):
+    """Escribe `text` letra a letra en la caja `key` (un rerun por tecla, como con el debounce)."""
+    wid = session.find(key=key)
+    if wid is None:
+        return
+    for i in range(1, len(text) + 1):
+        rec.add(await session.set(wid, text[:i]))
+        await asyncio.sleep(keystroke_s * random.uniform(0.5, 1.5))
+
+
+async def _pick_first(session, rec, key):
+    wid = session.find(key=key)
+    if wid is not None and session.widgets[wid]["options"]:
+        rec.add(await session.set(wid, session.widgets[wid]["options"][0]))
+
+
+async def _open_history(session, rec, key):
+    """Elige la última ruta del historial (el expander solo es del navegador; el QR ya viene)."""
+    wid = session.find(key=key)
+    if wid is not None and session.widgets[wid]["options"]:
+        rec.add(await session.set(wid, session.widgets[wid]["options"][-1]))
+
+
+async def script_viajero(session, rec, rnd, keystroke_s, think_s):
+    rec.add(await session.set(session.find(key="vista_activa"), VIEW_INDEX["Viajero"]))
+    for box, sel in (("trav_q_from", "trav_sel_from"), ("trav_q_to", "trav_sel_to")):
+        await _type(session, rec, box, rnd.choice(ADDRESSES)[:12], keystroke_s)
+        await _pick_first(session, rec, sel)
+        await asyncio.sleep(think_s)
+    rec.add(await session.set(session.find(kind="button", primary=True), None, trigger=True))
+    await asyncio.sleep(think_s)
+    await _open_history(session, rec, "trav_hist_sel")
+
+
+async def script_turistico(session, rec, rnd, keystroke_s, think_s):
+    rec.add(await session.set(session.find(key="vista_activa"), VIEW_INDEX["Turístico"]))
+    for box, sel in (("tour_q_from", "tour_sel_from"), ("tour_q_to", "tour_sel_to")):
+        await _type(session, rec, box, rnd.choice(ADDRESSES)[:12], keystroke_s)
+        await _pick_first(session, rec, sel)
+        await asyncio.sleep(think_s)
+    spots = session.find(kind="text_area")
+    if spots is not None:
+        rec.add(await session.set(spots, "\n".join(rnd.sample(ADDRESSES, 3))))
+    rec.add(await session.set(session.find(kind="button", primary=True), None, trigger=True))
+    await asyncio.sleep(think_s)
+    await _open_history(session, rec, "tour_hist_sel")
+
+
+async def script_profesional(session, rec, rnd, keystroke_s, think_s):
+    rec.add(await session.set(session.find(key="vista_activa"), VIEW_INDEX["Profesional"]))
+    stops = rnd.sample(ADDRESSES, 6)
+    # Los text_input/text_area sin fragmento mandan el valor al salir de la caja: un rerun cada uno.
+    rec.add(await session.set(session.find(key="prof_origen"), stops[0]))
+    rec.add(await session.set(session.find(key="prof_destino"), stops[1]))
+    rec.add(await session.set(session.find(key="prof_paradas"), "\n".join(stops[2:])))
+    await asyncio.sleep(think_s)
+    rec.add(await session.set(session.find(key="prof_btn_generar"), None, trigger=True))
+    await asyncio.sleep(think_s)
+    await _open_history(session, rec, "prof_hist_sel")
+
+
+SCRIPTS = {
+    "viajero": script_viajero,
+    "turistico": script_turistico,
+    "profesional": script_profesional,
+}
+
+
+async def _run_session(url, rec, deadline, scripts, seed, keystroke_s, think_s, connected):
+    rnd = random.Random(seed)
+    session = Session(url)
+    try:
+        await session.connect()
+        rec.add(await session.rerun())
+        connected.append(session)
+        while time.monotonic() < deadline:
+            await SCRIPTS[rnd.choice(scripts)](session, rec, rnd, keystroke_s, think_s)
+            await asyncio.sleep(think_s)
+    except Exception as e:
+        rec.fail(type(e).__name__)
+    finally:
+        if session.errors:
+            rec.fail("exception_element", session.errors)
+        session.close()
+        if session in connected:
+            connected.remove(session)
+
+
+def _rss_bytes(pid):
+    """RSS del proceso (Linux: /proc; en otro sistema, `ps`)."""
+    try:
+        with open(f"/proc/{pid}/status") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        out = subprocess.run(["ps", "-o", "rss=", "-p", str(pid)], capture_output=True, text=True)
+        return int(out.stdout.strip()) * 1024
+    except (OSError, ValueError):
+        return 0
+
+
+def _pct(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _latency(values):
+    return {
+        "n": len(values),
+        "p50_ms": round(_pct(values, 0.50) * 1000, 1),
+        "p95_ms": round(_pct(values, 0.95) * 1000, 1),
+        "p99_ms": round(_pct(values, 0.99) * 1000, 1),
+    }
+
+
+async def run_level(url, pid, n, duration_s, ramp_s, scripts, keystroke_s, think_s, rss_base):
+    """Mantiene `n` sesiones durante `duration_s` y devuelve las métricas del nivel."""
+    rec = Recorder()
+    connected = []
+    start = time.monotonic()
+    deadline = start + ramp_s + duration_s
+    tasks = []
+    for i in range(n):
+        tasks.append(asyncio.ensure_future(_run_session(
+            url, rec, deadline, scripts, seed=i, keystroke_s=keystroke_s, think_s=think_s,
+            connected=connected,
+        )))
+        await asyncio.sleep(ramp_s / n)
+
+    # RSS con todas las sesiones abiertas (el máximo de varias muestras).
+    rss_peak = 0
+    while time.monotonic() < deadline:
+        rss_peak = max(rss_peak, _rss_bytes(pid))
+        await asyncio.sleep(1.0)
+    peak_sessions = max(1, len(connected))
+    await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - start
+
+    everything = rec.samples["full"] + rec.samples["fragment"]
+    return {
+        "sessions": n,
+        "failures": sum(rec.failures.values()),
+        "failure_reasons": rec.failures,
+        "reruns": len(everything),
+        "reruns_per_s": round(len(everything) / elapsed, 1),
+        "all": _latency(everything),
+        "full": _latency(rec.samples["full"]),
+        "fragment": _latency(rec.samples["fragment"]),
+        "rss_mb": round(rss_peak / 1e6, 1),
+        "rss_per_session_kb": round(max(0, rss_peak - rss_base) / peak_sessions / 1024, 1),
+    }
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(port, backend_url, workdir):
+    """`streamlit run app.py` contra el backend falso, con bases de datos desechables."""
+    env = {
+        **os.environ,
+        "GOOGLE_PLACES_API_KEY": "AIzaFakeLoadTestKey",
+        "GOOGLE_MAPS_BASE_URL": backend_url,
+        "IPAPI_URL": backend_url,
+        "PLACES_DB": os.path.join(workdir, "places.sqlite3"),
+        "DISTANCE_CACHE_DB": os.path.join(workdir, "distance_cache.sqlite3"),
+        "GOOGLE_BUDGETS": json.dumps({
+            name: {"qps": 1e6, "burst": 1e6, "daily": 1e12}
+            for name in ("autocomplete", "geocode", "place", "directions", "distance_matrix")
+        }),
+    }
+    cmd = [sys.executable, "-m", "streamlit", "run", os.path.join(ROOT, "app.py"),
+           "--server.port", str(port), "--server.headless", "true",
+           "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+                            stderr=open(os.path.join(workdir, "streamlit.log"), "wb"))
+    health = f"http://127.0.0.1:{port}/_stcore/health"
+    for _ in range(300):
+        if proc.poll() is not None:
+            raise RuntimeError(f"streamlit terminó al arrancar (ver {workdir}/streamlit.log)")
+        try:
+            with urllib.request.urlopen(health, timeout=1) as resp:
+                if resp.status == 200:
+                    return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("streamlit no respondió a /_stcore/health")
+
+
+async def _main(args):
+    _, backend_url, fake = serve_fake_backend(latency_s=args.backend_latency)
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    port = args.port or _free_port()
+    proc = start_app(port, backend_url, workdir)
+    url = f"ws://127.0.0.1:{port}/_stcore/stream"
+    try:
+        # Una sesión de calentamiento: imports y primeras cachés fuera de la medida.
+        await run_level(url, proc.pid, 1, 0, 0, args.scripts, 0, 0, 0)
+        rss_base = _rss_bytes(proc.pid)
+        levels = []
+        for n in args.sessions:
+            level = await run_level(url, proc.pid, n, args.duration, args.ramp, args.scripts,
+                                    args.keystroke, args.think, rss_base)
+            levels.append(level)
+            print(f"[loadtest] {n:>4} sesiones: p50 {level['all']['p50_ms']} ms · "
+                  f"p95 {level['all']['p95_ms']} ms · p99 {level['all']['p99_ms']} ms · "
+                  f"{level['reruns_per_s']} reruns/s · {level['rss_per_session_kb']} KB/sesión · "
+                  f"{level['failures']} fallos", file=sys.stderr)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    return {
+        "ts": time.time(),
+        "backend_latency_s": args.backend_latency,
+        "scripts": args.scripts,
+        "rss_base_mb": round(rss_base / 1e6, 1),
+        "backend_calls": dict(fake.calls),
+        "levels": levels,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Prueba de carga de la app con sesiones simuladas.")
+    ap.add_argument("--sessions", type=int, nargs="+", default=[10, 50, 100, 200],
+                    help="Niveles de concurrencia (sesiones simultáneas)")
+    ap.add_argument("--duration", type=float, default=60.0, help="Segundos por nivel")
+    ap.add_argument("--ramp", type=float, default=5.0, help="Segundos para abrir todas las sesiones")
+    ap.add_argument("--scripts", nargs="+", choices=sorted(SCRIPTS), default=sorted(SCRIPTS))
+    ap.add_argument("--keystroke", type=float, default=0.15, help="Segundos entre teclas (media)")
+    ap.add_argument("--think", type=float, default=1.0, help="Pausa entre acciones (s)")
+    ap.add_argument("--backend-latency", type=float, default=0.05,
+                    help="Latencia del backend falso de Maps (s)")
+    ap.add_argument("--port", type=int, default=None)
+    ap.add_argument("--out", default=os.path.join(os.path.dirname(__file__), "results", "loadtest.json"))
+    args = ap.parse_args()
+
+    result = asyncio.run(_main(args))
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump(result, fh, indent=2)
+    print(json.dumps(result["levels"], indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+# cache.py
+"""Cachés en memoria compartidas por todas las sesiones del proceso."""
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# Registro global de cachés (para estadísticas y volcados).
+CACHES = {}
+
+
+class TTLCache:
+    """Caché LRU con caducidad (TTL), segura entre hilos y con contadores."""
+
+    def __init__(self, name, maxsize=1024, ttl=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.warm_hits = 0
+        # Sección de una instantánea en disco que se consulta en los fallos (ver snapshot.py).
+        self.snapshot = None
+        CACHES[name] = self
+
+    def _from_snapshot(self, key, store=True):
+        hit = self.snapshot.get(key) if self.snapshot is not None else None
+        if hit is None:
+            return None
+        value, ttl = hit
+        if store:
+            self.set(key, value, ttl=ttl)
+        return value
+
+    def get(self, key, default=None):
+        """Devuelve el valor si existe y no ha caducado (y lo marca como reciente)."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires = item
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.expirations += 1
+        value = self._from_snapshot(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.warm_hits += 1
+        return value
+
+    def peek(self, key, default=None):
+        """Como get(), pero sin tocar contadores ni el orden LRU."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires = item
+                if expires is None or expires > time.monotonic():
+                    return value
+        value = self._from_snapshot(key, store=False)
+        return default if value is None else value
+
+    def set(self, key, value, ttl=None):
+        """Guarda un valor; si se supera el tamaño, expulsa el menos reciente."""
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+            return default if item is None else item[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def attach_snapshot(self, section):
+        self.snapshot = section
+
+    def export(self):
+        """Entradas vivas como (clave, valor, segundos restantes o None), para las instantáneas."""
+        now = time.monotonic()
+        with self._lock:
+            items = list(self._data.items())
+        return [(k, v, exp - now if exp is not None else None)
+                for k, (v, exp) in items if exp is None or exp > now]
+
+    def stats(self):
+        """Contadores de uso de la caché."""
+        total = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "warm_hits": self.warm_hits,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+# --- Autocompletado ---
+
+def normalize_query(text: str) -> str:
+    """Minúsculas, sin tildes y con espacios colapsados ('Cállé  Mayor' -> 'calle mayor')."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def bias_key(bias):
+    """Clave estable para el sesgo de ubicación (redondeado a ~1 km)."""
+    if not bias:
+        return None
+    return (round(bias["lat"], 2), round(bias["lng"], 2), int(bias.get("radius_m") or 0))
+
+
+class _AutocompleteStore(TTLCache):
+    """TTLCache del autocompletado: sus estadísticas cuentan los aciertos por prefijo.
+
+    Es la que queda en `CACHES`, así que el panel y las métricas exportadas ven
+    el mismo ratio de aciertos que `AutocompleteCache.stats()`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prefix_hits = 0
+
+    def stats(self):
+        """Contadores: aciertos exactos, por prefijo y fallos que fueron a la red."""
+        data = super().stats()
+        # Cada respuesta por prefijo pasó antes por un fallo exacto.
+        data["prefix_hits"] = self.prefix_hits
+        data["misses"] = data["misses"] - self.prefix_hits
+        data["calls_saved"] = data["hits"] + self.prefix_hits
+        total = data["calls_saved"] + data["misses"]
+        data["hit_ratio"] = round(data["calls_saved"] / total, 4) if total else 0.0
+        return data
+
+
+class AutocompleteCache:
+    """Caché de sugerencias por (consulta normalizada, key_bucket, sesgo de ubicación).
+
+    Si no hay entrada exacta, intenta responder filtrando los resultados de un
+    prefijo más corto. Solo es seguro cuando esa lista estaba completa: el
+    proveedor devolvió menos resultados de los que se le pidieron (lo indica
+    quien llama en `set(..., complete=True)`). Una lista completa vacía responde
+    a todas sus continuaciones.
+    """
+
+    def __init__(self, maxsize=5000, ttl=6 * 3600, min_prefix=3):
+        self._cache = _AutocompleteStore("autocomplete", maxsize=maxsize, ttl=ttl)
+        self.min_prefix = min_prefix
+
+    @staticmethod
+    def make_key(query, key_bucket="default", bias=None):
+        return (normalize_query(query), key_bucket, bias_key(bias))
+
+    def get(self, query, key_bucket="default", bias=None):
+        """Devuelve la lista cacheada (puede ser vacía) o None si hay que ir a la red."""
+        norm, bucket, bkey = self.make_key(query, key_bucket, bias)
+        entry = self._cache.get((norm, bucket, bkey))
+        if entry is not None:
+            return entry["results"]
+
+        # Respuesta por prefijo: buscar el prefijo cacheado completo más largo y filtrarlo.
+        tokens = norm.split(" ")
+        for cut in range(len(norm) - 1, self.min_prefix - 1, -1):
+            shorter = self._cache.peek((norm[:cut], bucket, bkey))
+            if shorter is None or not shorter["complete"]:
+                continue
+            filtered = [
+                r for r in shorter["results"]
+                if all(tok in normalize_query(r["description"]) for tok in tokens)
+            ]
+            self._cache.prefix_hits += 1
+            self._cache.set((norm, bucket, bkey), {"results": filtered, "complete": True})
+            return filtered
+        return None
+
+    def set(self, query, results, key_bucket="default", bias=None, complete=False):
+        """Guarda `results`; `complete` si el proveedor no tenía más (ver la clase)."""
+        self._cache.set(self.make_key(query, key_bucket, bias),
+                        {"results": list(results), "complete": bool(complete)})
+
+    @property
+    def prefix_hits(self):
+        return self._cache.prefix_hits
+
+    def stats(self):
+        """Contadores: aciertos exactos, por prefijo y fallos que fueron a la red."""
+        return self._cache.stats()
@@ -0,0 +1,275 @@
+# distance_matrix.py
+"""Matriz de tiempos/distancias reales con la Distance Matrix API, por teselas y con caché.
+
+Una petición admite como mucho 25 orígenes, 25 destinos y 100 elementos, así
+que una matriz N×N se parte en el menor número de teselas legales y estas se
+piden en paralelo. Cada par (origen, destino) se guarda en SQLite por modo y
+franja de salida, de modo que al añadir una parada solo se piden su fila y su
+columna.
+"""
+import math
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+MAX_ORIGINS = 25
+MAX_DESTINATIONS = 25
+MAX_ELEMENTS = 100
+
+# Coste para pares sin ruta (el optimizador los evita sin romper la aritmética).
+UNREACHABLE = 1e9
+
+# Estados de elemento que significan "no hay ruta" (no un fallo pasajero).
+NO_ROUTE_STATUSES = {"ZERO_RESULTS", "NOT_FOUND"}
+
+
+def tile_shape(n_origins, n_destinations):
+    """(filas, columnas) por tesela que minimizan el número de peticiones."""
+    best = None
+    for a in range(1, min(MAX_ORIGINS, n_origins) + 1):
+        b = min(MAX_DESTINATIONS, n_destinations, MAX_ELEMENTS // a)
+        if b < 1:
+            break
+        batches = math.ceil(n_origins / a) * math.ceil(n_destinations / b)
+        if best is None or batches < best[0]:
+            best = (batches, a, b)
+    return best[1], best[2]
+
+
+def plan_tiles(origins, destinations):
+    """Parte el rectángulo origins × destinations (listas de índices) en teselas legales."""
+    if not origins or not destinations:
+        return []
+    a, b = tile_shape(len(origins), len(destinations))
+    return [
+        (origins[i:i + a], destinations[j:j + b])
+        for i in range(0, len(origins), a)
+        for j in range(0, len(destinations), b)
+    ]
+
+
+def group_missing(missing, include_self=False):
+    """Agrupa {origen: {destinos}} en rectángulos (orígenes con los mismos destinos pendientes).
+
+    Con `include_self` cada origen cuenta también como destino propio: la
+    diagonal se pide de más, pero una matriz completa queda en un solo rectángulo.
+    """
+    groups = {}
+    for o, dests in missing.items():
+        if dests:
+            key = frozenset(dests | {o}) if include_self else frozenset(dests)
+            groups.setdefault(key, []).append(o)
+    return [(sorted(origins), sorted(dests)) for dests, origins in groups.items()]
+
+
+def plan_requests(missing):
+    """Teselas para cubrir los pares pendientes con el menor número de peticiones."""
+    if not missing:
+        return []
+    all_o = sorted(o for o, d in missing.items() if d)
+    all_d = sorted(set().union(*missing.values()))
+    candidates = [
+        [(all_o, all_d)],
+        group_missing(missing),
+        group_missing(missing, include_self=True),
+    ]
+    plans = [[t for o, d in rects for t in plan_tiles(o, d)] for rects in candidates]
+    return min(plans, key=len)
+
+
+def place_key(p):
+    """Clave estable de un punto: place_id si existe, si no lat/lng redondeados (~1 m)."""
+    if isinstance(p, dict):
+        if p.get("place_id"):
+            return f"pid:{p['place_id']}"
+        loc = p.get("location") or p
+        if loc.get("lat") is not None and loc.get("lng") is not None:
+            return f"ll:{float(loc['lat']):.5f},{float(loc['lng']):.5f}"
+        return f"addr:{p.get('address', '')}"
+    return f"addr:{p}"
+
+
+def _api_location(p):
+    if isinstance(p, dict):
+        if p.get("place_id"):
+            return f"place_id:{p['place_id']}"
+        loc = p.get("location") or p
+        if loc.get("lat") is not None and loc.get("lng") is not None:
+            return (float(loc["lat"]), float(loc["lng"]))
+        return p.get("address", "")
+    return str(p)
+
+
+class DistanceMatrixService:
+    """Servicio de matrices con caché persistente de pares (compartida entre sesiones)."""
+
+    def __init__(self, client, db_path="distance_cache.sqlite3", bucket_s=900, max_workers=4,
+                 unreachable_ttl_s=3600):
+        self.client = client
+        self.bucket_s = bucket_s
+        # Los pares sin ruta se recuerdan poco tiempo (una carretera cortada se reabre).
+        self.unreachable_ttl_s = unreachable_ttl_s
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="matrix")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS pairs (
+                origin TEXT, dest TEXT, mode TEXT, bucket INTEGER,
+                duration_s REAL, distance_m REAL, fetched_at REAL,
+                PRIMARY KEY (origin, dest, mode, bucket))"""
+        )
+        self._db.commit()
+        self.requests = 0
+        self.elements_fetched = 0
+        self.snapshot = None
+
+    def _bucket(self, departure_time):
+        """Franja de salida: -1 sin hora (tiempos típicos), si no bloques de `bucket_s`."""
+        if departure_time is None:
+            return -1
+        ts = departure_time.timestamp() if hasattr(departure_time, "timestamp") else float(departure_time)
+        return int(ts // self.bucket_s)
+
+    def _load(self, keys, mode, bucket):
+        found = {}
+        uniq = sorted(set(keys))
+        expired = time.time() - self.unreachable_ttl_s
+        with self._lock:
+            for i in range(0, len(uniq), 400):
+                chunk = uniq[i:i + 400]
+                marks = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    f"SELECT origin, dest, duration_s, distance_m, fetched_at FROM pairs "
+                    f"WHERE mode=? AND bucket=? AND origin IN ({marks})",
+                    (mode, bucket, *chunk),
+                ).fetchall()
+                for o, d, dur, dist, fetched_at in rows:
+                    if dur >= UNREACHABLE and fetched_at < expired:
+                        continue  # "sin ruta" caducado: se vuelve a preguntar
+                    found[(o, d)] = (dur, dist)
+        return found
+
+    def _store(self, rows):
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO pairs VALUES (?,?,?,?,?,?,?)", rows)
+            self._db.commit()
+
+    def _from_snapshot(self, keys, missing, mode, bucket, durations, distances):
+        """Rellena desde la instantánea los pares pendientes que tenga (y los copia a SQLite)."""
+        rows = []
+        for i, dests in missing.items():
+            for j in list(dests):
+                hit = self.snapshot.get((keys[i], keys[j], mode, bucket))
+                if hit is None:
+                    continue
+                dur, dist, fetched_at = hit[0]
+                durations[i, j], distances[i, j] = dur, dist
+                dests.discard(j)
+                rows.append((keys[i], keys[j], mode, bucket, dur, dist, fetched_at))
+        if rows:
+            self._store(rows)
+        return {i: d for i, d in missing.items() if d}
+
+    def _fetch_tile(self, points, o_idx, d_idx, mode, departure_time):
+        kwargs = {"mode": mode}
+        if departure_time is not None:
+            kwargs["departure_time"] = departure_time
+        resp = self.client.distance_matrix(
+            origins=[_api_location(points[i]) for i in o_idx],
+            destinations=[_api_location(points[j]) for j in d_idx],
+            **kwargs,
+        )
+        out = []
+        for i, row in zip(o_idx, resp.get("rows", [])):
+            for j, el in zip(d_idx, row.get("elements", [])):
+                status = el.get("status")
+                if status != "OK":
+                    # Solo "no hay ruta" se guarda (con caducidad corta); el resto es pasajero.
+                    out.append((i, j, UNREACHABLE, UNREACHABLE, status in NO_ROUTE_STATUSES))
+                    continue
+                dur = (el.get("duration_in_traffic") or el["duration"])["value"]
+                out.append((i, j, float(dur), float(el["distance"]["value"]), True))
+        return out
+
+    def matrices(self, points, mode="driving", departure_time=None):
+        """(duraciones_s, distancias_m) N×N para `points`, pidiendo solo los pares que faltan."""
+        n = len(points)
+        keys = [place_key(p) for p in points]
+        bucket = self._bucket(departure_time)
+        cached = self._load(keys, mode, bucket)
+
+        durations = np.zeros((n, n))
+        distances = np.zeros((n, n))
+        missing = {}
+        for i, ki in enumerate(keys):
+            for j, kj in enumerate(keys):
+                if i == j or ki == kj:
+                    continue
+                hit = cached.get((ki, kj))
+                if hit is None:
+                    missing.setdefault(i, set()).add(j)
+                else:
+                    durations[i, j], distances[i, j] = hit
+
+        if missing and self.snapshot is not None:
+            missing = self._from_snapshot(keys, missing, mode, bucket, durations, distances)
+        tiles = plan_requests(missing)
+        futures = [
+            self._executor.submit(self._fetch_tile, points, o, d, mode, departure_time)
+            for o, d in tiles
+        ]
+        now = time.time()
+        rows = []
+        failed = None
+        try:
+            for fut, (o, d) in zip(futures, tiles):
+                self.requests += 1
+                try:
+                    tile = fut.result()
+                except Exception as e:
+                    # Se sigue con el resto: lo ya pagado se guarda y el próximo intento
+                    # solo pide los pares de las teselas que fallaron.
+                    failed = failed or e
+                    continue
+                for i, j, dur, dist, storable in tile:
+                    durations[i, j], distances[i, j] = dur, dist
+                    if storable and i in missing and j in missing[i]:
+                        rows.append((keys[i], keys[j], mode, bucket, dur, dist, now))
+                self.elements_fetched += len(o) * len(d)
+        finally:
+            if rows:
+                self._store(rows)
+        if failed is not None:
+            raise failed
+        return durations, distances
+
+    def duration_matrix(self, points, mode="driving", departure_time=None):
+        return self.matrices(points, mode=mode, departure_time=departure_time)[0]
+
+    def attach_snapshot(self, section):
+        self.snapshot = section
+
+    def export(self, limit=200_000):
+        """Pares útiles tras un reinicio (sin hora de salida o de franjas aún por llegar)."""
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT origin, dest, mode, bucket, duration_s, distance_m, fetched_at FROM pairs "
+                "WHERE (bucket = -1 OR bucket >= ?) AND (duration_s < ? OR fetched_at >= ?) "
+                "ORDER BY fetched_at DESC LIMIT ?",
+                (self._bucket(now), UNREACHABLE, now - self.unreachable_ttl_s, limit),
+            ).fetchall()
+        out = []
+        for o, d, m, b, dur, dist, at in rows:
+            ttl = at + self.unreachable_ttl_s - now if dur >= UNREACHABLE else None
+            out.append(((o, d, m, b), [dur, dist, at], ttl))
+        return out
+
+    def stats(self):
+        with self._lock:
+            (pairs,) = self._db.execute("SELECT COUNT(*) FROM pairs").fetchone()
+        return {"requests": self.requests, "elements": self.elements_fetched, "cached_pairs": pairs}
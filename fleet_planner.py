@@ -0,0 +1,109 @@
+# fleet_planner.py
+"""Reparto de paradas entre varios vehículos (todos salen del origen y acaban en el destino).
+
+Las paradas se agrupan con k-means vectorizado sobre coordenadas proyectadas,
+con una asignación equilibrada: cada vehículo admite como mucho `capacity`
+unidades de carga (por defecto, el número de paradas repartido a partes
+iguales). Después cada grupo se ordena con `route_optimizer`. Con 1.000
+paradas y una decena de vehículos tarda del orden de un segundo.
+"""
+import math
+
+import numpy as np
+
+from route_optimizer import EARTH_RADIUS_M, optimize_stops
+
+
+def _project(coords):
+    """(lat, lng) -> metros en un plano equirectangular centrado en los puntos."""
+    pts = np.radians(np.asarray(coords, dtype=float).reshape(-1, 2))
+    lat0 = pts[:, 0].mean()
+    return np.column_stack((pts[:, 1] * math.cos(lat0), pts[:, 0])) * EARTH_RADIUS_M
+
+
+def _init_centroids(xy, k, rng):
+    """k-means++: cada centro nuevo, con probabilidad proporcional a la distancia²."""
+    centroids = [xy[rng.integers(len(xy))]]
+    d2 = ((xy - centroids[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        total = d2.sum()
+        i = rng.choice(len(xy), p=d2 / total) if total > 0 else rng.integers(len(xy))
+        centroids.append(xy[i])
+        d2 = np.minimum(d2, ((xy - xy[i]) ** 2).sum(axis=1))
+    return np.array(centroids)
+
+
+def _assign_balanced(dist, demands, capacity):
+    """Asigna cada punto al centro más cercano con hueco, empezando por los que más pierden.
+
+    El "arrepentimiento" (distancia al segundo centro menos al primero) decide el
+    orden: los puntos con una sola opción razonable se colocan antes.
+    """
+    n, k = dist.shape
+    ranked = np.argsort(dist, axis=1)
+    if k > 1:
+        regret = dist[np.arange(n), ranked[:, 1]] - dist[np.arange(n), ranked[:, 0]]
+    else:
+        regret = np.zeros(n)
+    labels = np.empty(n, dtype=int)
+    load = np.zeros(k)
+    for i in np.argsort(-regret):
+        for c in ranked[i]:
+            if load[c] + demands[i] <= capacity:
+                break
+        else:
+            c = int(np.argmin(load))  # nadie tiene hueco: al menos cargado
+        labels[i] = c
+        load[c] += demands[i]
+    return labels
+
+
+def partition(coords, k, demands=None, capacity=None, max_iter=25, seed=0):
+    """Etiqueta de vehículo (0..k-1) para cada punto (lat, lng), con carga equilibrada."""
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    n = len(coords)
+    if n == 0:
+        return np.empty(0, dtype=int)
+    k = max(1, min(int(k), n))
+    demands = np.ones(n) if demands is None else np.asarray(demands, dtype=float)
+    if capacity is None:
+        capacity = math.ceil(demands.sum() / k)
+    capacity = max(float(capacity), float(demands.max()))
+
+    xy = _project(coords)
+    rng = np.random.default_rng(seed)
+    centroids = _init_centroids(xy, k, rng)
+    labels = None
+    for _ in range(max_iter):
+        dist = np.sqrt(((xy[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2))
+        new = _assign_balanced(dist, demands, capacity)
+        if labels is not None and np.array_equal(new, labels):
+            break
+        labels = new
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros((k, 2))
+        np.add.at(sums, labels, xy)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return labels
+
+
+def plan_fleet(origin, destination, stops, vehicles, demands=None, capacity=None,
+               time_budget_s=1.0):
+    """Reparte y ordena `stops` ((lat, lng)) entre `vehicles` rutas origen -> destino.
+
+    Devuelve una lista (una por vehículo, sin las vacías) de índices de `stops`
+    en orden de visita. `time_budget_s` es el tiempo total para ordenar todas.
+    """
+    if not stops:
+        return []
+    labels = partition(stops, vehicles, demands=demands, capacity=capacity)
+    groups = [np.flatnonzero(labels == v) for v in range(int(labels.max()) + 1)]
+    groups = [g for g in groups if len(g)]
+    budget = time_budget_s / max(1, len(groups))
+    routes = []
+    for g in groups:
+        pts = [stops[i] for i in g]
+        order = optimize_stops(origin, destination, pts, time_budget_s=budget)
+        routes.append([int(g[i]) for i in order])
+    return routes
@@ -0,0 +1,285 @@
+# gazetteer.py
+"""Autocompletado local a partir de un nomenclátor (p. ej. extracto CSV de OSM/Nominatim).
+
+El índice es un fichero binario con arrays ordenados que se abre con mmap, así
+que cargarlo no cuesta nada aunque tenga millones de entradas y cada consulta
+es una búsqueda binaria por prefijo (microsegundos). Los prefijos que abarcan
+muchas claves ("ma", "calle") llevan sus registros más populares calculados al
+construir el índice, así que el orden por popularidad es exacto para cualquier prefijo.
+
+Uso:
+    python gazetteer.py build espana.csv espana.gzi
+    python gazetteer.py query espana.gzi "calle mayor"
+"""
+import bisect
+import csv
+import heapq
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from cache import normalize_query
+
+MAGIC = b"GZI1"
+VERSION = 2
+# magic, versión, nº registros, nº claves, nº prefijos con top, tamaño del top, umbral de claves
+_HEADER = struct.Struct("<4sIIIIII")
+
+# Nombres de columna aceptados (Nominatim, extractos OSM y CSV propios).
+_NAME_COLS = ("display_name", "name", "label", "address")
+_LAT_COLS = ("lat", "latitude")
+_LNG_COLS = ("lon", "lng", "longitude")
+_POP_COLS = ("importance", "population", "popularity", "rank")
+
+# Máximo de claves por registro (nombre completo + inicios de palabra).
+MAX_KEYS_PER_RECORD = 4
+
+# Los prefijos con más de `SCAN_LIMIT` claves guardan sus `TOP_K` registros más populares;
+# el resto se ordena al consultar recorriendo sus claves.
+SCAN_LIMIT = 128
+TOP_K = 16
+_NO_RECORD = 0xFFFFFFFF
+
+
+def _pick(row, cols):
+    for c in cols:
+        v = row.get(c)
+        if v not in (None, ""):
+            return v
+    return None
+
+
+def _record_keys(label):
+    """Claves de búsqueda: el nombre completo y el sufijo desde cada palabra."""
+    norm = normalize_query(label)
+    keys = [norm]
+    for i, ch in enumerate(norm):
+        if len(keys) >= MAX_KEYS_PER_RECORD:
+            break
+        if ch == " " and i + 1 < len(norm) and norm[i + 1] != " ":
+            keys.append(norm[i + 1:])
+    return keys
+
+
+def _top_prefixes(keys, recs, pops, min_keys=SCAN_LIMIT, k=TOP_K):
+    """{prefijo: registros más populares} de cada prefijo con más de `min_keys` claves.
+
+    `keys` está ordenado; solo se baja un byte más dentro de los prefijos que
+    ya superan el umbral, así que cada nivel recorre como mucho todas las claves.
+    """
+    out = {}
+    stack = [(0, len(keys), 1)]
+    while stack:
+        lo, hi, length = stack.pop()
+        i = lo
+        while i < hi:
+            if len(keys[i]) < length:
+                i += 1
+                continue
+            prefix = keys[i][:length]
+            # UTF-8 nunca usa el byte 0xff: todo lo que empieza por `prefix` es menor.
+            j = bisect.bisect_left(keys, prefix + b"\xff", i, hi)
+            if j - i > min_keys:
+                out[prefix] = heapq.nlargest(k, set(recs[i:j]), key=pops.__getitem__)
+                stack.append((i, j, length + 1))
+            i = j
+    return out
+
+
+def build_index(csv_path, out_path, delimiter=None):
+    """Construye el índice binario a partir de un CSV con nombre, lat, lon y popularidad."""
+    labels, lats, lngs = [], [], []
+    pops = array("f")
+    entries = []
+
+    with open(csv_path, newline="", encoding="utf-8") as fh:
+        sample = fh.read(4096)
+        fh.seek(0)
+        if delimiter is None:
+            delimiter = "\t" if sample.count("\t") > sample.count(",") else ","
+        for row in csv.DictReader(fh, delimiter=delimiter):
+            row = {k.strip().lower(): v for k, v in row.items() if k}
+            label = _pick(row, _NAME_COLS)
+            lat, lng = _pick(row, _LAT_COLS), _pick(row, _LNG_COLS)
+            if not label or lat is None or lng is None:
+                continue
+            try:
+                lat, lng = float(lat), float(lng)
+                pop = float(_pick(row, _POP_COLS) or 0.0)
+            except ValueError:
+                continue
+            idx = len(labels)
+            labels.append(label.strip().replace("\t", " ").replace("\n", " "))
+            lats.append(lat)
+            lngs.append(lng)
+            pops.append(pop)
+            for key in _record_keys(label):
+                if key:
+                    entries.append((key.encode("utf-8"), idx))
+
+    entries.sort()
+
+    rec_blob = bytearray()
+    rec_off = array("Q", [0])
+    for label, lat, lng in zip(labels, lats, lngs):
+        rec_blob += f"{label}\t{lat:.6f}\t{lng:.6f}".encode("utf-8")
+        rec_off.append(len(rec_blob))
+
+    key_blob = bytearray()
+    key_off = array("Q", [0])
+    key_rec = array("I")
+    for key, idx in entries:
+        key_blob += key
+        key_off.append(len(key_blob))
+        key_rec.append(idx)
+
+    top = _top_prefixes([key for key, _ in entries], key_rec, pops)
+    top_blob = bytearray()
+    top_off = array("Q", [0])
+    top_rec = array("I")
+    for prefix in sorted(top):
+        top_blob += prefix
+        top_off.append(len(top_blob))
+        best = top[prefix]
+        top_rec.extend(best + [_NO_RECORD] * (TOP_K - len(best)))
+
+    tmp = out_path + ".tmp"
+    with open(tmp, "wb") as out:
+        out.write(_HEADER.pack(MAGIC, VERSION, len(labels), len(entries), len(top), TOP_K, SCAN_LIMIT))
+        for arr in (rec_off, key_off, top_off, key_rec, pops, top_rec):
+            out.write(arr.tobytes())
+        out.write(rec_blob)
+        out.write(key_blob)
+        out.write(top_blob)
+    os.replace(tmp, out_path)
+    return {"records": len(labels), "keys": len(entries), "top_prefixes": len(top)}
+
+
+class GazetteerIndex:
+    """Índice de prefijos abierto con mmap (solo lectura, compartido entre sesiones)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fh = open(path, "rb")
+        self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_rec, n_keys, n_top, top_k, scan_limit = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: no es un índice de nomenclátor válido")
+        if version != VERSION:
+            raise ValueError(f"{path}: índice de la versión {version}, vuelve a generarlo")
+        self.n_records, self.n_keys = n_rec, n_keys
+        self.n_top, self.top_k, self.scan_limit = n_top, top_k, scan_limit
+
+        view = memoryview(self._mm)
+        pos = _HEADER.size
+
+        def take(fmt, count, size):
+            nonlocal pos
+            section = view[pos:pos + count * size].cast(fmt)
+            pos += count * size
+            return section
+
+        self._rec_off = take("Q", n_rec + 1, 8)
+        self._key_off = take("Q", n_keys + 1, 8)
+        self._top_off = take("Q", n_top + 1, 8)
+        self._key_rec = take("I", n_keys, 4)
+        self._pop = take("f", n_rec, 4)
+        self._top_rec = take("I", n_top * top_k, 4)
+        self._rec_base = pos
+        self._key_base = pos + self._rec_off[n_rec]
+        self._top_base = self._key_base + self._key_off[n_keys]
+
+    def _key(self, i):
+        start = self._key_base + self._key_off[i]
+        return self._mm[start:self._key_base + self._key_off[i + 1]]
+
+    def _record(self, idx):
+        raw = self._mm[self._rec_base + self._rec_off[idx]:self._rec_base + self._rec_off[idx + 1]]
+        label, lat, lng = raw.decode("utf-8").split("\t")
+        return label, float(lat), float(lng)
+
+    def _top_prefix(self, i):
+        start = self._top_base + self._top_off[i]
+        return self._mm[start:self._top_base + self._top_off[i + 1]]
+
+    def _lower_bound(self, prefix):
+        lo, hi = 0, self.n_keys
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < prefix:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _top(self, prefix):
+        """Registros más populares precalculados para `prefix` (None si no los tiene)."""
+        lo, hi = 0, self.n_top
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._top_prefix(mid) < prefix:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.n_top or self._top_prefix(lo) != prefix:
+            return None
+        row = self._top_rec[lo * self.top_k:(lo + 1) * self.top_k]
+        return [idx for idx in row if idx != _NO_RECORD]
+
+    def search(self, query, limit=5):
+        """Sugerencias por prefijo (sin tildes), ordenadas por popularidad.
+
+        Hasta `top_k` resultados si el prefijo abarca muchas claves.
+        """
+        prefix = normalize_query(query).encode("utf-8")
+        if not prefix:
+            return []
+        i = self._lower_bound(prefix)
+        end = i + self.scan_limit
+        best = None
+        if end < self.n_keys and self._key(end).startswith(prefix):
+            best = self._top(prefix)
+        if best is None:
+            seen = set()
+            while i < self.n_keys and self._key(i).startswith(prefix):
+                seen.add(self._key_rec[i])
+                i += 1
+            best = heapq.nlargest(limit, seen, key=lambda idx: self._pop[idx])
+        best = best[:limit]
+        results = []
+        for idx in best:
+            label, lat, lng = self._record(idx)
+            results.append({
+                "description": label,
+                "place_id": None,
+                "location": {"lat": lat, "lng": lng},
+                "source": "gazetteer",
+            })
+        return results
+
+    def close(self):
+        self._key_off = self._key_rec = self._rec_off = self._pop = None
+        self._top_off = self._top_rec = None
+        self._mm.close()
+        self._fh.close()
+
+
+def _main(argv):
+    if len(argv) >= 3 and argv[0] == "build":
+        info = build_index(argv[1], argv[2])
+        print(f"Índice creado: {info['records']} registros, {info['keys']} claves, "
+              f"{info['top_prefixes']} prefijos con top -> {argv[2]}")
+        return 0
+    if len(argv) >= 3 and argv[0] == "query":
+        idx = GazetteerIndex(argv[1])
+        for r in idx.search(" ".join(argv[2:])):
+            print(f"{r['description']}  ({r['location']['lat']}, {r['location']['lng']})")
+        return 0
+    print(__doc__)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
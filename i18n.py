@@ -24,6 +24,7 @@ TEXTS = {
         "route_generated": "✅ Ruta generada ({pref})",
         "scan_qr": "Escanea para abrir la ruta en el móvil",
         "last_route": "Última ruta generada (esta sesión)",
+        "route_history": "Rutas de esta sesión",
         "open_status_now": "Estado de apertura (ahora)",
         "open": "✅ Abierto",
         "closed": "⛔ Cerrado",
@@ -99,6 +100,7 @@ TEXTS = {
         "route_generated": "✅ Route generated ({pref})",
         "scan_qr": "Scan to open the route on your phone",
         "last_route": "Last route generated (this session)",
+        "route_history": "Routes in this session",
         "open_status_now": "Open status (now)",
         "open": "✅ Open",
         "closed": "⛔ Closed",
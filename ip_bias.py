@@ -0,0 +1,164 @@
+# ip_bias.py
+"""Ubicación aproximada por IP para sesgar el autocompletado, sin bloquear el rerun.
+
+La consulta a ipapi.co se hace en segundo plano y se cachea por IP de cliente.
+Opcionalmente se usa una tabla local de rangos IPv4 (ordenada, abierta con
+mmap y consultada con bisect) y entonces no hace falta red.
+
+    python ip_bias.py build rangos.csv rangos.ipr   # CSV: start_ip,end_ip,lat,lng
+"""
+import bisect
+import csv
+import ipaddress
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from cache import TTLCache
+from transport import Transport
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"IPR1"
+_HEADER = struct.Struct("<4sI")
+
+# Marca de "no se pudo ubicar" (se cachea poco tiempo para no insistir en cada clic).
+_FAILED = {}
+
+
+def _ip_int(ip):
+    return int(ipaddress.IPv4Address(ip.strip()))
+
+
+def build_table(csv_path, out_path):
+    """Convierte un CSV de rangos IPv4 (start_ip, end_ip, lat, lng) en la tabla binaria."""
+    rows = []
+    with open(csv_path, newline="", encoding="utf-8") as fh:
+        for row in csv.reader(fh):
+            try:
+                start, end = _ip_int(row[0]), _ip_int(row[1])
+                rows.append((start, end, float(row[2]), float(row[3])))
+            except (ValueError, IndexError):
+                continue  # cabecera, IPv6 o líneas incompletas
+    rows.sort()
+    starts, ends = array("I"), array("I")
+    lats, lngs = array("f"), array("f")
+    for s, e, lat, lng in rows:
+        starts.append(s)
+        ends.append(e)
+        lats.append(lat)
+        lngs.append(lng)
+    tmp = out_path + ".tmp"
+    with open(tmp, "wb") as out:
+        out.write(_HEADER.pack(MAGIC, len(rows)))
+        for arr in (starts, ends, lats, lngs):
+            out.write(arr.tobytes())
+    os.replace(tmp, out_path)
+    return len(rows)
+
+
+class IpRangeTable:
+    """Tabla de rangos IPv4 -> (lat, lng) en mmap; búsqueda O(log n) sin cargarla en memoria."""
+
+    def __init__(self, path):
+        self._fh = open(path, "rb")
+        self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: no es una tabla de rangos IP válida")
+        view = memoryview(self._mm)[_HEADER.size:]
+        self._starts = view[0:4 * n].cast("I")
+        self._ends = view[4 * n:8 * n].cast("I")
+        self._lats = view[8 * n:12 * n].cast("f")
+        self._lngs = view[12 * n:16 * n].cast("f")
+
+    def lookup(self, ip):
+        try:
+            value = _ip_int(ip)
+        except ValueError:
+            return None
+        i = bisect.bisect_right(self._starts, value) - 1
+        if i < 0 or value > self._ends[i]:
+            return None
+        return {"lat": float(self._lats[i]), "lng": float(self._lngs[i])}
+
+
+class IpBiasResolver:
+    """Ubicación por IP: tabla local si la hay; si no, ipapi en segundo plano con caché."""
+
+    def __init__(self, table_path=None, base_url="https://ipapi.co", ttl=6 * 3600,
+                 failed_ttl=300, timeout=6, session=None):
+        self.table = None
+        if table_path:
+            try:
+                self.table = IpRangeTable(table_path)
+            except Exception as e:
+                metrics.incr("errors.ip_bias_table")
+                log.warning("[IpBiasResolver] Tabla de IP no disponible: %s", e)
+        self.base_url = base_url.rstrip("/")
+        self.failed_ttl = failed_ttl
+        self.timeout = timeout
+        self._cache = TTLCache("ip_bias", maxsize=10000, ttl=ttl)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ipbias")
+        self._session = session or Transport()
+
+    def _fetch(self, ip):
+        url = f"{self.base_url}/{ip}/json/" if ip else f"{self.base_url}/json/"
+        try:
+            with metrics.span("ipapi"):
+                data = self._session.get(url, timeout=self.timeout).json()
+            lat, lng = data.get("latitude"), data.get("longitude")
+            if lat and lng:
+                self._cache.set(ip, {"lat": float(lat), "lng": float(lng)})
+            else:
+                self._cache.set(ip, _FAILED, ttl=self.failed_ttl)
+        except Exception as e:
+            metrics.incr("errors.ip_bias")
+            log.warning("[IpBiasResolver] Error: %s", e)
+            self._cache.set(ip, _FAILED, ttl=self.failed_ttl)
+        finally:
+            with self._lock:
+                self._pending.pop(ip, None)
+
+    def lookup(self, ip, start=True):
+        """Ubicación de `ip` si ya se conoce; si no, la pide en segundo plano y devuelve None."""
+        if self.table is not None and ip:
+            hit = self.table.lookup(ip)
+            if hit:
+                return hit
+        cached = self._cache.get(ip)
+        if cached is not None:
+            return cached or None
+        if start:
+            with self._lock:
+                if ip not in self._pending:
+                    self._pending[ip] = self._executor.submit(self._fetch, ip)
+        return None
+
+    def is_pending(self, ip):
+        with self._lock:
+            return ip in self._pending
+
+    def has_failed(self, ip):
+        return self._cache.peek(ip) is _FAILED
+
+
+def _main(argv):
+    if len(argv) == 3 and argv[0] == "build":
+        n = build_table(argv[1], argv[2])
+        print(f"Tabla creada: {n} rangos -> {argv[2]}")
+        return 0
+    print(__doc__)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
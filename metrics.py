@@ -0,0 +1,220 @@
+# metrics.py
+"""Instrumentación ligera: tiempos por tramo, contadores y ratios de caché.
+
+Cada medida es un `perf_counter` y unas sumas bajo un lock, así que se puede
+dejar activo en producción. Los datos se ven en el panel de desarrollo de la
+barra lateral (con `DEV_METRICS=1` o `?dev=<DEV_TOKEN>`) y se pueden volcar
+periódicamente a un fichero en formato Prometheus (`.prom`) o JSON
+(`METRICS_FILE`), sin servicios externos.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from cache import CACHES
+
+# Límites superiores de los buckets del histograma, en segundos.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+# Valores instantáneos por etiqueta (p. ej. cuota por endpoint): sección -> (etiqueta, función).
+_gauges = {}
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.total += seconds
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Cuantil aproximado (límite superior del bucket que lo contiene)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= target:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max
+        return self.max
+
+
+def observe(name, seconds):
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = _Histogram()
+        hist.observe(seconds)
+
+
+def incr(name, value=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+@contextmanager
+def span(name):
+    """Mide la duración del bloque (también si lanza una excepción, que se cuenta aparte)."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        incr(f"{name}.errors")
+        raise
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def timed(name):
+    """Decorador equivalente a `span(name)` alrededor de la función."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def register_gauges(section, label, fn):
+    """Publica `fn()` -> {clave: {campo: número}} como gauges `app_<sección>_<campo>{<label>=clave}`."""
+    with _lock:
+        _gauges[section] = (label, fn)
+
+
+def _collect_gauges():
+    with _lock:
+        sources = list(_gauges.items())
+    out = {}
+    for section, (label, fn) in sources:
+        try:
+            out[section] = (label, fn())
+        except Exception:
+            incr("metrics.gauge_errors")
+    return out
+
+
+def snapshot():
+    """Estado actual como dict serializable (tramos, contadores, cachés y gauges)."""
+    with _lock:
+        spans = {
+            name: {
+                "count": h.count,
+                "sum_s": round(h.total, 6),
+                "p50_ms": round(h.quantile(0.5) * 1000, 2),
+                "p95_ms": round(h.quantile(0.95) * 1000, 2),
+                "p99_ms": round(h.quantile(0.99) * 1000, 2),
+                "max_ms": round(h.max * 1000, 2),
+            }
+            for name, h in _histograms.items()
+        }
+        counters = dict(_counters)
+    caches = {name: c.stats() for name, c in list(CACHES.items())}
+    gauges = {section: rows for section, (_, rows) in _collect_gauges().items()}
+    return {"ts": time.time(), "spans": spans, "counters": counters, "caches": caches,
+            "gauges": gauges}
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def render_prometheus():
+    """Texto en formato de exposición de Prometheus."""
+    lines = [
+        "# HELP app_span_seconds Duración de cada tramo medido (rerun, vistas, llamadas externas).",
+        "# TYPE app_span_seconds histogram",
+    ]
+    with _lock:
+        hists = [(n, list(h.counts), h.total, h.count) for n, h in _histograms.items()]
+        counters = dict(_counters)
+    for name, counts, total, count in sorted(hists):
+        acc = 0
+        for bound, c in zip(BUCKETS, counts):
+            acc += c
+            lines.append(f'app_span_seconds_bucket{{span="{_label(name)}",le="{bound}"}} {acc}')
+        lines.append(f'app_span_seconds_bucket{{span="{_label(name)}",le="+Inf"}} {count}')
+        lines.append(f'app_span_seconds_sum{{span="{_label(name)}"}} {total:.6f}')
+        lines.append(f'app_span_seconds_count{{span="{_label(name)}"}} {count}')
+    lines.append("# HELP app_events_total Eventos contados (errores, reintentos, llamadas unidas...).")
+    lines.append("# TYPE app_events_total counter")
+    for name, value in sorted(counters.items()):
+        lines.append(f'app_events_total{{name="{_label(name)}"}} {value}')
+    caches = [(name, c.stats()) for name, c in sorted(CACHES.items())]
+    families = (
+        ("app_cache_hit_ratio", "gauge", "hit_ratio", "Aciertos / consultas de cada caché."),
+        ("app_cache_size", "gauge", "size", "Entradas en cada caché."),
+        ("app_cache_evictions_total", "counter", "evictions", "Entradas expulsadas por tamaño."),
+        ("app_cache_prefix_hits_total", "counter", "prefix_hits",
+         "Respuestas obtenidas filtrando un prefijo más corto (autocompletado)."),
+        ("app_cache_calls_saved_total", "counter", "calls_saved",
+         "Llamadas a la red evitadas (aciertos exactos + por prefijo)."),
+    )
+    for metric, kind, field, help_text in families:
+        rows = [(name, stats[field]) for name, stats in caches if field in stats]
+        if not rows:
+            continue
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, value in rows:
+            lines.append(f'{metric}{{cache="{_label(name)}"}} {value}')
+    for section, (label, rows) in sorted(_collect_gauges().items()):
+        fields = sorted({
+            f for row in rows.values() for f, v in row.items() if isinstance(v, (int, float))
+        })
+        for field in fields:
+            metric = f"app_{section}_{field}"
+            lines.append(f"# HELP {metric} Valor actual de {field} por {label} ({section}).")
+            lines.append(f"# TYPE {metric} gauge")
+            for key, row in sorted(rows.items()):
+                if isinstance(row.get(field), (int, float)):
+                    lines.append(f'{metric}{{{label}="{_label(key)}"}} {row[field]}')
+    return "\n".join(lines) + "\n"
+
+
+def write_file(path):
+    """Vuelca las métricas a `path` (.json -> JSON; cualquier otra -> Prometheus)."""
+    data = json.dumps(snapshot(), indent=1) if path.endswith(".json") else render_prometheus()
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+_exporter = None
+
+
+def start_exporter(path, interval_s=15.0):
+    """Hilo en segundo plano que reescribe `path` cada `interval_s` (uno por proceso)."""
+    global _exporter
+    if _exporter is not None or not path:
+        return
+
+    def loop():
+        while True:
+            time.sleep(interval_s)
+            try:
+                write_file(path)
+            except Exception:
+                incr("metrics.export_errors")
+    _exporter = threading.Thread(target=loop, name="metrics-exporter", daemon=True)
+    _exporter.start()
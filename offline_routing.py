@@ -0,0 +1,458 @@
+# offline_routing.py
+"""Motor de rutas sin red sobre un grafo de carreteras en ficheros NumPy mapeados en memoria.
+
+El grafo se guarda en formato CSR (`indptr`, `indices` y pesos por arista) como
+`.npy` en un directorio y se abre con `np.load(mmap_mode="r")`: arrancar es
+casi instantáneo y el sistema operativo solo carga las páginas que se tocan.
+Un índice de rejilla (celdas ordenadas + `searchsorted`) encaja coordenadas
+en el nodo más cercano. Las consultas (punto a punto y de uno a muchos, para
+las matrices del optimizador) relajan frentes enteros de aristas con NumPy y
+se podan con una cota A* (línea recta a la velocidad máxima del grafo).
+
+    python offline_routing.py import-osm region.osm.pbf grafo/      # requiere `osmium`
+    python offline_routing.py import-csv nodos.csv aristas.csv grafo/
+    python offline_routing.py route grafo/ 40.4168,-3.7038 40.4530,-3.6883
+"""
+import csv
+import json
+import math
+import os
+import sys
+
+import numpy as np
+
+import metrics
+from route_compare import PREFERENCES
+from route_optimizer import EARTH_RADIUS_M
+
+FORMAT_VERSION = 1
+UNREACHABLE = 1e9
+
+# Velocidad por defecto (km/h) por tipo de vía de OSM; las demás no se importan.
+HIGHWAY_SPEEDS = {
+    "motorway": 110, "motorway_link": 60, "trunk": 90, "trunk_link": 50,
+    "primary": 60, "primary_link": 40, "secondary": 50, "secondary_link": 35,
+    "tertiary": 40, "tertiary_link": 30, "unclassified": 30, "residential": 30,
+    "living_street": 10, "service": 15,
+}
+_FAST_ROADS = {"motorway", "motorway_link", "trunk", "trunk_link"}
+
+# Celda del índice espacial (grados, ~550 m de latitud).
+GRID_DEG = 0.005
+_GRID_COLS = int(math.ceil(360 / GRID_DEG))
+
+_ARRAYS = ("indptr", "indices", "duration_s", "length_m", "highway", "lat", "lng",
+           "grid_keys", "grid_start", "grid_nodes")
+
+
+def _haversine(lat1, lng1, lat2, lng2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((p2 - p1) / 2) ** 2
+         + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(1.0, a)))
+
+
+def _haversine_np(lat1, lng1, lat2, lng2):
+    p1, p2 = np.radians(lat1), np.radians(lat2)
+    a = np.sin((p2 - p1) / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(np.radians(lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _cell(lat, lng):
+    row = np.floor((np.asarray(lat) + 90) / GRID_DEG).astype(np.int64)
+    col = np.floor((np.asarray(lng) + 180) / GRID_DEG).astype(np.int64)
+    return row * _GRID_COLS + col
+
+
+# ---------------------------------------------------------------------------
+# Construcción
+# ---------------------------------------------------------------------------
+def build_graph(lat, lng, src, dst, length_m, speed_kmh, highway, out_dir):
+    """Escribe el grafo CSR e índice espacial en `out_dir` a partir de arrays de aristas dirigidas."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    n = len(lat)
+
+    order = np.argsort(src, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+    length = np.asarray(length_m, dtype=np.float32)[order]
+    speed = np.asarray(speed_kmh, dtype=np.float32)[order]
+    arrays = {
+        "indptr": indptr,
+        "indices": dst[order].astype(np.int32),
+        "length_m": length,
+        "duration_s": length / np.maximum(speed, 1.0) * 3.6,
+        "highway": np.asarray(highway, dtype=np.uint8)[order],
+        "lat": lat,
+        "lng": lng,
+    }
+    cells = _cell(lat, lng)
+    grid_nodes = np.argsort(cells, kind="stable").astype(np.int32)
+    keys, start = np.unique(cells[grid_nodes], return_index=True)
+    arrays["grid_keys"] = keys
+    arrays["grid_start"] = np.append(start, n).astype(np.int64)
+    arrays["grid_nodes"] = grid_nodes
+
+    os.makedirs(out_dir, exist_ok=True)
+    for name, arr in arrays.items():
+        np.save(os.path.join(out_dir, f"{name}.npy"), arr)
+    meta = {
+        "version": FORMAT_VERSION,
+        "nodes": int(n),
+        "edges": int(len(dst)),
+        "max_speed_kmh": float(np.max(speed)) if len(speed) else 1.0,
+        "bbox": [float(lat.min()), float(lng.min()), float(lat.max()), float(lng.max())] if n else None,
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as fh:
+        json.dump(meta, fh)
+    return meta
+
+
+class _EdgeBuilder:
+    """Acumula nodos y aristas con ids de OSM y los compacta a índices 0..N-1."""
+
+    def __init__(self):
+        self.ids = {}
+        self.lat, self.lng = [], []
+        self.src, self.dst, self.length, self.speed, self.fast = [], [], [], [], []
+
+    def node(self, osm_id, lat, lng):
+        i = self.ids.get(osm_id)
+        if i is None:
+            i = self.ids[osm_id] = len(self.lat)
+            self.lat.append(lat)
+            self.lng.append(lng)
+        return i
+
+    def way(self, points, highway, maxspeed=None, oneway="no"):
+        speed = _speed(highway, maxspeed)
+        fast = highway in _FAST_ROADS
+        reverse = oneway == "-1"
+        both = oneway not in ("yes", "true", "1", "-1") and highway not in ("motorway",)
+        nodes = [self.node(*p) for p in points]
+        for a, b in zip(nodes, nodes[1:]):
+            d = _haversine(self.lat[a], self.lng[a], self.lat[b], self.lng[b])
+            pairs = [(b, a)] if reverse else [(a, b)] + ([(b, a)] if both else [])
+            for u, v in pairs:
+                self.src.append(u)
+                self.dst.append(v)
+                self.length.append(d)
+                self.speed.append(speed)
+                self.fast.append(fast)
+
+    def write(self, out_dir):
+        return build_graph(self.lat, self.lng, self.src, self.dst, self.length, self.speed,
+                           self.fast, out_dir)
+
+
+def _speed(highway, maxspeed):
+    try:
+        return float(str(maxspeed).split()[0])
+    except (TypeError, ValueError, IndexError):
+        return float(HIGHWAY_SPEEDS.get(highway, 30))
+
+
+def import_osm(pbf_path, out_dir):
+    """Importa las vías de un extracto de OSM (.osm.pbf / .osm) con pyosmium."""
+    try:
+        import osmium
+    except ImportError as e:
+        raise ImportError("Importar OSM requiere `pip install osmium`; "
+                          "alternativa: `import-csv`.") from e
+
+    builder = _EdgeBuilder()
+
+    class Handler(osmium.SimpleHandler):
+        def way(self, w):
+            highway = w.tags.get("highway")
+            if highway not in HIGHWAY_SPEEDS:
+                return
+            try:
+                points = [(n.ref, n.location.lat, n.location.lon) for n in w.nodes]
+            except osmium.InvalidLocationError:
+                return
+            builder.way(points, highway, w.tags.get("maxspeed"), w.tags.get("oneway", "no"))
+
+    Handler().apply_file(pbf_path, locations=True)
+    return builder.write(out_dir)
+
+
+def import_csv(nodes_csv, edges_csv, out_dir):
+    """Importa un grafo de CSV: nodos (id, lat, lng) y aristas (u, v[, highway, maxspeed, oneway])."""
+    coords = {}
+    with open(nodes_csv, newline="", encoding="utf-8") as fh:
+        for row in csv.DictReader(fh):
+            coords[row["id"]] = (float(row["lat"]), float(row["lng"]))
+    builder = _EdgeBuilder()
+    with open(edges_csv, newline="", encoding="utf-8") as fh:
+        for row in csv.DictReader(fh):
+            u, v = row["u"], row["v"]
+            if u not in coords or v not in coords:
+                continue
+            builder.way([(u, *coords[u]), (v, *coords[v])], row.get("highway") or "residential",
+                        row.get("maxspeed"), row.get("oneway") or "no")
+    return builder.write(out_dir)
+
+
+# ---------------------------------------------------------------------------
+# Consultas
+# ---------------------------------------------------------------------------
+class RoadGraph:
+    """Grafo de carreteras abierto en modo mmap (solo lectura, compartible entre hilos)."""
+
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as fh:
+            self.meta = json.load(fh)
+        if self.meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path}: versión de grafo no soportada")
+        for name in _ARRAYS:
+            arr = np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            # Vista ndarray sobre el mismo mmap: sin el sobrecoste de np.memmap al indexar.
+            setattr(self, name, arr.view(np.ndarray))
+        self.n = self.meta["nodes"]
+        self.max_speed_ms = self.meta["max_speed_kmh"] / 3.6
+
+    def snap(self, lat, lng, max_rings=20):
+        """Nodo más cercano a (lat, lng) buscando en anillos de celdas de la rejilla."""
+        row = int(math.floor((lat + 90) / GRID_DEG))
+        col = int(math.floor((lng + 180) / GRID_DEG))
+        found_ring = None
+        candidates = []
+        for r in range(max_rings + 1):
+            cells = [
+                (row + dr) * _GRID_COLS + (col + dc)
+                for dr in range(-r, r + 1) for dc in range(-r, r + 1)
+                if max(abs(dr), abs(dc)) == r
+            ]
+            pos = np.searchsorted(self.grid_keys, cells)
+            for c, p in zip(cells, pos):
+                if p < len(self.grid_keys) and self.grid_keys[p] == c:
+                    candidates.append(self.grid_nodes[self.grid_start[p]:self.grid_start[p + 1]])
+            if candidates and found_ring is None:
+                found_ring = r  # un anillo más: el más cercano puede estar en la celda vecina
+            elif found_ring is not None:
+                break
+        if not candidates:
+            return None
+        nodes = np.concatenate(candidates)
+        d = _haversine_np(lat, lng, self.lat[nodes], self.lng[nodes])
+        return int(nodes[int(np.argmin(d))])
+
+    def _search(self, sources, targets, weight="duration", avoid_highways=False, delta=None):
+        """Caminos mínimos de cada origen a cada objetivo con relajación vectorizada por frentes.
+
+        El frente son pares (origen, nodo) pendientes; en cada ronda se relajan a
+        la vez con NumPy las aristas de los que están a menos de `delta` del
+        mínimo de su origen (delta-stepping). Se poda con una cota tipo A*: un
+        par cuyo coste más la línea recta (a la velocidad máxima del grafo)
+        hasta el objetivo más cercano no baja de la peor llegada ya conocida de
+        ese origen no se expande.
+        Devuelve matrices (coste, coste_secundario) de forma S×T.
+        """
+        if weight == "duration":
+            w, alt, speed = self.duration_s, self.length_m, self.max_speed_ms
+        else:
+            w, alt, speed = self.length_m, self.duration_s, 1.0
+        if delta is None:
+            delta = 30.0 if weight == "duration" else 500.0
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        n_src, n = len(sources), self.n
+        tlat, tlng = self.lat[targets], self.lng[targets]
+
+        cost = np.full(n_src * n, np.inf)  # cost[s * n + nodo]
+        other = np.full(n_src * n, np.inf)
+        rows = np.arange(n_src, dtype=np.int64)
+        cost[rows * n + sources] = other[rows * n + sources] = 0.0
+        f_src, f_node = rows, sources.copy()
+        t_idx = rows[:, None] * n + targets[None, :]
+        indptr, indices = self.indptr, self.indices
+        h_all = np.full(n, np.nan)  # cota de cada nodo, calculada la primera vez que se ve
+        while len(f_node):
+            bound = cost[t_idx].max(axis=1)
+            if np.isfinite(bound).any():
+                m = f_node[np.isnan(h_all[f_node])]
+                if len(m):
+                    h_all[m] = _haversine_np(self.lat[m][:, None], self.lng[m][:, None],
+                                             tlat[None, :], tlng[None, :]).min(axis=1) / speed
+                keep = cost[f_src * n + f_node] + h_all[f_node] < bound[f_src]
+                f_src, f_node = f_src[keep], f_node[keep]
+                if not len(f_node):
+                    break
+            # Delta-stepping: se expanden solo los pares cercanos al mínimo de su origen;
+            # el resto espera (así casi ningún nodo se relaja más de una vez).
+            f_cost = cost[f_src * n + f_node]
+            low = np.full(n_src, np.inf)
+            np.minimum.at(low, f_src, f_cost)
+            now = f_cost <= low[f_src] + delta
+            later_src, later_node = f_src[~now], f_node[~now]
+            f_src, f_node = f_src[now], f_node[now]
+            starts = indptr[f_node]
+            counts = indptr[f_node + 1] - starts
+            total = int(counts.sum())
+            edge = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+            src = np.repeat(f_src, counts)
+            u = np.repeat(f_node, counts)
+            if avoid_highways:
+                keep = self.highway[edge] == 0
+                edge, src, u = edge[keep], src[keep], u[keep]
+            key = src * n + indices[edge]
+            cand = cost[src * n + u] + w[edge]
+            better = cand < cost[key]
+            key, cand, u, src, edge = key[better], cand[better], u[better], src[better], edge[better]
+            # Si varias aristas llegan al mismo (origen, nodo), gana la de menor coste.
+            order = np.lexsort((cand, key))
+            key, cand, u, src, edge = key[order], cand[order], u[order], src[order], edge[order]
+            first = np.ones(len(key), dtype=bool)
+            first[1:] = key[1:] != key[:-1]
+            key, cand, u, src, edge = key[first], cand[first], u[first], src[first], edge[first]
+            cost[key] = cand
+            other[key] = other[src * n + u] + alt[edge]
+            merged = np.unique(np.concatenate((key, later_src * n + later_node)))
+            f_src, f_node = merged // n, merged % n
+        primary, secondary = cost[t_idx], other[t_idx]
+        return (np.where(np.isfinite(primary), primary, UNREACHABLE),
+                np.where(np.isfinite(secondary), secondary, UNREACHABLE))
+
+    def many_to_many(self, sources, targets, weight="duration", avoid_highways=False,
+                     max_cells=10_000_000):
+        """Matrices S×T (duración_s, distancia_m). Los orígenes van por bloques para acotar memoria."""
+        chunk = max(1, max_cells // max(1, self.n))
+        durations, distances = [], []
+        for i in range(0, len(sources), chunk):
+            primary, secondary = self._search(sources[i:i + chunk], targets, weight, avoid_highways)
+            if weight != "duration":
+                primary, secondary = secondary, primary
+            durations.append(primary)
+            distances.append(secondary)
+        return np.vstack(durations), np.vstack(distances)
+
+    def one_to_many(self, source, targets, weight="duration", avoid_highways=False):
+        """Desde `source` hasta cada uno de `targets`: arrays (duración_s, distancia_m)."""
+        dur, dist = self.many_to_many([source], targets, weight=weight, avoid_highways=avoid_highways)
+        return dur[0], dist[0]
+
+    def route(self, source, target, weight="duration", avoid_highways=False):
+        """Camino mínimo entre dos nodos: (duración_s, distancia_m), UNREACHABLE si no hay."""
+        dur, dist = self.one_to_many(source, [target], weight=weight, avoid_highways=avoid_highways)
+        return float(dur[0]), float(dist[0])
+
+
+def _point(p):
+    if isinstance(p, dict):
+        loc = p.get("location") or p
+        if loc.get("lat") is not None and loc.get("lng") is not None:
+            return float(loc["lat"]), float(loc["lng"])
+        return None
+    return (float(p[0]), float(p[1])) if p is not None else None
+
+
+class OfflineMatrixService:
+    """Matrices de tiempos y distancias con el grafo local (misma interfaz que DistanceMatrixService)."""
+
+    # Velocidad fija (km/h) para los modos que no siguen los tiempos de coche.
+    MODE_SPEEDS = {"walking": 4.5, "bicycling": 15.0}
+
+    def __init__(self, graph):
+        self.graph = graph if isinstance(graph, RoadGraph) else RoadGraph(graph)
+        self.queries = 0
+
+    def _nodes(self, points):
+        out = []
+        for p in points:
+            ll = _point(p)
+            out.append(self.graph.snap(*ll) if ll else None)
+        return out
+
+    def matrices(self, points, mode="driving", departure_time=None, avoid_highways=False):
+        """(duraciones_s, distancias_m) N×N entre `points` (dicts resueltos o (lat, lng))."""
+        with metrics.span("offline.matrix"):
+            nodes = self._nodes(points)
+            n = len(points)
+            durations = np.full((n, n), UNREACHABLE)
+            distances = np.full((n, n), UNREACHABLE)
+            np.fill_diagonal(durations, 0.0)
+            np.fill_diagonal(distances, 0.0)
+            weight = "duration" if mode not in self.MODE_SPEEDS else "distance"
+            valid = [j for j, v in enumerate(nodes) if v is not None]
+            if valid:
+                ids = [nodes[j] for j in valid]
+                dur, dist = self.graph.many_to_many(ids, ids, weight=weight, avoid_highways=avoid_highways)
+                self.queries += 1
+                durations[np.ix_(valid, valid)] = dur
+                distances[np.ix_(valid, valid)] = dist
+            if weight == "distance":
+                speed = self.MODE_SPEEDS[mode] / 3.6
+                durations = np.where(distances >= UNREACHABLE, UNREACHABLE, distances / speed)
+            np.fill_diagonal(durations, 0.0)
+            np.fill_diagonal(distances, 0.0)
+        return durations, distances
+
+    def duration_matrix(self, points, mode="driving", departure_time=None):
+        return self.matrices(points, mode=mode, departure_time=departure_time)[0]
+
+    def route(self, points, mode="driving", weight="duration", avoid_highways=False):
+        """(duración_s, distancia_m) recorriendo `points` en orden."""
+        nodes = self._nodes(points)
+        if any(v is None for v in nodes):
+            return UNREACHABLE, UNREACHABLE
+        total_d = total_m = 0.0
+        for a, b in zip(nodes, nodes[1:]):
+            d, m = self.graph.route(a, b, weight=weight, avoid_highways=avoid_highways)
+            if d >= UNREACHABLE:
+                return UNREACHABLE, UNREACHABLE
+            total_d += d
+            total_m += m
+        if mode in self.MODE_SPEEDS:
+            total_d = total_m / (self.MODE_SPEEDS[mode] / 3.6)
+        return total_d, total_m
+
+    def compare(self, origin, destination, waypoints=None, mode="driving", preferences=None):
+        """Misma salida que `RouteComparator.compare`, calculada con el grafo local.
+
+        El grafo no sabe de peajes: evitar peajes se calcula como sin restricción.
+        """
+        points = [origin, *(waypoints or []), destination]
+        out, seen = [], {}
+        for pref in preferences or PREFERENCES:
+            avoid, criterion = PREFERENCES[pref]
+            weight = "duration" if criterion == "duration" else "distance"
+            dur, dist = self.route(points, mode=mode, weight=weight,
+                                   avoid_highways="highways" in avoid)
+            row = {"preference": pref, "duration_s": None, "distance_m": None,
+                   "summary": "offline", "polyline": None, "same_as": None}
+            if dur < UNREACHABLE:
+                row["duration_s"], row["distance_m"] = round(dur), round(dist)
+                sig = (row["duration_s"], row["distance_m"])
+                row["same_as"] = seen.get(sig)
+                seen.setdefault(sig, pref)
+            out.append(row)
+        return out
+
+    def stats(self):
+        return {"nodes": self.graph.n, "edges": self.graph.meta["edges"], "queries": self.queries}
+
+
+def _main(argv):
+    if len(argv) == 3 and argv[0] == "import-osm":
+        print(json.dumps(import_osm(argv[1], argv[2])))
+        return 0
+    if len(argv) == 4 and argv[0] == "import-csv":
+        print(json.dumps(import_csv(argv[1], argv[2], argv[3])))
+        return 0
+    if len(argv) == 4 and argv[0] == "route":
+        service = OfflineMatrixService(argv[1])
+        a = tuple(float(x) for x in argv[2].split(","))
+        b = tuple(float(x) for x in argv[3].split(","))
+        dur, dist = service.route([a, b])
+        print(json.dumps({"duration_s": round(dur, 1), "distance_m": round(dist, 1)}))
+        return 0
+    print(__doc__)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
@@ -0,0 +1,194 @@
+# opening_hours.py
+"""Horarios de apertura de las paradas y estado abierto/cerrado a la hora de llegada.
+
+Los horarios de todos los place_id de una ruta se piden en paralelo a Place
+Details con la máscara mínima (`opening_hours`, `utc_offset`) y se cachean
+hasta la primera apertura/cierre que cae pasado `min_ttl_s` (un día por
+defecto): como mucho una petición por lugar y día, y el refresco llega justo
+antes del cambio de estado. El estado de todas las paradas se evalúa de una
+vez con NumPy sobre intervalos en "minuto de la semana".
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import metrics
+from cache import TTLCache
+from route_optimizer import EARTH_RADIUS_M
+
+MINUTES_PER_WEEK = 7 * 24 * 60
+# 1970-01-01 fue jueves; Google numera los días desde el domingo (0).
+_EPOCH_WEEKDAY = 4
+
+OPEN, CLOSED, NO_DATA = 1, 0, -1
+
+# Marca de "sin horarios" (lugares sin datos o peticiones fallidas).
+_NO_HOURS = ()
+
+# Velocidades medias (km/h) para estimar llegadas por modo de viaje.
+SPEED_KMH = {"driving": 30.0, "walking": 4.5, "bicycling": 15.0, "transit": 20.0}
+
+
+def _minute(point):
+    hhmm = point.get("time", "0000")
+    return int(point.get("day", 0)) * 1440 + int(hhmm[:2]) * 60 + int(hhmm[2:])
+
+
+def parse_periods(opening_hours):
+    """`opening_hours` de Places -> array (P, 2) de [apertura, cierre) en minutos de la semana.
+
+    Un periodo que cruza el fin de semana (sábado -> domingo) queda con cierre
+    > MINUTES_PER_WEEK; "abierto 24 h" es un único periodo sin cierre.
+    """
+    periods = (opening_hours or {}).get("periods") or []
+    rows = []
+    for p in periods:
+        if "open" not in p:
+            continue
+        start = _minute(p["open"])
+        if not p.get("close"):
+            rows.append((0, MINUTES_PER_WEEK))
+            continue
+        end = _minute(p["close"])
+        if end <= start:
+            end += MINUTES_PER_WEEK
+        rows.append((start, end))
+    return np.array(rows, dtype=np.int32).reshape(-1, 2)
+
+
+def minute_of_week(ts, utc_offset_min):
+    """Minuto local de la semana (domingo 00:00 = 0) para timestamps UNIX (vectorizado)."""
+    local = np.floor(np.asarray(ts, dtype=float) / 60) + np.asarray(utc_offset_min, dtype=float)
+    return ((local + _EPOCH_WEEKDAY * 1440) % MINUTES_PER_WEEK).astype(np.int64)
+
+
+def next_transition(periods, utc_offset_min, ts):
+    """Timestamp de la siguiente apertura o cierre tras `ts` (None si siempre abierto/cerrado)."""
+    if not len(periods):
+        return None
+    bounds = np.unique(periods % MINUTES_PER_WEEK)
+    if len(periods) == 1 and periods[0, 1] - periods[0, 0] >= MINUTES_PER_WEEK:
+        return None
+    now = int(minute_of_week(ts, utc_offset_min))
+    delta = (bounds - now) % MINUTES_PER_WEEK
+    delta[delta == 0] = MINUTES_PER_WEEK
+    return (int(ts) // 60 + int(delta.min())) * 60
+
+
+def open_status(hours, arrivals):
+    """Estado (OPEN/CLOSED/NO_DATA) de cada parada a su hora de llegada, en una pasada.
+
+    `hours` es una lista de (periodos, utc_offset) o None por parada; `arrivals`
+    los timestamps de llegada.
+    """
+    n = len(hours)
+    status = np.full(n, NO_DATA, dtype=np.int8)
+    have = [i for i, h in enumerate(hours) if h and len(h[0])]
+    if not have:
+        return status
+    width = max(len(hours[i][0]) for i in have)
+    opens = np.full((len(have), width), np.iinfo(np.int32).max, dtype=np.int64)
+    closes = np.zeros((len(have), width), dtype=np.int64)
+    offsets = np.empty(len(have))
+    for row, i in enumerate(have):
+        periods, offset = hours[i]
+        opens[row, :len(periods)] = periods[:, 0]
+        closes[row, :len(periods)] = periods[:, 1]
+        offsets[row] = offset
+    m = minute_of_week(np.asarray(arrivals, dtype=float)[have], offsets)[:, None]
+    inside = ((m >= opens) & (m < closes)) | ((m + MINUTES_PER_WEEK >= opens) & (m + MINUTES_PER_WEEK < closes))
+    status[have] = np.where(inside.any(axis=1), OPEN, CLOSED)
+    return status
+
+
+def _leg_lengths(coords):
+    """Metros entre puntos consecutivos (haversine; NaN si falta alguno)."""
+    lat = np.radians(coords[:, 0])
+    lng = np.radians(coords[:, 1])
+    dlat, dlng = np.diff(lat), np.diff(lng)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def estimate_arrivals(points, start_ts, mode="driving", dwell_s=0.0):
+    """Hora estimada de llegada a cada punto (lat, lng) de una ruta que sale en `start_ts`.
+
+    Tramos en línea recta a la velocidad media del modo, más `dwell_s` de
+    estancia en cada parada anterior. Un punto sin coordenadas se toma en la
+    posición del anterior.
+    """
+    n = len(points)
+    if n == 0:
+        return np.empty(0)
+    coords = np.array([p if p is not None else (np.nan, np.nan) for p in points], dtype=float)
+    valid = ~np.isnan(coords[:, 0])
+    coords = coords[np.maximum.accumulate(np.where(valid, np.arange(n), 0))]
+    legs = np.zeros(n)
+    if n > 1:
+        speed = SPEED_KMH.get(mode, SPEED_KMH["driving"]) / 3.6
+        legs[1:] = np.nan_to_num(_leg_lengths(coords)) / speed
+        legs[2:] += dwell_s
+    return start_ts + np.cumsum(legs)
+
+
+class OpeningHoursService:
+    """Horarios por place_id con caché que caduca en la siguiente apertura/cierre."""
+
+    FIELDS = ["opening_hours", "utc_offset"]
+
+    def __init__(self, client, min_ttl_s=24 * 3600, max_ttl_s=7 * 24 * 3600,
+                 failed_ttl_s=300, max_workers=8):
+        self.client = client
+        self.min_ttl_s = min_ttl_s
+        self.max_ttl_s = max_ttl_s
+        self.failed_ttl_s = failed_ttl_s
+        self._cache = TTLCache("opening_hours", maxsize=20000, ttl=max_ttl_s)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hours")
+        self.fetches = 0
+
+    def _ttl(self, periods, offset, now):
+        nt = next_transition(periods, offset, now + self.min_ttl_s)
+        if nt is None:
+            return self.max_ttl_s
+        return min(self.max_ttl_s, nt - now)
+
+    def _fetch(self, place_id):
+        with metrics.span("opening_hours.fetch"):
+            r = self.client.place(place_id, fields=self.FIELDS)["result"]
+        self.fetches += 1
+        periods = parse_periods(r.get("opening_hours"))
+        offset = r.get("utc_offset")
+        if not len(periods) or offset is None:
+            self._cache.set(place_id, _NO_HOURS, ttl=self.min_ttl_s)
+            return None
+        hours = (periods, int(offset))
+        self._cache.set(place_id, hours, ttl=self._ttl(periods, offset, time.time()))
+        return hours
+
+    def get_many(self, place_ids):
+        """{place_id: (periodos, utc_offset) o None}; lo que no está en caché se pide en paralelo."""
+        out, missing = {}, []
+        for pid in dict.fromkeys(p for p in place_ids if p):
+            hit = self._cache.get(pid)
+            if hit is None:
+                missing.append(pid)
+            else:
+                out[pid] = hit or None
+        futures = {pid: self._executor.submit(self._fetch, pid) for pid in missing}
+        for pid, fut in futures.items():
+            try:
+                out[pid] = fut.result()
+            except Exception:
+                metrics.incr("opening_hours.errors")
+                self._cache.set(pid, _NO_HOURS, ttl=self.failed_ttl_s)
+                out[pid] = None
+        return out
+
+    def status(self, place_ids, arrivals):
+        """(estados, offsets): OPEN/CLOSED/NO_DATA de cada place_id a su hora de llegada
+        y su utc_offset en minutos (None si no se conoce).
+        """
+        known = self.get_many(place_ids)
+        hours = [known.get(pid) if pid else None for pid in place_ids]
+        return open_status(hours, arrivals), [h[1] if h else None for h in hours]
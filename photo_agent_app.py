@@ -1,10 +1,22 @@
+import os
+
 import streamlit as st
 # import warnings 
 
 # --- 1. IMPORTACIONES ---
-from tab_profesional import mostrar_profesional 
-# from tab_viajero import mostrar_viajero 
-# from tab_turistico import mostrar_turistico 
+# Las pestañas (y con ellas googlemaps, requests, etc.) se importan al usarse
+# por primera vez; ver _render_view().
+import metrics
+from i18n import get_texts
+
+# "lazy": solo se ejecuta la vista activa. "tabs": st.tabs clásico (todas en cada rerun).
+VIEW_MODE = os.environ.get("VIEW_MODE", "lazy")
+VIEWS = ["Profesional", "Viajero", "Turístico"]
+
+# Métricas: volcado periódico a fichero (.prom o .json) y panel solo para desarrollo.
+METRICS_FILE = os.environ.get("METRICS_FILE")
+DEV_METRICS = os.environ.get("DEV_METRICS") == "1"
+DEV_TOKEN = os.environ.get("DEV_TOKEN")
 
 
 # --- 2. CONFIGURACIÓN DE PÁGINA Y BARRA LATERAL (DONACIONES) ---
@@ -41,23 +53,81 @@ st.sidebar.markdown("---")
 
 
 # --- 3. FUNCIÓN PRINCIPAL DE LA APLICACIÓN ---
+def _render_view(nombre, t):
+    """Importa y dibuja una sola vista."""
+    if nombre == "Profesional":
+        from tab_profesional import mostrar_profesional
+        mostrar_profesional()
+    elif nombre == "Viajero":
+        from tab_viajero import mostrar_viajero
+        mostrar_viajero(t)
+    elif nombre == "Turístico":
+        from tab_turistico import mostrar_turistico
+        mostrar_turistico(t)
+
+
+def _dev_panel():
+    """Panel de métricas en la barra lateral (con DEV_METRICS=1 o ?dev=<DEV_TOKEN>)."""
+    if not (DEV_METRICS or (DEV_TOKEN and st.query_params.get("dev") == DEV_TOKEN)):
+        return
+    snap = metrics.snapshot()
+    with st.sidebar.expander("🛠️ Métricas (desarrollo)", expanded=False):
+        st.caption("Tiempos por tramo (ms)")
+        st.dataframe(
+            [{"tramo": k, **v} for k, v in sorted(snap["spans"].items())],
+            hide_index=True, width="stretch",
+        )
+        st.caption("Cachés")
+        st.dataframe(
+            list(snap["caches"].values()),
+            hide_index=True, width="stretch",
+        )
+        for section, col, title in (
+            ("quota", "endpoint", "Cuota de Google (hoy)"),
+            ("provider", "proveedor", "Proveedores de autocompletado"),
+        ):
+            rows = snap["gauges"].get(section)
+            if rows:
+                st.caption(title)
+                st.dataframe(
+                    [{col: k, **v} for k, v in sorted(rows.items())],
+                    hide_index=True, width="stretch",
+                )
+        if snap["counters"]:
+            st.caption("Contadores")
+            st.json(snap["counters"], expanded=False)
+        st.download_button(
+            "Descargar (Prometheus)", metrics.render_prometheus(),
+            file_name="metrics.prom", mime="text/plain",
+        )
+
+
 def main():
+    metrics.start_exporter(METRICS_FILE)
+    with metrics.span("rerun"):
+        _main()
+    _dev_panel()
+
+
+def _main():
     
     st.title("Planificador de Rutas")
     st.write(
         "Crea rutas con paradas usando direcciones completas. La última parada puede ser el destino final."
     )
+    t = get_texts(st.session_state.get("lang", "es"))
 
-    tab_prof, tab_viajero, tab_turistico = st.tabs(["Profesional", "Viajero", "Turístico"])
+    if VIEW_MODE == "tabs":
+        for tab, nombre in zip(st.tabs(VIEWS), VIEWS):
+            with tab:
+                _render_view(nombre, t)
+        return
 
-    with tab_prof:
-        mostrar_profesional()
-        
-    with tab_viajero:
-        st.info("Pestaña Viajero en construcción. ¡Vuelve pronto!")
-        
-    with tab_turistico:
-        st.info("Pestaña Turístico en construcción. ¡Vuelve pronto!")
+    # Solo la vista elegida se ejecuta en cada rerun.
+    vista = st.radio(
+        "Vista", VIEWS, key="vista_activa", horizontal=True, label_visibility="collapsed"
+    )
+    _render_view(vista, t)
 
 
 # --- 4. EJECUCIÓN DEL PROGRAMA ---
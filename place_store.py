@@ -0,0 +1,129 @@
+# place_store.py
+"""Almacén persistente de lugares resueltos (etiqueta -> place_id, dirección, lat/lng).
+
+SQLite compartido por todas las sesiones y que sobrevive a reinicios, con una
+caché en memoria delante. Las entradas más antiguas que `refresh_s` se marcan
+como caducadas para que quien llama las vuelva a resolver (y, si la red falla,
+pueda seguir usándolas).
+"""
+import sqlite3
+import threading
+import time
+
+from cache import TTLCache, normalize_query
+
+# Los lugares cambian poco: se refrescan al mes.
+DEFAULT_REFRESH_S = 30 * 24 * 3600
+
+
+class PlaceStore:
+    """Etiqueta normalizada -> lugar resuelto, en SQLite con caché LRU delante."""
+
+    def __init__(self, db_path="places.sqlite3", refresh_s=DEFAULT_REFRESH_S, front_size=5000):
+        self.refresh_s = refresh_s
+        self._front = TTLCache("places", maxsize=front_size, ttl=refresh_s)
+        self.snapshot = None
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS places (
+                key TEXT PRIMARY KEY, label TEXT, address TEXT, place_id TEXT,
+                lat REAL, lng REAL, updated_at REAL)"""
+        )
+        self._db.commit()
+
+    @staticmethod
+    def key(label):
+        return normalize_query(label)
+
+    def get_many(self, labels):
+        """{etiqueta: lugar} para las etiquetas conocidas; los caducados llevan "stale": True."""
+        found, pending = {}, {}
+        for label in labels:
+            k = self.key(label)
+            place = self._front.get(k)
+            if place is not None:
+                found[label] = place
+            else:
+                pending.setdefault(k, []).append(label)
+        if not pending:
+            return found
+
+        keys = list(pending)
+        now = time.time()
+        with self._lock:
+            rows = []
+            for i in range(0, len(keys), 400):
+                chunk = keys[i:i + 400]
+                rows += self._db.execute(
+                    f"SELECT key, label, address, place_id, lat, lng, updated_at FROM places "
+                    f"WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+        known = {r[0] for r in rows}
+        rows += self._from_snapshot([k for k in keys if k not in known])
+        for k, label, address, place_id, lat, lng, updated_at in rows:
+            place = {"label": label, "address": address, "place_id": place_id, "lat": lat, "lng": lng}
+            age = now - updated_at
+            if age >= self.refresh_s:
+                place["stale"] = True
+            else:
+                self._front.set(k, place, ttl=self.refresh_s - age)
+            for original in pending[k]:
+                found[original] = place
+        return found
+
+    def _from_snapshot(self, keys):
+        """Filas de la instantánea para claves que SQLite no tiene (y se copian a SQLite)."""
+        if self.snapshot is None or not keys:
+            return []
+        rows = []
+        for k in keys:
+            hit = self.snapshot.get(k)
+            if hit is not None:
+                rows.append((k, *hit[0]))
+        if rows:
+            with self._lock:
+                self._db.executemany("INSERT OR IGNORE INTO places VALUES (?,?,?,?,?,?,?)", rows)
+                self._db.commit()
+        return rows
+
+    def get(self, label):
+        return self.get_many([label]).get(label)
+
+    def attach_snapshot(self, section):
+        self.snapshot = section
+
+    def export(self):
+        """Todos los lugares como (clave, fila, None) para las instantáneas (ver snapshot.py)."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, label, address, place_id, lat, lng, updated_at FROM places"
+            ).fetchall()
+        return [(r[0], list(r[1:]), None) for r in rows]
+
+    def put_many(self, places):
+        """Guarda lugares resueltos ({etiqueta: lugar})."""
+        now = time.time()
+        rows = []
+        for label, p in places.items():
+            k = self.key(label)
+            place = {"label": label, "address": p["address"], "place_id": p.get("place_id"),
+                     "lat": p.get("lat"), "lng": p.get("lng")}
+            self._front.set(k, place)
+            rows.append((k, label, place["address"], place["place_id"], place["lat"], place["lng"], now))
+        if rows:
+            with self._lock:
+                self._db.executemany("INSERT OR REPLACE INTO places VALUES (?,?,?,?,?,?,?)", rows)
+                self._db.commit()
+
+    def put(self, label, place):
+        self.put_many({label: place})
+
+    def stats(self):
+        with self._lock:
+            (count,) = self._db.execute("SELECT COUNT(*) FROM places").fetchone()
+        data = self._front.stats()
+        data["stored"] = count
+        return data
@@ -0,0 +1,319 @@
+# providers.py
+"""Proveedores de autocompletado (Google Places, SerpAPI, Nominatim) consultados en paralelo.
+
+Cada proveedor tiene un presupuesto de latencia y un cortacircuitos: si falla
+varias veces seguidas deja de llamarse durante un tiempo. `MultiProviderSuggester`
+lanza el proveedor principal, "cubre" con los secundarios si tarda o falla
+(hedged requests) y devuelve en cuanto hay una respuesta buena, uniendo lo que
+haya llegado dentro de una pequeña ventana.
+
+Las URL base son configurables, así que los backends HTTP se pueden probar
+contra servidores locales falsos (ver benchmarks/bench_providers.py).
+"""
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import metrics
+from cache import normalize_query
+from rate_limit import Throttled
+from transport import Transport
+
+log = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """Cortacircuitos clásico: cerrado -> abierto tras N fallos -> semiabierto tras `reset_s`."""
+
+    def __init__(self, failure_threshold=3, reset_s=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_s = reset_s
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_s:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        """¿Se puede llamar al proveedor? En semiabierto deja pasar una prueba."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_s:
+                # Una sola llamada de prueba; si falla, vuelve a abrirse.
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class Attempt:
+    """Una llamada a un proveedor: cuenta una sola vez en su cortacircuitos.
+
+    Quien espera la respuesta puede anotar el fallo en cuanto se pasa del
+    presupuesto (`settle(False)`); la respuesta tardía ya no cuenta.
+    """
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.started = time.monotonic()
+        self._settled = False
+        self._lock = threading.Lock()
+
+    def overrun(self):
+        return time.monotonic() - self.started > self.provider.budget_s
+
+    def settle(self, ok):
+        with self._lock:
+            if self._settled:
+                return False
+            self._settled = True
+        if ok:
+            self.provider.breaker.record_success()
+        else:
+            self.provider.breaker.record_failure()
+        return True
+
+
+class Provider:
+    """Proveedor de sugerencias. Las subclases implementan `fetch`."""
+
+    name = "base"
+
+    def __init__(self, budget_s=1.0, hedge_after_s=0.0, breaker=None):
+        self.budget_s = budget_s
+        self.hedge_after_s = hedge_after_s
+        self.breaker = breaker or CircuitBreaker()
+        self.calls = 0
+        self.errors = 0
+
+    def fetch(self, query, bias=None, session_token=None, limit=5):
+        raise NotImplementedError
+
+    def call(self, query, bias=None, session_token=None, limit=5, attempt=None):
+        """Llama a `fetch` y actualiza el cortacircuitos (lento cuenta como fallo)."""
+        self.calls += 1
+        attempt = attempt or Attempt(self)
+        try:
+            with metrics.span(f"provider.{self.name}"):
+                results = self.fetch(query, bias=bias, session_token=session_token, limit=limit)
+        except Throttled:
+            # Falta de cuota propia: no es culpa del proveedor, no abre el circuito.
+            raise
+        except Exception as e:
+            self.errors += 1
+            attempt.settle(False)
+            log.warning("[%s] Error: %s", self.name, e)
+            raise
+        attempt.settle(not attempt.overrun())
+        return results
+
+    def stats(self):
+        return {"calls": self.calls, "errors": self.errors, "breaker": self.breaker.state}
+
+
+class GoogleProvider(Provider):
+    """Google Places Autocomplete a través de un `googlemaps.Client`.
+
+    El cliente debería tener un plazo de lectura del orden de `budget_s` para
+    que una llamada colgada falle a tiempo y no acapare hilos del suggester.
+    """
+
+    name = "google"
+
+    def __init__(self, client, **kwargs):
+        super().__init__(**kwargs)
+        self.client = client
+
+    def fetch(self, query, bias=None, session_token=None, limit=5):
+        kwargs = {}
+        if session_token:
+            kwargs["session_token"] = session_token
+        if bias:
+            kwargs["location"] = (bias["lat"], bias["lng"])
+            kwargs["radius"] = bias["radius_m"]
+        results = self.client.places_autocomplete(input_text=query, **kwargs)
+        return [
+            {"description": r["description"], "place_id": r.get("place_id"), "source": self.name}
+            for r in results[:limit]
+        ]
+
+
+class SerpApiProvider(Provider):
+    """Autocompletado de Google Maps vía SerpAPI (`engine=google_maps_autocomplete`)."""
+
+    name = "serpapi"
+
+    def __init__(self, api_key, base_url="https://serpapi.com", session=None, **kwargs):
+        super().__init__(**kwargs)
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.session = session or Transport()
+
+    def fetch(self, query, bias=None, session_token=None, limit=5):
+        params = {"engine": "google_maps_autocomplete", "q": query, "api_key": self.api_key}
+        if bias:
+            params["ll"] = f"@{bias['lat']},{bias['lng']},12z"
+        resp = self.session.get(f"{self.base_url}/search.json", params=params, timeout=self.budget_s)
+        resp.raise_for_status()
+        out = []
+        for s in resp.json().get("suggestions", [])[:limit]:
+            item = {"description": s.get("value", ""), "place_id": None, "source": self.name}
+            if s.get("latitude") is not None and s.get("longitude") is not None:
+                item["location"] = {"lat": float(s["latitude"]), "lng": float(s["longitude"])}
+            if item["description"]:
+                out.append(item)
+        return out
+
+
+class NominatimProvider(Provider):
+    """Búsqueda en Nominatim (OSM). Usar una instancia propia: la pública no admite autocompletado."""
+
+    name = "nominatim"
+
+    def __init__(self, base_url, user_agent="planificador-rutas", session=None, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url.rstrip("/")
+        self.user_agent = user_agent
+        self.session = session or Transport()
+
+    def fetch(self, query, bias=None, session_token=None, limit=5):
+        params = {"q": query, "format": "jsonv2", "limit": limit}
+        if bias:
+            d = bias["radius_m"] / 111_000
+            params["viewbox"] = f"{bias['lng'] - d},{bias['lat'] + d},{bias['lng'] + d},{bias['lat'] - d}"
+        resp = self.session.get(
+            f"{self.base_url}/search", params=params, timeout=self.budget_s,
+            headers={"User-Agent": self.user_agent},
+        )
+        resp.raise_for_status()
+        return [
+            {
+                "description": r["display_name"],
+                "place_id": None,
+                "location": {"lat": float(r["lat"]), "lng": float(r["lon"])},
+                "source": self.name,
+            }
+            for r in resp.json()[:limit]
+        ]
+
+
+def merge_results(lists, limit=5):
+    """Une listas de sugerencias (en orden de prioridad) sin duplicados."""
+    seen = set()
+    merged = []
+    for results in lists:
+        for r in results:
+            norm = normalize_query(r["description"])
+            if norm in seen:
+                continue
+            seen.add(norm)
+            merged.append(r)
+            if len(merged) >= limit:
+                return merged
+    return merged
+
+
+class MultiProviderSuggester:
+    """Consulta varios proveedores con semántica "la primera respuesta buena gana"."""
+
+    def __init__(self, providers, merge_window_s=0.05, max_workers=16):
+        self.providers = list(providers)
+        self.merge_window_s = merge_window_s
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="suggest")
+
+    def suggest(self, query, bias=None, session_token=None, limit=5):
+        """Sugerencias unidas de los proveedores sanos que respondan a tiempo."""
+        return self.suggest_with_status(query, bias=bias, session_token=session_token, limit=limit)[0]
+
+    def suggest_with_status(self, query, bias=None, session_token=None, limit=5):
+        """(sugerencias, completa): `completa` si todos los proveedores consultados
+        respondieron con menos de `limit` resultados, es decir, no hay más que esos.
+        """
+        metrics.incr("suggest.requests")
+        start = time.monotonic()
+        candidates = [p for p in self.providers if p.breaker.state != "open"]
+        if not candidates:
+            return [], False
+        deadline = start + max(p.hedge_after_s + p.budget_s for p in candidates)
+        pending = sorted(candidates, key=lambda p: p.hedge_after_s)
+        running = {}
+        attempts = {}
+        results = {}
+        # Se sabe que no hay más resultados mientras ninguno falle ni llene su límite.
+        complete = False
+        exhausted = True
+
+        def launch_due(force=False):
+            now = time.monotonic() - start
+            while pending and (force or pending[0].hedge_after_s <= now):
+                p = pending.pop(0)
+                if not p.breaker.allow():
+                    continue
+                # Con el contexto de quien llama (p. ej. el carril de `rate_limit.lane`).
+                ctx = contextvars.copy_context()
+                attempt = Attempt(p)
+                fut = self._executor.submit(ctx.run, p.call, query, bias, session_token, limit, attempt)
+                running[fut] = p
+                attempts[fut] = attempt
+                force = False
+
+        launch_due()
+        if not running:
+            launch_due(force=True)
+
+        while running:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            timeout = deadline - now
+            if pending and not results:
+                timeout = min(timeout, max(0.0, start + pending[0].hedge_after_s - now))
+            done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+            for fut in done:
+                p = running.pop(fut)
+                try:
+                    res = fut.result()
+                except Exception:
+                    res = None
+                    exhausted = False
+                else:
+                    complete = True
+                    exhausted = exhausted and len(res) < limit
+                if res:
+                    results[p.name] = res
+                    # Primera respuesta buena: esperar solo una ventana corta al resto.
+                    deadline = min(deadline, time.monotonic() + self.merge_window_s)
+                    pending.clear()
+            if not results:
+                # Nadie ha respondido bien todavía: cubrir con el siguiente proveedor.
+                launch_due(force=bool(done) and not running)
+
+        # Las respuestas tardías se ignoran; sus hilos terminan por su cuenta (con
+        # su propio plazo de red). Pasarse del presupuesto cuenta ya como fallo.
+        for fut, p in running.items():
+            if attempts[fut].overrun() and attempts[fut].settle(False):
+                metrics.incr(f"provider.{p.name}.overrun")
+        ordered = [results[p.name] for p in self.providers if p.name in results]
+        return merge_results(ordered, limit=limit), complete and exhausted and not running
+
+    def stats(self):
+        return {p.name: p.stats() for p in self.providers}
@@ -0,0 +1,68 @@
+# qr_engine.py
+"""Renderizado de QR con caché LRU compartida entre sesiones.
+
+Cada URL se codifica y rasteriza una sola vez por combinación de formato,
+nivel de corrección de errores y tamaño de módulo; los reruns y el expander de
+"última ruta" reciben los mismos bytes desde la caché.
+"""
+import io
+
+import qrcode
+from qrcode.constants import ERROR_CORRECT_H, ERROR_CORRECT_L, ERROR_CORRECT_M, ERROR_CORRECT_Q
+from qrcode.image.svg import SvgPathImage
+
+import metrics
+from cache import TTLCache
+
+ERROR_LEVELS = {
+    "L": ERROR_CORRECT_L,
+    "M": ERROR_CORRECT_M,
+    "Q": ERROR_CORRECT_Q,
+    "H": ERROR_CORRECT_H,
+}
+
+# Con "auto" se usa M mientras el QR no pase de esta versión; si no, L (menos módulos).
+AUTO_MAX_VERSION_M = 10
+
+QR_CACHE = TTLCache("qr", maxsize=512)
+
+
+def _build(url, error, box_size, border):
+    qr = qrcode.QRCode(version=None, error_correction=ERROR_LEVELS[error],
+                       box_size=box_size, border=border)
+    qr.add_data(url)
+    qr.make(fit=True)  # versión mínima para el nivel elegido
+    return qr
+
+
+def pick_error_level(url):
+    """M para URL cortas; L para las largas, para que el QR quede lo más pequeño posible."""
+    qr = _build(url, "M", 1, 0)
+    return "M" if qr.version <= AUTO_MAX_VERSION_M else "L"
+
+
+def render_qr(url, fmt="png", error="auto", box_size=8, border=2):
+    """Bytes del QR de `url` en PNG o SVG (desde la caché si ya se generó)."""
+    if not url:
+        return None
+    key = (url, fmt, error, box_size, border)
+    data = QR_CACHE.get(key)
+    if data is not None:
+        return data
+
+    with metrics.span("qr.render"):
+        if error == "auto":
+            qr = _build(url, "M", box_size, border)
+            if qr.version > AUTO_MAX_VERSION_M:
+                qr = _build(url, "L", box_size, border)
+        else:
+            qr = _build(url, error.upper(), box_size, border)
+        buf = io.BytesIO()
+        if fmt == "svg":
+            qr.make_image(image_factory=SvgPathImage).save(buf)
+        else:
+            qr.make_image().save(buf, format="PNG")
+        data = buf.getvalue()
+    QR_CACHE.set(key, data)
+    return data
+
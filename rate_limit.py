@@ -0,0 +1,199 @@
+# rate_limit.py
+"""Limitador de ritmo y contable de cuota para el `googlemaps.Client` compartido.
+
+Un cubo de fichas por endpoint (QPS + ráfaga) y un presupuesto diario. Hay dos
+carriles de prioridad: "route" (generar la ruta final: espera un poco por una
+ficha) y "typeahead" (autocompletado mientras se escribe: nunca espera y no
+puede gastar la reserva que se guarda para "route"). Cuando no hay ficha se
+lanza `Throttled` y quien llama degrada a caché o a resultados locales, en vez
+de acumular reintentos.
+
+Las llamadas idénticas que coinciden en el tiempo (mismo método, argumentos,
+session token de Places y carril) se unen en una sola: solo esa gasta cuota y
+todas reciben la misma respuesta. El carril va en la clave para que un
+`Throttled` del carril "typeahead" no le llegue a una llamada de "route", y el
+session token para que cada sesión de Places reciba sus propias pulsaciones.
+"""
+import contextlib
+import contextvars
+import datetime
+import threading
+import time
+
+import metrics
+from transport import SingleFlight, freeze
+
+ROUTE = "route"
+TYPEAHEAD = "typeahead"
+
+# Carril por defecto de cada método del cliente.
+ENDPOINTS = {
+    "places_autocomplete": ("autocomplete", TYPEAHEAD),
+    "places_autocomplete_query": ("autocomplete", TYPEAHEAD),
+    "geocode": ("geocode", ROUTE),
+    "reverse_geocode": ("geocode", ROUTE),
+    "place": ("place", ROUTE),
+    "directions": ("directions", ROUTE),
+    "distance_matrix": ("distance_matrix", ROUTE),
+}
+
+# qps, ráfaga, llamadas diarias y fracción reservada al carril "route".
+DEFAULT_BUDGETS = {
+    "autocomplete": {"qps": 20, "burst": 40, "daily": 20000, "reserve": 0.0},
+    "geocode": {"qps": 10, "burst": 20, "daily": 5000, "reserve": 0.2},
+    "place": {"qps": 10, "burst": 20, "daily": 5000, "reserve": 0.2},
+    "directions": {"qps": 10, "burst": 10, "daily": 3000, "reserve": 0.2},
+    "distance_matrix": {"qps": 5, "burst": 10, "daily": 2000, "reserve": 0.2},
+}
+
+_lane = contextvars.ContextVar("rate_limit_lane", default=None)
+
+
+class Throttled(Exception):
+    """No hay cuota disponible ahora mismo para esta llamada."""
+
+
+@contextlib.contextmanager
+def lane(name):
+    """Fuerza el carril de prioridad de las llamadas hechas dentro del bloque."""
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+class TokenBucket:
+    """Cubo de fichas: `rate` fichas por segundo hasta `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, reserve=0.0):
+        """Toma una ficha si quedan más de `reserve`. Devuelve la espera necesaria (0 = hecho)."""
+        with self._lock:
+            self._refill()
+            if self.tokens - reserve >= 1.0:
+                self.tokens -= 1.0
+                return 0.0
+            return (1.0 + reserve - self.tokens) / self.rate
+
+
+class QuotaAccountant:
+    """Cubos y contadores diarios por endpoint, compartidos por todas las sesiones."""
+
+    def __init__(self, budgets=None, max_wait_s=2.0):
+        budgets = budgets or {}
+        self.budgets = {
+            name: {**DEFAULT_BUDGETS.get(name, {"qps": 10, "burst": 10, "daily": 1000, "reserve": 0.0}),
+                   **budgets.get(name, {})}
+            for name in {*DEFAULT_BUDGETS, *budgets}
+        }
+        self.max_wait_s = max_wait_s
+        self._buckets = {
+            name: TokenBucket(b["qps"], b["burst"]) for name, b in self.budgets.items()
+        }
+        self._lock = threading.Lock()
+        self._day = datetime.date.today()
+        self._used = {}
+        self._throttled = {}
+
+    def _roll_day(self):
+        today = datetime.date.today()
+        if today != self._day:
+            self._day = today
+            self._used.clear()
+            self._throttled.clear()
+
+    def _reject(self, endpoint, why):
+        with self._lock:
+            self._throttled[endpoint] = self._throttled.get(endpoint, 0) + 1
+        raise Throttled(f"{endpoint}: {why}")
+
+    def acquire(self, endpoint, priority=ROUTE):
+        """Reserva una llamada a `endpoint` o lanza `Throttled`."""
+        budget = self.budgets.get(endpoint)
+        if budget is None:
+            return
+        high = priority == ROUTE
+        daily_cap = budget["daily"] if high else budget["daily"] * (1 - budget["reserve"])
+        with self._lock:
+            self._roll_day()
+            if self._used.get(endpoint, 0) >= daily_cap:
+                over = True
+            else:
+                over = False
+                self._used[endpoint] = self._used.get(endpoint, 0) + 1
+        if over:
+            self._reject(endpoint, "presupuesto diario agotado")
+
+        bucket = self._buckets[endpoint]
+        reserve = 0.0 if high else budget["burst"] * budget["reserve"]
+        deadline = time.monotonic() + (self.max_wait_s if high else 0.0)
+        while True:
+            wait = bucket.try_acquire(reserve)
+            if wait == 0.0:
+                return
+            if time.monotonic() + wait > deadline:
+                with self._lock:
+                    self._used[endpoint] -= 1
+                self._reject(endpoint, "límite de QPS")
+            time.sleep(wait)
+
+    def usage(self):
+        """Llamadas, presupuesto (y fracción reservada a "route") y rechazos de hoy por endpoint."""
+        with self._lock:
+            self._roll_day()
+            return {
+                name: {
+                    "used": self._used.get(name, 0),
+                    "daily": b["daily"],
+                    "remaining": max(b["daily"] - self._used.get(name, 0), 0),
+                    "reserve": b["reserve"],
+                    "throttled": self._throttled.get(name, 0),
+                    "tokens": round(self._buckets[name].tokens, 1),
+                }
+                for name, b in self.budgets.items()
+            }
+
+
+class RateLimitedClient:
+    """Envuelve un `googlemaps.Client`: cada llamada pasa antes por el contable de cuota."""
+
+    def __init__(self, client, accountant, coalesce=True):
+        self._client = client
+        self.accountant = accountant
+        self._flight = SingleFlight("google") if coalesce else None
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name not in ENDPOINTS or not callable(attr):
+            return attr
+        endpoint, default_lane = ENDPOINTS[name]
+
+        def call(*args, **kwargs):
+            priority = _lane.get() or default_lane
+
+            def run():
+                try:
+                    self.accountant.acquire(endpoint, priority)
+                except Throttled:
+                    metrics.incr(f"google.{endpoint}.throttled")
+                    raise
+                with metrics.span(f"google.{endpoint}"):
+                    return attr(*args, **kwargs)
+
+            if self._flight is None:
+                return run()
+            return self._flight.do((name, priority, freeze(args), freeze(kwargs)), run)
+
+        return call
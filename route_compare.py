@@ -0,0 +1,137 @@
+# route_compare.py
+"""Comparación de preferencias de ruta (más rápida, más corta, sin autopistas…) en paralelo.
+
+Cada preferencia se traduce a una petición de Directions (`avoid`,
+`alternatives`) y una regla para elegir entre las alternativas. Las
+preferencias que comparten petición (p. ej. "más rápido" y "más corto", que
+solo difieren en cómo se elige) se piden una sola vez; las respuestas van a
+una caché compartida entre sesiones y una petición idéntica en vuelo desde
+otra sesión se espera en vez de repetirse. Así comparar las cinco
+preferencias cuesta lo que la petición más lenta, no cinco.
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import metrics
+from cache import TTLCache
+
+# id -> (avoid, criterio de elección entre alternativas)
+PREFERENCES = {
+    "fastest": ((), "duration"),
+    "shortest": ((), "distance"),
+    "no_highways": (("highways",), "duration"),
+    "no_tolls": (("tolls",), "duration"),
+    "economic": (("tolls",), "distance"),
+    "scenic": (("highways", "tolls"), "duration"),
+}
+
+# Etiquetas de la interfaz (i18n `route_types` y el selector de Profesional).
+LABELS = {
+    "Más rápido": "fastest", "Fastest": "fastest",
+    "Más corto": "shortest", "Corta": "shortest", "Shortest": "shortest",
+    "Evitar autopistas": "no_highways", "Avoid highways": "no_highways",
+    "Evitar peajes": "no_tolls", "Avoid tolls": "no_tolls",
+    "Económica": "economic",
+    "Ruta panorámica": "scenic", "Scenic route": "scenic",
+}
+
+
+def preference_id(label):
+    return LABELS.get(label, label if label in PREFERENCES else "fastest")
+
+
+def avoid_param(label):
+    """Valor de `avoid` para la URL de Google Maps de una preferencia (o None)."""
+    avoid = PREFERENCES[preference_id(label)][0]
+    return ",".join(avoid) or None
+
+
+def _loc(p):
+    if isinstance(p, dict):
+        if p.get("place_id"):
+            return f"place_id:{p['place_id']}"
+        if p.get("lat") is not None and p.get("lng") is not None:
+            return f"{float(p['lat']):.6f},{float(p['lng']):.6f}"
+        return p.get("address", "")
+    return str(p)
+
+
+def _totals(route):
+    legs = route.get("legs", [])
+    duration = sum((l.get("duration_in_traffic") or l["duration"])["value"] for l in legs)
+    distance = sum(l["distance"]["value"] for l in legs)
+    return duration, distance
+
+
+class RouteComparator:
+    """Directions para varias preferencias a la vez, con caché y peticiones en vuelo compartidas."""
+
+    def __init__(self, client, ttl=3600, max_workers=6):
+        self.client = client
+        self._cache = TTLCache("directions", maxsize=2000, ttl=ttl)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="directions")
+        self._lock = threading.RLock()  # el callback puede correr dentro del propio lock
+        self._in_flight = {}
+        self.requests = 0
+
+    def _request(self, key):
+        origin, destination, waypoints, mode, avoid = key
+        kwargs = {"mode": mode, "alternatives": True}
+        if waypoints:
+            kwargs["waypoints"] = list(waypoints)
+        if avoid:
+            kwargs["avoid"] = "|".join(avoid)
+        with metrics.span("directions.compare"):
+            routes = self.client.directions(origin, destination, **kwargs)
+        self.requests += 1
+        self._cache.set(key, routes)
+        return routes
+
+    def _routes(self, key):
+        """Future con las rutas de `key` (desde la caché, en vuelo o nueva)."""
+        cached = self._cache.get(key)
+        if cached is not None:
+            fut = Future()
+            fut.set_result(cached)
+            return fut
+        with self._lock:
+            fut = self._in_flight.get(key)
+            if fut is None:
+                fut = self._in_flight[key] = self._executor.submit(self._request, key)
+                fut.add_done_callback(lambda _f, k=key: self._drop(k))
+        return fut
+
+    def _drop(self, key):
+        with self._lock:
+            self._in_flight.pop(key, None)
+
+    def compare(self, origin, destination, waypoints=None, mode="driving", preferences=None):
+        """[{preference, duration_s, distance_m, summary, polyline, same_as}] por preferencia."""
+        preferences = list(preferences or PREFERENCES)
+        base = (_loc(origin), _loc(destination), tuple(_loc(w) for w in waypoints or ()), mode)
+        keys = {p: base + (PREFERENCES[p][0],) for p in preferences}
+        futures = {key: self._routes(key) for key in set(keys.values())}
+
+        out, seen = [], {}
+        for pref in preferences:
+            criterion = PREFERENCES[pref][1]
+            row = {"preference": pref, "duration_s": None, "distance_m": None,
+                   "summary": "", "polyline": None, "same_as": None}
+            try:
+                routes = futures[keys[pref]].result()
+            except Exception as e:
+                metrics.incr("directions.compare.errors")
+                row["error"] = str(e)
+                out.append(row)
+                continue
+            if routes:
+                best = min(routes, key=lambda r: _totals(r)[0 if criterion == "duration" else 1])
+                row["duration_s"], row["distance_m"] = _totals(best)
+                row["summary"] = best.get("summary", "")
+                row["polyline"] = (best.get("overview_polyline") or {}).get("points")
+                # La misma ruta para dos preferencias se indica en vez de repetirla.
+                sig = (row["polyline"], row["duration_s"], row["distance_m"])
+                row["same_as"] = seen.get(sig)
+                seen.setdefault(sig, pref)
+            out.append(row)
+        return out
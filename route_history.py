@@ -0,0 +1,105 @@
+# route_history.py
+"""Historial de rutas por sesión, acotado en número y en bytes.
+
+Cada ruta se guarda como un registro compacto (`__slots__`, tuplas y floats)
+con las paradas ya resueltas, el modo, los enlaces generados y los bytes del
+QR (la misma referencia que guarda la caché de QR, no una copia). Repetir una
+ruta anterior no hace llamadas de red ni vuelve a renderizar nada.
+"""
+import sys
+import time
+from collections import deque
+
+# Sobrecoste aproximado de un registro y de cada parada (objetos, tuplas, floats).
+_RECORD_OVERHEAD = 400
+_STOP_OVERHEAD = 180
+
+
+class RouteRecord:
+    """Una ruta generada: paradas resueltas, modo, enlaces y QR."""
+
+    __slots__ = ("ts", "tab", "mode", "stops", "gmaps_url", "waze_url", "apple_url", "qr", "nbytes")
+
+    def __init__(self, tab, stops, gmaps_url, waze_url=None, apple_url=None, mode="driving", qr=None):
+        self.ts = time.time()
+        self.tab = sys.intern(tab)
+        self.mode = sys.intern(mode or "driving")
+        self.stops = tuple(_compact_stop(p) for p in stops)
+        self.gmaps_url = gmaps_url
+        self.waze_url = waze_url
+        self.apple_url = apple_url
+        self.qr = qr
+        self.nbytes = (
+            _RECORD_OVERHEAD
+            + sum(_STOP_OVERHEAD + len(s[0]) for s in self.stops)
+            + sum(len(u) for u in (gmaps_url, waze_url, apple_url) if u)
+            + (len(qr) if qr else 0)
+        )
+
+    @property
+    def title(self):
+        """Texto corto para listarla: "Origen → Destino (+N)"."""
+        if not self.stops:
+            return self.gmaps_url or ""
+        extra = len(self.stops) - 2
+        head = f"{self.stops[0][0]} → {self.stops[-1][0]}"
+        return f"{head} (+{extra})" if extra > 0 else head
+
+
+def _compact_stop(p):
+    """(dirección, lat, lng) a partir de un dict resuelto o de un texto."""
+    if isinstance(p, dict):
+        lat, lng = p.get("lat"), p.get("lng")
+        return (p.get("address") or p.get("label") or "",
+                None if lat is None else float(lat), None if lng is None else float(lng))
+    return (str(p), None, None)
+
+
+class RouteHistory:
+    """Últimas rutas de una sesión, más recientes primero, con tope de registros y de bytes."""
+
+    __slots__ = ("max_items", "max_bytes", "_items", "_bytes")
+
+    def __init__(self, max_items=20, max_bytes=256 * 1024):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._items = deque()
+        self._bytes = 0
+
+    def add(self, record):
+        """Añade una ruta (si ya estaba la misma URL, la sube al principio) y recorta."""
+        for old in self._items:
+            if old.gmaps_url == record.gmaps_url and old.tab == record.tab:
+                self._items.remove(old)
+                self._bytes -= old.nbytes
+                break
+        if record.nbytes > self.max_bytes and record.qr:
+            # Un registro enorme no debe vaciar el historial: se guarda sin QR.
+            record.nbytes -= len(record.qr)
+            record.qr = None
+        self._items.appendleft(record)
+        self._bytes += record.nbytes
+        while self._items and (len(self._items) > self.max_items or self._bytes > self.max_bytes):
+            self._bytes -= self._items.pop().nbytes
+        return record
+
+    def records(self, tab=None):
+        return [r for r in self._items if tab is None or r.tab == tab]
+
+    def latest(self, tab=None):
+        for r in self._items:
+            if tab is None or r.tab == tab:
+                return r
+        return None
+
+    def clear(self):
+        self._items.clear()
+        self._bytes = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
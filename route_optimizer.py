@@ -0,0 +1,126 @@
+# route_optimizer.py
+"""Ordenación local de paradas (TSP con origen y destino fijos).
+
+Matriz de distancias haversine vectorizada con NumPy, construcción por vecino
+más cercano y mejora con 2-opt y Or-opt. Las mejoras evalúan todos los
+movimientos de una posición de golpe con arrays, así que unos cientos de
+paradas se ordenan en bastante menos de un segundo.
+"""
+import time
+
+import numpy as np
+
+EARTH_RADIUS_M = 6_371_008.8
+
+
+def haversine_matrix(coords):
+    """Matriz N×N de distancias en metros entre pares (lat, lng)."""
+    pts = np.radians(np.asarray(coords, dtype=float).reshape(-1, 2))
+    lat, lng = pts[:, 0], pts[:, 1]
+    dlat = lat[:, None] - lat[None, :]
+    dlng = lng[:, None] - lng[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def path_cost(matrix, order):
+    order = np.asarray(order)
+    return float(matrix[order[:-1], order[1:]].sum())
+
+
+def nearest_neighbour(matrix, start=0, end=None):
+    """Recorrido inicial: siempre a la parada no visitada más cercana."""
+    n = len(matrix)
+    end = n - 1 if end is None else end
+    visited = np.zeros(n, dtype=bool)
+    visited[[start, end]] = True
+    order = [start]
+    cur = start
+    for _ in range(n - 2):
+        row = np.where(visited, np.inf, matrix[cur])
+        cur = int(np.argmin(row))
+        visited[cur] = True
+        order.append(cur)
+    if end != start:
+        order.append(end)
+    return np.array(order)
+
+
+def _two_opt_pass(matrix, order):
+    """Una pasada de 2-opt (admite matrices asimétricas). Devuelve True si mejoró."""
+    n = len(order)
+    improved = False
+    fwd = matrix[order[:-1], order[1:]]
+    bwd = matrix[order[1:], order[:-1]]
+    cf = np.concatenate(([0.0], np.cumsum(fwd)))
+    cb = np.concatenate(([0.0], np.cumsum(bwd)))
+    for i in range(1, n - 2):
+        a, b = order[i - 1], order[i]
+        j = np.arange(i + 1, n - 1)
+        c, e = order[j], order[j + 1]
+        # Invertir order[i..j]: cambian los dos extremos y el sentido del tramo interior.
+        delta = (matrix[a, c] + matrix[b, e] - matrix[a, b] - matrix[c, e]
+                 + (cb[j] - cb[i]) - (cf[j] - cf[i]))
+        k = int(np.argmin(delta))
+        if delta[k] < -1e-9:
+            jj = j[k]
+            order[i:jj + 1] = order[i:jj + 1][::-1].copy()
+            improved = True
+            fwd = matrix[order[:-1], order[1:]]
+            bwd = matrix[order[1:], order[:-1]]
+            cf = np.concatenate(([0.0], np.cumsum(fwd)))
+            cb = np.concatenate(([0.0], np.cumsum(bwd)))
+    return improved
+
+
+def _or_opt_pass(matrix, order, seg_lens=(1, 2, 3)):
+    """Una pasada de Or-opt: mover tramos de 1-3 paradas a su mejor hueco."""
+    improved = False
+    for length in seg_lens:
+        i = 1
+        while i + length <= len(order) - 1:
+            seg = order[i:i + length]
+            prev, nxt = order[i - 1], order[i + length]
+            s0, s1 = seg[0], seg[-1]
+            gain = matrix[prev, s0] + matrix[s1, nxt] - matrix[prev, nxt]
+            rest = np.concatenate((order[:i], order[i + length:]))
+            cost = matrix[rest[:-1], s0] + matrix[s1, rest[1:]] - matrix[rest[:-1], rest[1:]]
+            cost[i - 1] = np.inf  # hueco original
+            p = int(np.argmin(cost))
+            if cost[p] - gain < -1e-9:
+                order[:] = np.concatenate((rest[:p + 1], seg, rest[p + 1:]))
+                improved = True
+            i += 1
+    return improved
+
+
+def solve(matrix, start=0, end=None, time_budget_s=0.8, max_rounds=50):
+    """Orden de visita de todos los nodos empezando en `start` y terminando en `end`."""
+    matrix = np.asarray(matrix, dtype=float)
+    n = len(matrix)
+    end = n - 1 if end is None else end
+    if n <= 3:
+        middle = [k for k in range(n) if k not in (start, end)]
+        return [start] + middle + ([end] if end != start else [])
+
+    order = nearest_neighbour(matrix, start, end)
+    deadline = time.monotonic() + time_budget_s
+    for _ in range(max_rounds):
+        improved = _two_opt_pass(matrix, order)
+        improved = _or_opt_pass(matrix, order) or improved
+        if not improved or time.monotonic() > deadline:
+            break
+    return [int(k) for k in order]
+
+
+def optimize_stops(origin, destination, stops, matrix=None, time_budget_s=0.8):
+    """Índices de `stops` en el orden óptimo entre `origin` y `destination` (todos (lat, lng)).
+
+    Si se pasa `matrix`, debe ser (N+2)×(N+2) en el orden [origen, paradas..., destino].
+    """
+    if len(stops) < 2:
+        return list(range(len(stops)))
+    if matrix is None:
+        matrix = haversine_matrix([origin, *stops, destination])
+    order = solve(matrix, start=0, end=len(stops) + 1, time_budget_s=time_budget_s)
+    return [k - 1 for k in order[1:-1]]
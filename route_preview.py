@@ -0,0 +1,207 @@
+# route_preview.py
+"""Vista previa de la ruta en un mapa, con geometría simplificada y tamaño acotado.
+
+La geometría sale de una polilínea codificada de Google (si la hay) o de unir
+las paradas resueltas. Se simplifica con Douglas–Peucker (vectorizado con
+NumPy por tramo) con una tolerancia de ~1,5 píxeles al zoom con el que se va
+a ver, y si aun así pasa de `max_points` se sube la tolerancia. El resultado
+se cachea por ruta y zoom, así que un rerun no vuelve a calcular nada ni a
+enviar megas de coordenadas al navegador.
+"""
+import hashlib
+import json
+import math
+import time
+
+import numpy as np
+
+import metrics
+from cache import TTLCache
+from route_optimizer import EARTH_RADIUS_M
+
+PREVIEW_CACHE = TTLCache("route_preview", maxsize=256)
+
+# Metros por píxel en el ecuador a zoom 0 (teselas de 256 px).
+_M_PER_PX_Z0 = 156543.03392
+
+
+def decode_polyline(encoded):
+    """Polilínea codificada de Google -> array (N, 2) de (lat, lng), sin bucles por carácter."""
+    if not encoded:
+        return np.empty((0, 2))
+    b = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    ends = (b & 0x20) == 0
+    group = np.concatenate(([0], np.cumsum(ends)[:-1]))
+    starts = np.flatnonzero(np.concatenate(([True], ends[:-1])))
+    shift = 5 * (np.arange(len(b)) - starts[group])
+    raw = np.zeros(int(group[-1]) + 1, dtype=np.int64)
+    np.add.at(raw, group, (b & 0x1F) << shift)
+    values = np.where(raw & 1, ~(raw >> 1), raw >> 1)
+    values = values[: len(values) // 2 * 2].reshape(-1, 2)
+    return np.cumsum(values, axis=0) / 1e5
+
+
+def _project(latlng):
+    """(lat, lng) -> metros en un plano local (equirectangular)."""
+    lat0 = math.radians(float(np.mean(latlng[:, 0])))
+    rad = np.radians(latlng)
+    return np.column_stack((rad[:, 1] * math.cos(lat0), rad[:, 0])) * EARTH_RADIUS_M
+
+
+def douglas_peucker(xy, tolerance):
+    """Índices de los puntos que se conservan (extremos incluidos) con tolerancia en las unidades de `xy`."""
+    n = len(xy)
+    if n < 3:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, n - 1]] = True
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        seg = xy[b] - xy[a]
+        pts = xy[a + 1:b] - xy[a]
+        length = math.hypot(seg[0], seg[1])
+        if length == 0:
+            d = np.hypot(pts[:, 0], pts[:, 1])
+        else:
+            d = np.abs(pts[:, 0] * seg[1] - pts[:, 1] * seg[0]) / length
+        i = int(np.argmax(d))
+        if d[i] > tolerance:
+            k = a + 1 + i
+            keep[k] = True
+            stack.append((a, k))
+            stack.append((k, b))
+    return np.flatnonzero(keep)
+
+
+def fit_zoom(latlng, width_px=700, height_px=450):
+    """Zoom (entero) al que cabe el recuadro de la ruta en el mapa."""
+    lat_min, lng_min = latlng.min(axis=0)
+    lat_max, lng_max = latlng.max(axis=0)
+    xy = _project(np.array([[lat_min, lng_min], [lat_max, lng_max]]))
+    span_x, span_y = np.abs(xy[1] - xy[0]) + 1.0
+    cos_lat = math.cos(math.radians((lat_min + lat_max) / 2))
+    zoom_x = math.log2(_M_PER_PX_Z0 * cos_lat * width_px / span_x)
+    zoom_y = math.log2(_M_PER_PX_Z0 * cos_lat * height_px / span_y)
+    return int(max(1, min(17, math.floor(min(zoom_x, zoom_y)))))
+
+
+def simplify(latlng, zoom, tolerance_px=1.5, max_points=1500):
+    """Geometría simplificada para `zoom`, con como mucho `max_points` puntos."""
+    if len(latlng) <= 2:
+        return latlng
+    xy = _project(latlng)
+    lat = math.radians(float(np.mean(latlng[:, 0])))
+    tolerance = tolerance_px * _M_PER_PX_Z0 * math.cos(lat) / (2 ** zoom)
+    idx = douglas_peucker(xy, tolerance)
+    while len(idx) > max_points:
+        tolerance *= 2
+        idx = douglas_peucker(xy, tolerance)
+    return latlng[idx]
+
+
+def _latlng(p):
+    """(lat, lng) de un punto resuelto (lat/lng o location), o None."""
+    if not isinstance(p, dict):
+        return None
+    loc = p.get("location") or p
+    if loc.get("lat") is None or loc.get("lng") is None:
+        return None
+    return float(loc["lat"]), float(loc["lng"])
+
+
+def _stop_coords(route):
+    pts = [ll for ll in map(_latlng, route.get("stops", [])) if ll is not None]
+    return np.array(pts, dtype=float).reshape(-1, 2)
+
+
+def _geometry(route, stops):
+    """Array (lat, lng) de una ruta: polilínea si la trae, si no las paradas unidas."""
+    if route.get("polyline"):
+        return decode_polyline(route["polyline"])
+    return stops
+
+
+def _key(routes, stops):
+    """Huella de la geometría de entrada (polilínea o paradas) sin decodificar nada."""
+    h = hashlib.blake2b(digest_size=16)
+    for route, pts in zip(routes, stops):
+        h.update(route["polyline"].encode() if route.get("polyline") else pts.tobytes())
+        h.update(b"|")
+    return h.hexdigest()
+
+
+def build_preview(routes, width_px=700, height_px=450, max_points=1500):
+    """Datos del mapa para una o varias rutas ({stops, polyline?}), cacheados por ruta.
+
+    Devuelve {"paths": [[[lng, lat], ...], ...], "stops": [...], "view": {...},
+    "bytes": tamaño JSON, "points": puntos enviados, "raw_points": puntos originales}
+    o None si no hay coordenadas.
+    """
+    stops = [_stop_coords(r) for r in routes]
+    key = (_key(routes, stops), width_px, height_px, max_points)
+    cached = PREVIEW_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    with metrics.span("preview.build"):
+        geoms = [g for g in (_geometry(r, s) for r, s in zip(routes, stops)) if len(g)]
+        if not geoms:
+            return None
+        everything = np.concatenate(geoms)
+        zoom = fit_zoom(everything, width_px, height_px)
+        per_route = max(2, max_points // len(geoms))
+        paths = [np.round(simplify(g, zoom, max_points=per_route)[:, ::-1], 5).tolist() for g in geoms]
+        markers = []
+        for n, r in enumerate(routes):
+            for k, p in enumerate(r.get("stops", [])):
+                ll = _latlng(p)
+                if ll is not None:
+                    markers.append({"position": [round(ll[1], 5), round(ll[0], 5)],
+                                    "route": n, "order": k, "name": p.get("address", "")})
+        center = everything.min(axis=0) / 2 + everything.max(axis=0) / 2
+        preview = {
+            "paths": paths,
+            "stops": markers,
+            "view": {"latitude": float(center[0]), "longitude": float(center[1]), "zoom": zoom},
+            "points": sum(len(p) for p in paths),
+            "raw_points": int(len(everything)),
+        }
+        preview["bytes"] = len(json.dumps({"paths": paths, "stops": markers}, separators=(",", ":")))
+    PREVIEW_CACHE.set(key, preview)
+    return preview
+
+
+# Colores por vehículo/ruta (RGB).
+PALETTE = [(230, 57, 70), (29, 53, 87), (42, 157, 143), (244, 162, 97), (106, 76, 147),
+           (38, 70, 83), (233, 196, 106), (69, 123, 157)]
+
+
+def render_preview(routes, height=450, max_points=1500):
+    """Dibuja el mapa en Streamlit (pydeck). Devuelve la vista previa usada (o None)."""
+    import pydeck as pdk
+    import streamlit as st
+
+    t0 = time.perf_counter()
+    preview = build_preview(routes, height_px=height, max_points=max_points)
+    if preview is None:
+        return None
+    paths = [{"path": p, "color": PALETTE[n % len(PALETTE)]} for n, p in enumerate(preview["paths"])]
+    stops = [{**s, "color": PALETTE[s["route"] % len(PALETTE)]} for s in preview["stops"]]
+    deck = pdk.Deck(
+        layers=[
+            pdk.Layer("PathLayer", paths, get_path="path", get_color="color",
+                      width_min_pixels=3, width_scale=1),
+            pdk.Layer("ScatterplotLayer", stops, get_position="position", get_fill_color="color",
+                      get_radius=40, radius_min_pixels=4, pickable=True),
+        ],
+        initial_view_state=pdk.ViewState(**preview["view"]),
+        map_style=None,
+        tooltip={"text": "{name}"},
+    )
+    st.pydeck_chart(deck, height=height)
+    metrics.observe("preview.render", time.perf_counter() - t0)
+    metrics.incr("preview.bytes", preview["bytes"])
+    return preview
@@ -0,0 +1,354 @@
+# snapshot.py
+"""Instantáneas de las cachés en disco para arrancar en caliente tras un reinicio.
+
+Al despertar la app todas las cachés están vacías y los primeros usuarios
+pagan cada sugerencia, geocodificación y QR. Aquí se vuelcan (al apagar y cada
+`interval_s`) a un fichero versionado, y al arrancar se abre el más reciente
+con mmap: abrirlo solo lee la cabecera, así que el arranque no depende del
+tamaño. Cada caché consulta su sección cuando no encuentra una clave en
+memoria (búsqueda binaria sobre los hashes de las claves) y copia el valor.
+
+Formato: cabecera, tabla de secciones y, por sección, los hashes ordenados,
+desplazamientos, longitudes y caducidades (hora de reloj), seguidos de los
+valores (JSON o bytes, con la clave para descartar colisiones).
+
+    python snapshot.py build populares.txt --out snapshots   # precalentar
+    python snapshot.py info snapshots
+"""
+import atexit
+import bisect
+import glob
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"SNP1"
+FORMAT_VERSION = 1
+# Subir cuando cambie la forma de los valores guardados: los ficheros viejos se ignoran.
+SCHEMA_VERSION = 2
+
+_HEADER = struct.Struct("<4sIIdI")    # magic, formato, esquema, creado (epoch), nº secciones
+_SECTION = struct.Struct("<16sQQI")   # nombre, índice, datos, nº entradas
+
+# Entradas como máximo por sección al fusionar con la instantánea anterior.
+MAX_PER_SECTION = 200_000
+
+
+def key_hash(key):
+    """Hash estable (entre procesos) de una clave de caché: tuplas de str/int/float/None."""
+    return int.from_bytes(hashlib.blake2b(repr(key).encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _encode(value):
+    if isinstance(value, (bytes, bytearray)):
+        return b"B" + bytes(value)
+    return b"J" + json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def _decode(blob):
+    payload = bytes(blob[1:])
+    return payload if blob[0] == ord("B") else json.loads(payload)
+
+
+class SnapshotSection:
+    """Una sección del fichero: búsqueda O(log n) en mmap, sin cargarla en memoria."""
+
+    def __init__(self, view, index_off, data_off, n):
+        self.n = n
+        cols = [index_off + k * 8 * n for k in range(4)]
+        self._hashes = view[cols[0]:cols[0] + 8 * n].cast("Q")
+        self._key_offsets = view[cols[1]:cols[1] + 8 * n].cast("Q")
+        self._value_offsets = view[cols[2]:cols[2] + 8 * n].cast("Q")
+        self._expires = view[cols[3]:cols[3] + 8 * n].cast("d")
+        lens = index_off + 32 * n
+        self._key_lengths = view[lens:lens + 4 * n].cast("I")
+        self._value_lengths = view[lens + 4 * n:lens + 8 * n].cast("I")
+        self._data = view[data_off:]
+
+    def _key(self, i):
+        off = self._key_offsets[i]
+        return bytes(self._data[off:off + self._key_lengths[i]])
+
+    def _value(self, i):
+        off = self._value_offsets[i]
+        return self._data[off:off + self._value_lengths[i]]
+
+    def get(self, key):
+        """(valor, segundos restantes o None) de `key`, o None si no está o ya caducó."""
+        h = key_hash(key)
+        want = repr(key).encode("utf-8")
+        i = bisect.bisect_left(self._hashes, h)
+        while i < self.n and self._hashes[i] == h:
+            if self._key(i) == want:
+                expires = self._expires[i]
+                now = time.time()
+                if expires and expires <= now:
+                    return None
+                return _decode(self._value(i)), (expires - now if expires else None)
+            i += 1
+        return None
+
+    def records(self):
+        """(hash, caducidad, clave, valor) en bytes de cada entrada viva, para fusionarla en la siguiente."""
+        now = time.time()
+        for i in range(self.n):
+            expires = self._expires[i]
+            if not expires or expires > now:
+                yield self._hashes[i], expires, self._key(i), bytes(self._value(i))
+
+    def __len__(self):
+        return self.n
+
+
+class SnapshotReader:
+    """Fichero de instantánea abierto con mmap (solo se lee la cabecera al abrir)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fh = open(path, "rb")
+        self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, fmt, schema, created, n = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise ValueError(f"{path}: no es una instantánea de caché válida")
+        if schema != SCHEMA_VERSION:
+            raise ValueError(f"{path}: esquema {schema}, se esperaba {SCHEMA_VERSION}")
+        self.created = created
+        view = memoryview(self._mm)
+        self.sections = {}
+        for k in range(n):
+            name, index_off, data_off, count = _SECTION.unpack_from(self._mm, _HEADER.size + k * _SECTION.size)
+            self.sections[name.rstrip(b"\0").decode("utf-8")] = SnapshotSection(view, index_off, data_off, count)
+
+    def section(self, name):
+        return self.sections.get(name)
+
+    @classmethod
+    def open_latest(cls, directory):
+        """La instantánea válida más reciente de `directory`, o None."""
+        for path in sorted(glob.glob(os.path.join(directory, "cache-*.snap")), reverse=True):
+            try:
+                return cls(path)
+            except (OSError, ValueError, struct.error) as e:
+                metrics.incr("errors.snapshot_open")
+                log.warning("[snapshot] Se ignora %s: %s", path, e)
+        return None
+
+
+def write_snapshot(path, sections):
+    """Escribe `sections` ({nombre: [(hash, caducidad, clave, valor)]}) en `path` de forma atómica.
+
+    Los valores idénticos (p. ej. la misma lista de sugerencias en varias cajas) se guardan una vez.
+    """
+    names = sorted(sections)
+    head = _HEADER.size + _SECTION.size * len(names)
+    head += -head % 8
+    table, parts = [], []
+    offset = head
+    for name in names:
+        records = sorted(sections[name], key=lambda r: r[0])
+        n = len(records)
+        key_offsets, value_offsets, seen = array("Q"), array("Q"), {}
+        blobs, data_len = [], 0
+        for _, _, key, value in records:
+            key_offsets.append(data_len)
+            blobs.append(key)
+            data_len += len(key)
+            at = seen.get(value)
+            if at is None:
+                at = seen[value] = data_len
+                blobs.append(value)
+                data_len += len(value)
+            value_offsets.append(at)
+        index = b"".join((
+            array("Q", (r[0] for r in records)).tobytes(),
+            key_offsets.tobytes(),
+            value_offsets.tobytes(),
+            array("d", (r[1] or 0.0 for r in records)).tobytes(),
+            array("I", (len(r[2]) for r in records)).tobytes(),
+            array("I", (len(r[3]) for r in records)).tobytes(),
+        ))
+        index += b"\0" * (-len(index) % 8)
+        table.append(_SECTION.pack(name.encode("utf-8")[:16], offset, offset + len(index), n))
+        parts.append(index)
+        parts.extend(blobs)
+        offset += len(index) + data_len
+        parts.append(b"\0" * (-offset % 8))
+        offset += -offset % 8
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as out:
+        out.write(_HEADER.pack(MAGIC, FORMAT_VERSION, SCHEMA_VERSION, time.time(), len(names)))
+        for entry in table:
+            out.write(entry)
+        out.write(b"\0" * (head - out.tell()))
+        for part in parts:
+            out.write(part)
+    os.replace(tmp, path)
+    return offset
+
+
+class Snapshotter:
+    """Une las cachés de la app con las instantáneas de `directory` (lectura perezosa y volcados).
+
+    Cada fuente registrada con `add(nombre, obj)` implementa `attach_snapshot(sección)`
+    (consultarla en los fallos) y `export()` -> [(clave, valor, segundos restantes o None)].
+    """
+
+    def __init__(self, directory, keep=2):
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+        with metrics.span("snapshot.open"):
+            self.reader = SnapshotReader.open_latest(directory)
+        self._sources = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, name, source):
+        self._sources[name] = source
+        source.attach_snapshot(self.reader.section(name) if self.reader else None)
+
+    def _collect(self, name, source):
+        records, seen = [], set()
+        now = time.time()
+        for key, value, ttl in source.export():
+            try:
+                blob = _encode(value)
+            except (TypeError, ValueError):
+                continue  # valor no serializable: no se guarda
+            k = repr(key).encode("utf-8")
+            seen.add(k)
+            records.append((key_hash(key), now + ttl if ttl else 0.0, k, blob))
+        old = self.reader.section(name) if self.reader else None
+        if old is not None:
+            for record in old.records():
+                if len(records) >= MAX_PER_SECTION:
+                    break
+                if record[2] not in seen:
+                    records.append(record)
+        return records[:MAX_PER_SECTION]
+
+    def write(self):
+        """Vuelca todas las fuentes a una instantánea nueva y borra las antiguas. Devuelve la ruta."""
+        with self._lock, metrics.span("snapshot.write"):
+            sections = {name: self._collect(name, src) for name, src in self._sources.items()}
+            # Cachés que aún no se han usado en este proceso: se conserva su sección anterior.
+            for name, old in (self.reader.sections.items() if self.reader else ()):
+                if name not in sections:
+                    sections[name] = list(old.records())[:MAX_PER_SECTION]
+            now = time.time()
+            stamp = time.strftime("%Y%m%dT%H%M%S", time.localtime(now)) + f"{now % 1:.3f}"[1:]
+            path = os.path.join(self.directory, f"cache-{stamp}-{os.getpid()}.snap")
+            size = write_snapshot(path, sections)
+            metrics.incr("snapshot.bytes_written", size)
+            self._prune(keep_path=path)
+        return path
+
+    def _prune(self, keep_path):
+        paths = sorted(glob.glob(os.path.join(self.directory, "cache-*.snap")), reverse=True)
+        for old in paths[self.keep:]:
+            if old != keep_path:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
+    def _safe_write(self):
+        try:
+            self.write()
+        except Exception as e:
+            metrics.incr("errors.snapshot_write")
+            log.warning("[snapshot] Error al guardar: %s", e)
+
+    def start(self, interval_s=600.0):
+        """Volcado cada `interval_s` y al salir del proceso (una vez por Snapshotter)."""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval_s)
+                self._safe_write()
+
+        atexit.register(self._safe_write)
+        self._thread = False
+        if interval_s:
+            self._thread = threading.Thread(target=loop, name="cache-snapshot", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Deja de volcar al salir (el hilo periódico, si lo hay, sigue hasta el final del proceso)."""
+        atexit.unregister(self._safe_write)
+
+    def stats(self):
+        if self.reader is None:
+            return {"path": None, "sections": {}}
+        return {
+            "path": self.reader.path,
+            "age_s": round(time.time() - self.reader.created),
+            "sections": {name: len(s) for name, s in self.reader.sections.items()},
+        }
+
+
+def _read_lines(path):
+    with open(path, encoding="utf-8") as fh:
+        return [line.strip() for line in fh if line.strip() and not line.startswith("#")]
+
+
+def _main(argv):
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Instantáneas de las cachés de la app.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="Precalienta una instantánea a partir de direcciones populares")
+    b.add_argument("addresses", help="Fichero de texto: una dirección por línea")
+    b.add_argument("--out", default=os.environ.get("SNAPSHOT_DIR") or "snapshots")
+    b.add_argument("--max-prefix", type=int, default=12,
+                   help="Longitud máxima de los prefijos de autocompletado que se piden")
+    b.add_argument("--matrix", action="store_true",
+                   help="Pedir también la matriz de tiempos entre todas (con ROUTE_MATRIX=google)")
+    i = sub.add_parser("info", help="Resumen de la instantánea más reciente")
+    i.add_argument("directory")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "info":
+        reader = SnapshotReader.open_latest(args.directory)
+        if reader is None:
+            print("Sin instantáneas")
+            return 1
+        print(json.dumps({
+            "path": reader.path,
+            "bytes": os.path.getsize(reader.path),
+            "created": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(reader.created)),
+            "sections": {name: len(s) for name, s in reader.sections.items()},
+        }, indent=2, ensure_ascii=False))
+        return 0
+
+    os.environ["SNAPSHOT_DIR"] = args.out
+    import app_utils
+
+    snapshots = app_utils.get_snapshots()
+    if snapshots is None:
+        print("No se pudo abrir el directorio de instantáneas")
+        return 1
+    snapshots.stop()
+    addresses = _read_lines(args.addresses)
+    summary = app_utils.prewarm_caches(addresses, max_prefix=args.max_prefix, matrix=args.matrix)
+    path = snapshots.write()
+    print(json.dumps({**summary, "snapshot": path, "bytes": os.path.getsize(path)}, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
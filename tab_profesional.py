@@ -1,10 +1,19 @@
 import streamlit as st
 from app_utils import (
-    suggest_addresses,
     build_gmaps_url,
     build_waze_url,
     build_apple_maps_url,
+    resolve_many,
+    plan_vehicle_routes,
+    optimize_waypoints,
+    compare_preferences,
+    avoid_param,
+    preference_id,
+    show_route_map,
+    record_route,
+    session_history,
 )
+from metrics import timed
 
 
 def _k(tipo, nombre):
@@ -12,6 +21,25 @@ def _k(tipo, nombre):
     return f"{tipo}_{nombre}"
 
 
+def _resolver_puntos(etiquetas, key_bucket):
+    """Resuelve todos los puntos en paralelo mostrando el progreso."""
+    barra = st.progress(0.0, text="Resolviendo direcciones…")
+
+    def _avance(hechas, total):
+        barra.progress(hechas / total if total else 1.0,
+                       text=f"Resolviendo direcciones… {hechas}/{total}")
+
+    puntos = resolve_many(etiquetas, key_bucket=key_bucket, progress=_avance)
+    barra.empty()
+
+    # Solo avisar si el resto sí se pudo localizar (sin claves nada se resuelve).
+    fallidos = [p["label"] for p in puntos if p.get("error")]
+    if fallidos and any(p.get("lat") is not None for p in puntos):
+        st.warning("No se pudieron localizar: " + "; ".join(fallidos))
+    return puntos
+
+
+@timed("render.mostrar_tab_ruta")
 def mostrar_tab_ruta(tipo="prof", label="Ruta profesional"):
     """Muestra la interfaz para generar rutas."""
     st.header(label)
@@ -31,6 +59,16 @@ def mostrar_tab_ruta(tipo="prof", label="Ruta profesional"):
             ["Más rápido", "Corta", "Económica"],
             key=_k(tipo, "modo"),
         )
+        vehiculos = st.number_input(
+            "Número de vehículos",
+            min_value=1, max_value=50, value=1, step=1,
+            key=_k(tipo, "vehiculos"),
+            help="Con más de uno, las paradas se reparten por zonas en rutas equilibradas.",
+        )
+        comparar = st.checkbox(
+            "Comparar todas las preferencias (duración y distancia)",
+            key=_k(tipo, "comparar"),
+        )
 
         # Botón principal
         if st.button("🚀 Generar ruta", key=_k(tipo, "btn_generar")):
@@ -42,14 +80,26 @@ def mostrar_tab_ruta(tipo="prof", label="Ruta profesional"):
                 p.strip() for p in paradas.split("\n") if p.strip()
             ] if paradas else []
 
-            # Crear URLs
+            puntos = _resolver_puntos([origen, destino, *waypoints], _k(tipo, "ruta"))
+            o, d, wps = puntos[0], puntos[1], puntos[2:]
+
+            if vehiculos > 1 and len(wps) > 1:
+                _mostrar_flota(tipo, o, d, wps, int(vehiculos), modo)
+                _mostrar_historial(tipo)
+                return
+
+            # Crear URLs (el orden se fija antes para comparar sobre la misma ruta)
+            wps = optimize_waypoints(o, d, wps)
             gmaps_url = build_gmaps_url(
-                origin=origen,
-                destination=destino,
-                waypoints=waypoints,
+                origin=o,
+                destination=d,
+                waypoints=wps,
+                avoid=avoid_param(modo),
+                optimize=False,
             )
-            waze_url = build_waze_url(origen, destino)
-            apple_url = build_apple_maps_url(origen, destino)
+            waze_url = build_waze_url(o, d)
+            apple_url = build_apple_maps_url(o, d)
+            record_route(tipo, [o, *wps, d], gmaps_url, waze_url, apple_url, mode=modo)
 
             # Mostrar resultados
             st.subheader("📍 Resultados de la ruta")
@@ -77,10 +127,95 @@ def mostrar_tab_ruta(tipo="prof", label="Ruta profesional"):
                     unsafe_allow_html=True,
                 )
 
+            filas = _mostrar_comparacion(o, d, wps) if comparar else []
+            elegida = next((f for f in filas if f["preference"] == preference_id(modo)), {})
+            show_route_map([{"stops": [o, *wps, d], "polyline": elegida.get("polyline")}])
+
+        _mostrar_historial(tipo)
+
     except Exception as e:
         st.error(f"Ocurrió un error al generar la ruta: {e}")
 
 
+# Nombres de las preferencias que compara `compare_preferences`.
+_PREFERENCIAS = {
+    "fastest": "Más rápido",
+    "shortest": "Corta",
+    "economic": "Económica",
+    "no_highways": "Evitar autopistas",
+    "no_tolls": "Evitar peajes",
+    "scenic": "Ruta panorámica",
+}
+
+
+def _mostrar_comparacion(o, d, wps):
+    """Duración y distancia con cada preferencia, pedidas todas a la vez."""
+    with st.spinner("Comparando preferencias…"):
+        filas = compare_preferences(o, d, wps, preferences=list(_PREFERENCIAS))
+    if not filas:
+        st.info("La comparación necesita la clave de Google configurada.")
+        return []
+    st.dataframe(
+        [
+            {
+                "Preferencia": _PREFERENCIAS[f["preference"]],
+                "Duración (min)": round(f["duration_s"] / 60) if f["duration_s"] is not None else None,
+                "Distancia (km)": round(f["distance_m"] / 1000, 1) if f["distance_m"] is not None else None,
+                "Vía": f["summary"] or f.get("error", ""),
+                "Igual que": _PREFERENCIAS.get(f["same_as"], ""),
+            }
+            for f in filas
+        ],
+        hide_index=True, width="stretch",
+    )
+    return filas
+
+
+def _mostrar_flota(tipo, o, d, wps, vehiculos, modo):
+    """Una ruta (enlaces + QR) por vehículo."""
+    rutas = plan_vehicle_routes(o, d, wps, vehiculos, avoid=avoid_param(modo))
+    st.subheader(f"🚚 {len(rutas)} rutas para {len(wps)} paradas")
+    show_route_map([{"stops": [o, *ruta["stops"], d]} for ruta in rutas])
+    for n, ruta in enumerate(rutas, 1):
+        record_route(tipo, [o, *ruta["stops"], d], ruta["gmaps_url"],
+                     ruta["waze_url"], ruta["apple_url"], mode=f"{modo} · vehículo {n}")
+        with st.expander(f"Vehículo {n} · {len(ruta['stops'])} paradas", expanded=n == 1):
+            cols = st.columns([0.7, 0.3])
+            with cols[0]:
+                if ruta["gmaps_url"]:
+                    st.markdown(f"[🌍 **Abrir en Google Maps**]({ruta['gmaps_url']})")
+                if ruta["waze_url"]:
+                    st.markdown(f"[🚗 **Abrir en Waze**]({ruta['waze_url']})")
+                if ruta["apple_url"]:
+                    st.markdown(f"[🍎 **Abrir en Apple Maps**]({ruta['apple_url']})")
+                st.caption(" → ".join(p.get("address", "") for p in ruta["stops"]))
+            with cols[1]:
+                if ruta["qr"]:
+                    st.image(ruta["qr"], width=160)
+
+
+def _mostrar_historial(tipo):
+    """Rutas anteriores de la sesión: enlaces y QR guardados, sin volver a resolver nada."""
+    historial = session_history().records(tipo)
+    if not historial:
+        return
+    with st.expander("🕘 Rutas de esta sesión", expanded=False):
+        i = st.selectbox(
+            "Ruta",
+            options=list(range(len(historial))),
+            format_func=lambda i: f"{historial[i].title} · {historial[i].mode}",
+            key=_k(tipo, "hist_sel"),
+        )
+        ruta = historial[min(i or 0, len(historial) - 1)]
+        st.markdown(f"[🌍 **Abrir en Google Maps**]({ruta.gmaps_url})")
+        if ruta.waze_url:
+            st.markdown(f"[🚗 **Abrir en Waze**]({ruta.waze_url})")
+        if ruta.apple_url:
+            st.markdown(f"[🍎 **Abrir en Apple Maps**]({ruta.apple_url})")
+        if ruta.qr:
+            st.image(ruta.qr, caption="QR de la ruta", width=220)
+
+
 def mostrar_profesional():
     """Muestra la pestaña principal para rutas profesionales."""
     mostrar_tab_ruta(tipo="prof", label="Ruta de trabajo")
@@ -1,32 +1,44 @@
 # tab_turistico.py
-import requests
-import streamlit as st
-from streamlit_searchbox import st_searchbox 
-# --- EN tab_profesional.py, tab_viajero.py, y tab_turistico.py ---
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
+import streamlit as st
 from app_utils import (
-    suggest_addresses,
-    resolve_selection, 
+    suggest_for_box,
+    resolve_selection,
+    resolve_many,
     build_gmaps_url,
-    make_qr, # <--- ¡Asegúrate de que ESTÉ aquí!
-    set_location_bias,
-    _get_key,
-    _use_ip_bias 
+    make_qr,
+    _use_ip_bias,
+    record_route,
+    session_history,
+    show_route_map,
+    optimize_waypoints,
+    open_status_for,
 )
+from opening_hours import CLOSED, OPEN
+from metrics import timed
+import autocomplete_component
+
+
+@st.fragment(run_every=1.0)
+def _ip_bias_poller():
+    """Comprueba cada segundo si ya llegó la ubicación por IP, sin bloquear el resto."""
+    estado = _use_ip_bias(radius_m=50000, request=False)
+    if estado == "pending":
+        st.caption("Buscando tu ubicación aproximada…")
+        return
+    st.session_state["_ip_bias_pending"] = False
+    st.session_state["_ip_bias_result"] = estado
+    st.rerun(scope="app")
 
-# ... el resto del código ...
 
 def _ip_guess_bias():
-    try:
-        ip = requests.get("https://ipapi.co/json/", timeout=6).json()
-        lat = ip.get("latitude")
-        lng = ip.get("longitude")
-        if lat and lng:
-            set_location_bias(float(lat), float(lng), radius_m=50000)
-            return True
-    except Exception:
-        pass
-    return False
+    """Pide el sesgo de ubicación por IP; si no está listo, se completa en segundo plano."""
+    estado = _use_ip_bias(radius_m=50000)  # 50 km por defecto.
+    st.session_state["_ip_bias_pending"] = estado == "pending"
+    st.session_state["_ip_bias_result"] = estado
+    return estado
 
 def _init_state():
     ss = st.session_state
@@ -36,35 +48,85 @@ def _init_state():
     ss.setdefault("tour_sel_to", None)
     ss.setdefault("tour_last_url", None)
 
+def _clear_box(key_q: str, key_sel: str):
+    st.session_state[key_q] = ""
+    st.session_state[key_sel] = None
+    autocomplete_component.clear(key_q)
+
+
+@st.fragment
 def _search_box(label, key_q: str, key_bucket: str, key_sel: str):
-    q = st.text_input(label, key=key_q, placeholder="Calle, número, ciudad… / Street, number, city…")
-    labels = suggest_addresses(q, key_bucket) if q and len(q) >= 2 else []
-    if labels:
-        st.caption("Sugerencias:")
-        idx = st.selectbox(
-            "Elige una sugerencia",
-            options=list(range(len(labels))),
-            format_func=lambda i: labels[i],
-            key=key_sel,
+    if autocomplete_component.enabled():
+        # Autocompletado en el navegador: un solo rerun cuando se elige la dirección.
+        labels = autocomplete_component.address_box(
+            label, key_q, key_sel, placeholder="Calle, número, ciudad… / Street, number, city…"
         )
     else:
-        st.caption("Sin sugerencias todavía")
+        q = st.text_input(label, key=key_q, placeholder="Calle, número, ciudad… / Street, number, city…")
+        # Solo la caja cuyo texto cambió desde el último rerun va a la red.
+        labels = suggest_for_box(q, key_bucket, min_len=2)
+        if labels:
+            st.caption("Sugerencias:")
+            idx = st.selectbox(
+                "Elige una sugerencia",
+                options=list(range(len(labels))),
+                format_func=lambda i: labels[i],
+                key=key_sel,
+            )
+        else:
+            st.caption("Sin sugerencias todavía")
 
     cols = st.columns([0.33, 0.33, 0.34])
     with cols[0]:
-        if st.button("Limpiar", key=f"btn_clear_{key_q}"):
-            st.session_state[key_q] = ""
-            st.session_state[key_sel] = None
-            st.rerun()
+        # En un callback: se ejecuta antes de crear la caja, que ya no se puede tocar después.
+        st.button("Limpiar", key=f"btn_clear_{key_q}", on_click=_clear_box, args=(key_q, key_sel))
     with cols[1]:
         if st.button("Usar mi ubicación", key=f"btn_loc_{key_q}"):
-            ok = _ip_guess_bias()
-            if ok:
+            _ip_guess_bias()
+            st.session_state["_ip_bias_box"] = key_q
+        if st.session_state.get("_ip_bias_box") == key_q:
+            if st.session_state.get("_ip_bias_pending"):
+                _ip_bias_poller()
+            elif st.session_state.get("_ip_bias_result") == "ready":
                 st.success("Sesgo de ubicación fijado ✅ (cerca de tu IP).")
-            else:
+            elif st.session_state.get("_ip_bias_result") == "failed":
                 st.warning("No se pudo obtener tu ubicación aproximada.")
     return labels
 
+def _hora_local(ts, utc_offset_min=None):
+    """HH:MM de `ts` en la hora del lugar; si no se conoce, en la del navegador (o UTC)."""
+    if utc_offset_min is not None:
+        tz = timezone(timedelta(minutes=utc_offset_min))
+    else:
+        try:
+            tz = ZoneInfo(st.context.timezone or "UTC")
+        except (ValueError, ZoneInfoNotFoundError):
+            tz = timezone.utc
+    return datetime.fromtimestamp(ts, tz).strftime("%H:%M")
+
+
+def _estado_apertura(t, o, wps):
+    """Abierto/cerrado de cada parada a la hora estimada de llegada (saliendo ahora)."""
+    # 45 min de visita en cada lugar antes de ir al siguiente.
+    estados, llegadas, offsets = open_status_for([o, *wps], mode="walking", dwell_s=45 * 60)
+    textos = {OPEN: t.get("open", "Abierto"), CLOSED: t.get("closed", "Cerrado")}
+    st.markdown(f"**{t.get('open_status_now', 'Estado de apertura')}**")
+    st.dataframe(
+        [
+            {
+                "#": n,
+                "📍": p.get("address", ""),
+                "🕒": _hora_local(llegada, offset),
+                "": textos.get(estado, t.get("nodata", "Sin datos")),
+            }
+            for n, (p, estado, llegada, offset)
+            in enumerate(zip(wps, estados[1:], llegadas[1:], offsets[1:]), 1)
+        ],
+        hide_index=True, width="stretch",
+    )
+
+
+@timed("render.mostrar_turistico")
 def mostrar_turistico(t: dict):
     _init_state()
 
@@ -92,6 +154,9 @@ def mostrar_turistico(t: dict):
     spots_text = st.text_area("", height=140, placeholder="Sagrada Familia, Barcelona\nParc Güell, Barcelona\nCasa Batlló, Barcelona…")
     stops = [s.strip() for s in spots_text.splitlines() if s.strip()]
 
+    check_open = st.checkbox(t.get("open_now_check", "Comprobar si los lugares están abiertos"),
+                             key="tour_open_check")
+
     if st.button(t.get("generate_tour", "Generar ruta turística"), type="primary"):
         q_from = st.session_state["tour_q_from"].strip()
         q_to   = st.session_state["tour_q_to"].strip()
@@ -112,15 +177,46 @@ def mostrar_turistico(t: dict):
         o = resolve_selection(from_label, "tour_from")
         d = resolve_selection(to_label, "tour_to")
 
-        # Paradas (no llevan autocompletado por líneas; se resuelven como texto directo)
-        url = build_gmaps_url(o["address"], d["address"], stops if stops else None)
+        # Paradas: se resuelven todas en paralelo (las que fallen van como texto)
+        wps = []
+        if stops:
+            barra = st.progress(0.0, text="Resolviendo paradas…")
+            wps = resolve_many(
+                stops, "tour_spots",
+                progress=lambda hechas, total: barra.progress(
+                    hechas / total if total else 1.0, text=f"Resolviendo paradas… {hechas}/{total}"
+                ),
+            )
+            barra.empty()
+            fallidas = [p["label"] for p in wps if p.get("error")]
+            if fallidas and any(p.get("lat") is not None for p in wps):
+                st.warning("No se pudieron localizar: " + "; ".join(fallidas))
+
+        # El orden se fija aquí para poder estimar a qué hora se llega a cada parada.
+        wps = optimize_waypoints(o, d, wps) if wps else []
+        url = build_gmaps_url(o, d, wps if wps else None, optimize=False)
         st.session_state["tour_last_url"] = url
+        record_route("turistico", [o, *wps, d], url)
 
         st.success(t.get("tour_ready", "¡Ruta turística lista!"))
         st.write(url)
         st.image(make_qr(url), caption=t.get("tour_qr", "QR de la ruta"))
+        show_route_map([{"stops": [o, *wps, d]}])
+
+        if check_open and wps:
+            _estado_apertura(t, o, wps)
 
-    if st.session_state["tour_last_url"]:
+    # Rutas anteriores: se muestran desde el historial, sin red ni nuevo QR.
+    historial = session_history().records("turistico")
+    if historial:
         with st.expander(t.get("last_route", "Última ruta generada"), expanded=False):
-            st.write(st.session_state["tour_last_url"])
-            st.image(make_qr(st.session_state["tour_last_url"]), caption=t.get("tour_qr", "QR de la ruta"))
\ No newline at end of file
+            i = st.selectbox(
+                t.get("route_history", "Rutas de esta sesión"),
+                options=list(range(len(historial))),
+                format_func=lambda i: historial[i].title,
+                key="tour_hist_sel",
+            )
+            ruta = historial[min(i or 0, len(historial) - 1)]
+            st.write(ruta.gmaps_url)
+            if ruta.qr:
+                st.image(ruta.qr, caption=t.get("tour_qr", "QR de la ruta"))
@@ -1,36 +1,39 @@
 # tab_viajero.py
-import requests
 import streamlit as st
-from streamlit_searchbox import st_searchbox 
-# --- EN tab_profesional.py, tab_viajero.py, y tab_turistico.py ---
-
 from app_utils import (
-    suggest_addresses,
-    resolve_selection, 
+    suggest_for_box,
+    resolve_selection,
     build_gmaps_url,
-    make_qr, # <--- ¡Asegúrate de que ESTÉ aquí!
-    set_location_bias,
-    _get_key,
-    _use_ip_bias 
+    make_qr,
+    _use_ip_bias,
+    record_route,
+    session_history,
+    show_route_map,
 )
+from metrics import timed
+import autocomplete_component
 
-# ... el resto del código ...
 # ----------------------------
 # Helpers
 # ----------------------------
+@st.fragment(run_every=1.0)
+def _ip_bias_poller():
+    """Comprueba cada segundo si ya llegó la ubicación por IP, sin bloquear el resto."""
+    estado = _use_ip_bias(radius_m=50000, request=False)
+    if estado == "pending":
+        st.caption("Buscando tu ubicación aproximada…")
+        return
+    st.session_state["_ip_bias_pending"] = False
+    st.session_state["_ip_bias_result"] = estado
+    st.rerun(scope="app")
+
+
 def _ip_guess_bias():
-    """Intenta ubicar por IP y fija el sesgo de ubicación para autocompletar."""
-    try:
-        ip = requests.get("https://ipapi.co/json/", timeout=6).json()
-        lat = ip.get("latitude")
-        lng = ip.get("longitude")
-        if lat and lng:
-            # 50 km por defecto. Puedes subir/bajar este radio.
-            set_location_bias(float(lat), float(lng), radius_m=50000)
-            return True
-    except Exception:
-        pass
-    return False
+    """Pide el sesgo de ubicación por IP; si no está listo, se completa en segundo plano."""
+    estado = _use_ip_bias(radius_m=50000)  # 50 km por defecto.
+    st.session_state["_ip_bias_pending"] = estado == "pending"
+    st.session_state["_ip_bias_result"] = estado
+    return estado
 
 def _init_state():
     ss = st.session_state
@@ -42,39 +45,56 @@ def _init_state():
     ss.setdefault("trav_sel_mid", None)
     ss.setdefault("trav_last_url", None)
 
+def _clear_box(key_q: str, key_sel: str):
+    st.session_state[key_q] = ""
+    st.session_state[key_sel] = None
+    autocomplete_component.clear(key_q)
+
+
+@st.fragment
 def _search_box(label, key_q: str, key_bucket: str, key_sel: str):
     """Caja con texto + sugerencias + select."""
-    q = st.text_input(label, key=key_q, placeholder="Calle, número, ciudad… / Street, number, city…")
-    labels = suggest_addresses(q, key_bucket) if q and len(q) >= 2 else []
-    if labels:
-        st.caption("Sugerencias:")
-        idx = st.selectbox(
-            "Elige una sugerencia",
-            options=list(range(len(labels))),
-            format_func=lambda i: labels[i],
-            key=key_sel,
+    if autocomplete_component.enabled():
+        # Autocompletado en el navegador: un solo rerun cuando se elige la dirección.
+        labels = autocomplete_component.address_box(
+            label, key_q, key_sel, placeholder="Calle, número, ciudad… / Street, number, city…"
         )
     else:
-        st.caption("Sin sugerencias todavía")
+        q = st.text_input(label, key=key_q, placeholder="Calle, número, ciudad… / Street, number, city…")
+        # Solo la caja cuyo texto cambió desde el último rerun va a la red.
+        labels = suggest_for_box(q, key_bucket, min_len=2)
+        if labels:
+            st.caption("Sugerencias:")
+            idx = st.selectbox(
+                "Elige una sugerencia",
+                options=list(range(len(labels))),
+                format_func=lambda i: labels[i],
+                key=key_sel,
+            )
+        else:
+            st.caption("Sin sugerencias todavía")
 
     cols = st.columns([0.33, 0.33, 0.34])
     with cols[0]:
-        if st.button("Limpiar", key=f"btn_clear_{key_q}"):
-            st.session_state[key_q] = ""
-            st.session_state[key_sel] = None
-            st.rerun()
+        # En un callback: se ejecuta antes de crear la caja, que ya no se puede tocar después.
+        st.button("Limpiar", key=f"btn_clear_{key_q}", on_click=_clear_box, args=(key_q, key_sel))
     with cols[1]:
         if st.button("Usar mi ubicación", key=f"btn_loc_{key_q}"):
-            ok = _ip_guess_bias()
-            if ok:
+            _ip_guess_bias()
+            st.session_state["_ip_bias_box"] = key_q
+        if st.session_state.get("_ip_bias_box") == key_q:
+            if st.session_state.get("_ip_bias_pending"):
+                _ip_bias_poller()
+            elif st.session_state.get("_ip_bias_result") == "ready":
                 st.success("Sesgo de ubicación fijado ✅ (cerca de tu IP).")
-            else:
+            elif st.session_state.get("_ip_bias_result") == "failed":
                 st.warning("No se pudo obtener tu ubicación aproximada.")
     return labels
 
 # ----------------------------
 # Main
 # ----------------------------
+@timed("render.mostrar_viajero")
 def mostrar_viajero(t: dict):
     _init_state()
 
@@ -130,15 +150,27 @@ def mostrar_viajero(t: dict):
         d = resolve_selection(to_label, "trav_to")
         wps = []
         if mid_label:
-            wps.append(resolve_selection(mid_label, "trav_mid")["address"])
+            wps.append(resolve_selection(mid_label, "trav_mid"))
 
-        url = build_gmaps_url(o["address"], d["address"], wps if wps else None)
+        url = build_gmaps_url(o, d, wps if wps else None)
         st.session_state["trav_last_url"] = url
+        record_route("viajero", [o, *wps, d], url)
         st.success(t.get("route_ready", "¡Ruta lista!"))
         st.write(url)
         st.image(make_qr(url), caption=t.get("qr_route", "QR de la ruta"))
+        show_route_map([{"stops": [o, *wps, d]}])
 
-    if st.session_state["trav_last_url"]:
+    # Rutas anteriores: se muestran desde el historial, sin red ni nuevo QR.
+    historial = session_history().records("viajero")
+    if historial:
         with st.expander(t.get("last_route", "Última ruta generada"), expanded=False):
-            st.write(st.session_state["trav_last_url"])
-            st.image(make_qr(st.session_state["trav_last_url"]), caption=t.get("qr_route", "QR de la ruta"))
\ No newline at end of file
+            i = st.selectbox(
+                t.get("route_history", "Rutas de esta sesión"),
+                options=list(range(len(historial))),
+                format_func=lambda i: historial[i].title,
+                key="trav_hist_sel",
+            )
+            ruta = historial[min(i or 0, len(historial) - 1)]
+            st.write(ruta.gmaps_url)
+            if ruta.qr:
+                st.image(ruta.qr, caption=t.get("qr_route", "QR de la ruta"))
@@ -0,0 +1,135 @@
+# transport.py
+"""Transporte HTTP saliente compartido: pool de conexiones, reintentos y "single-flight".
+
+Una sola `requests.Session` por proceso con conexiones keep-alive y un máximo
+de conexiones por host; lo usan el cliente de Google, SerpAPI, Nominatim e
+ipapi. Las peticiones idénticas que coinciden en el tiempo (veinte usuarios
+escribiendo "Madrid" a la vez) comparten una única llamada y su respuesta;
+los fallos transitorios se reintentan con espera aleatoria sin pasarse del
+plazo de quien llama.
+"""
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# Errores y códigos que merece la pena reintentar.
+RETRY_STATUS = {429, 500, 502, 503, 504}
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout)
+
+
+class SingleFlight:
+    """Une las llamadas concurrentes con la misma clave: una ejecuta, las demás esperan su resultado.
+
+    El resultado se comparte tal cual entre todas, así que debe tratarse como
+    de solo lectura. No es una caché: en cuanto termina, la siguiente llamada
+    vuelve a ejecutarse.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            fut = self._calls.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._calls[key] = Future()
+        if not leader:
+            metrics.incr(f"{self.name}.coalesced")
+            return fut.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+def build_session(pool_connections=16, pool_maxsize=32, user_agent="planificador-rutas"):
+    """Sesión con pool keep-alive: `pool_maxsize` conexiones como mucho por host.
+
+    Con `pool_block=True` una ráfaga espera a que quede una conexión libre en
+    vez de abrir conexiones de usar y tirar.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                          pool_block=True, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = user_agent
+    return session
+
+
+def freeze(value):
+    """Versión hashable de parámetros (dicts/listas anidados) para usar como clave."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+class Transport:
+    """GET compatible con `requests.Session.get` con reintentos dentro de plazo y single-flight.
+
+    `timeout` es el plazo total de la llamada (reintentos incluidos); cada
+    intento tiene además `connect_timeout` para conectar y `read_timeout` para leer.
+    """
+
+    def __init__(self, session=None, retries=2, backoff_s=0.1, default_timeout=10.0,
+                 connect_timeout=3.05, read_timeout=5.0):
+        self.session = session or build_session()
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.default_timeout = default_timeout
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.flight = SingleFlight("http")
+
+    def _get(self, url, params, headers, timeout):
+        deadline = time.monotonic() + timeout
+        attempt = 0
+        while True:
+            remaining = max(deadline - time.monotonic(), 0.05)
+            timeout = (min(self.connect_timeout, remaining), min(self.read_timeout, remaining))
+            try:
+                with metrics.span("http.request"):
+                    resp = self.session.get(url, params=params, headers=headers, timeout=timeout)
+                if resp.status_code not in RETRY_STATUS or attempt >= self.retries:
+                    return resp
+                error = None
+            except RETRY_ERRORS as e:
+                if attempt >= self.retries:
+                    raise
+                error = e
+            # Espera aleatoria ("full jitter"); si no cabe en el plazo, no se reintenta.
+            pause = random.uniform(0, self.backoff_s * (2 ** attempt))
+            if time.monotonic() + pause >= deadline - 0.05:
+                if error is not None:
+                    raise error
+                return resp
+            metrics.incr("http.retries")
+            time.sleep(pause)
+            attempt += 1
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        timeout = timeout or self.default_timeout
+        key = (url, freeze(params or {}), freeze(headers or {}))
+        return self.flight.do(key, lambda: self._get(url, params, headers, timeout))